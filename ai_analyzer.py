@@ -3,35 +3,70 @@ Módulo para análise de texto usando OpenAI GPT-3.5 Turbo
 """
 import os
 import json
+import time
 import logging
-from openai import OpenAI
+import threading
+from openai import OpenAI, DefaultHttpxClient
 
-# Configurar o cliente OpenAI
+from ai_cache import result_cache, prompt_version, cache_key
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from metrics import OPENAI_REQUEST_DURATION, OPENAI_RETRIES, OPENAI_FAILURES
+from profiling import record_ai_time
+
+# Tentativas HTTP da chamada em andamento nesta thread (o cliente repete sozinho em erros transitórios)
+_attempts = threading.local()
+
+
+def _count_attempt(request):
+    _attempts.count = getattr(_attempts, "count", 0) + 1
+
+
+# Configurar o cliente OpenAI (uma única vez, na importação do módulo)
 api_key = os.environ.get("OPENAI_API_KEY")
-if not api_key:
-    logging.error("OPENAI_API_KEY environment variable is not set")
-    raise ValueError("OPENAI_API_KEY environment variable must be set to use AI analysis")
-
-# Inicializar cliente com retry em caso de problemas temporários de conexão
-client = OpenAI(
-    api_key=api_key,
-    timeout=60.0,  # Timeout maior para ambientes de cloud
-    max_retries=3  # Retry em caso de problemas de conexão
+client = None
+if api_key:
+    # Timeout curto e no máximo uma nova tentativa: o disjuntor conta uma falha por análise,
+    # então cada análise com a API degradada não deve prender o worker por mais que ~2x o timeout
+    # OPENAI_BASE_URL permite apontar para outro servidor compatível (ex.: loadtest/fake_openai.py)
+    client = OpenAI(
+        api_key=api_key,
+        base_url=os.environ.get("OPENAI_BASE_URL") or None,
+        timeout=float(os.environ.get("OPENAI_TIMEOUT", "20")),
+        max_retries=int(os.environ.get("OPENAI_MAX_RETRIES", "1")),
+        http_client=DefaultHttpxClient(event_hooks={"request": [_count_attempt]})
+    )
+
+# Disjuntor em volta da API: após falhas/timeouts seguidos, as análises vão direto
+# para o extrator por regex durante o período de espera
+breaker = CircuitBreaker(
+    "openai",
+    failure_threshold=int(os.environ.get("AI_BREAKER_FAILURES", "3")),
+    cooldown_seconds=float(os.environ.get("AI_BREAKER_COOLDOWN", "60"))
 )
 
-def analyze_police_report(report_text):
-    """
-    Analisa um relatório policial usando OpenAI GPT.
-    
-    Args:
-        report_text (str): Texto do relatório policial
-        
-    Returns:
-        dict: Resultado da análise com contagens e informações extraídas
-    """
-    try:
-        # Definir o prompt para a análise
-        system_prompt = """
+
+class AIUnavailableError(Exception):
+    """A análise por IA não pode ser feita (sem chave configurada ou disjuntor aberto)"""
+
+
+def is_configured():
+    """Indica se há cliente da OpenAI configurado"""
+    return client is not None
+
+
+def provider_status():
+    """Estado do provedor de IA (exposto em /healthz)"""
+    return {
+        "configured": is_configured(),
+        "model": MODEL,
+        "breaker": breaker.stats()
+    }
+
+# Modelo usado na análise (GPT-3.5 Turbo conforme solicitado pelo usuário)
+MODEL = "gpt-3.5-turbo"
+
+# Definir o prompt para a análise
+SYSTEM_PROMPT = """
         Você é um assistente especializado em analisar relatórios policiais da 20ª CIPM no Brasil.
         Extraia as seguintes informações do relatório:
         1. Local (MUANÁ ou PONTA DE PEDRAS)
@@ -89,40 +124,65 @@ def analyze_police_report(report_text):
           "occurrence": "string"
         }
         """
+
+# Versão do prompt/modelo: muda automaticamente quando MODEL ou SYSTEM_PROMPT mudam,
+# invalidando os resultados guardados em cache
+PROMPT_VERSION = prompt_version(MODEL, SYSTEM_PROMPT)
+
+def analyze_police_report(report_text):
+    """
+    Analisa um relatório policial usando OpenAI GPT.
+    
+    Args:
+        report_text (str): Texto do relatório policial
         
-        # Chamada para a API da OpenAI
-        # Usando o modelo GPT-3.5 Turbo conforme solicitado pelo usuário
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
+    Returns:
+        dict: Resultado da análise com contagens e informações extraídas
+        
+    Raises:
+        AIUnavailableError: sem chave configurada ou disjuntor aberto
+        Exception: erros da API ou resposta inválida (quem chama usa o extrator por regex)
+    """
+    # Relatórios já analisados (mesmo texto e mesma versão de prompt) não chamam a API
+    key = cache_key(report_text, PROMPT_VERSION)
+    cached_result = result_cache.get(key)
+    if cached_result is not None:
+        logging.info("AI Analysis Result obtido do cache")
+        return cached_result
+    
+    if client is None:
+        raise AIUnavailableError("OPENAI_API_KEY não configurada")
+    
+    # Chamada para a API da OpenAI (falhas e timeouts contam para o disjuntor)
+    _attempts.count = 0
+    started = time.perf_counter()
+    try:
+        response = breaker.call(
+            client.chat.completions.create,
+            model=MODEL,
             messages=[
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": report_text}
             ],
             response_format={"type": "json_object"},
             temperature=0.1
         )
-        
-        # Extrair e retornar os resultados
-        result = json.loads(response.choices[0].message.content)
-        logging.info(f"AI Analysis Result: {result}")
-        return result
-        
+    except CircuitOpenError as e:
+        raise AIUnavailableError(str(e)) from e
     except Exception as e:
-        logging.error(f"Error in AI analysis: {str(e)}")
-        # Em caso de erro, retornar um resultado vazio com valores padrão
-        return {
-            "location": "NÃO IDENTIFICADO",
-            "date": "",
-            "shift": "Não identificado",
-            "people_count": 0,
-            "motorcycles_count": 0,
-            "cars_count": 0,
-            "bicycles_count": 0,
-            "arrests_count": 0,
-            "seized_motorcycles_count": 0,
-            "drugs_seized_count": 0,
-            "fugitives_count": 0,
-            "bladed_weapons_count": 0,
-            "firearms_count": 0,
-            "occurrence": "Erro na análise de IA: " + str(e)
-        }
\ No newline at end of file
+        OPENAI_REQUEST_DURATION.labels(outcome="failure").observe(time.perf_counter() - started)
+        OPENAI_FAILURES.labels(error=type(e).__name__).inc()
+        raise
+    finally:
+        record_ai_time(time.perf_counter() - started)
+        if _attempts.count > 1:
+            OPENAI_RETRIES.inc(_attempts.count - 1)
+    OPENAI_REQUEST_DURATION.labels(outcome="success").observe(time.perf_counter() - started)
+    
+    # Extrair e retornar os resultados
+    result = json.loads(response.choices[0].message.content)
+    logging.info(f"AI Analysis Result: {result}")
+    
+    # Guardar apenas resultados bem-sucedidos
+    result_cache.put(key, PROMPT_VERSION, result)
+    return result
@@ -0,0 +1,120 @@
+"""
+Cache dos resultados da análise por IA.
+
+A chave é o hash SHA-256 do texto normalizado do relatório junto com a
+versão do prompt/modelo; quando o prompt ou o modelo mudam a versão muda
+e as entradas antigas deixam de ser encontradas automaticamente.
+
+Há duas camadas: um LRU em memória (por processo) e a tabela
+ai_result_cache no banco (compartilhada entre processos). A tabela é lida e
+gravada em uma sessão própria, para que o cache nunca faça commit (ou
+rollback) da sessão da requisição; os acertos são contados apenas em memória.
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from sqlalchemy.orm import Session
+
+from models import db, AIResultCache
+
+# Quantidade máxima de resultados mantidos em memória por processo
+MEMORY_CACHE_SIZE = int(os.environ.get("AI_CACHE_SIZE", "256"))
+
+
+def prompt_version(model, system_prompt):
+    """Identificador curto da combinação modelo + prompt"""
+    return hashlib.sha256(f"{model}\n{system_prompt}".encode("utf-8")).hexdigest()[:16]
+
+
+def normalize_text(text):
+    """Normaliza o texto para que colagens equivalentes gerem a mesma chave"""
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    lines = [re.sub(r"[ \t]+", " ", line).strip() for line in text.split("\n")]
+    return "\n".join(line for line in lines if line)
+
+
+def cache_key(text, version):
+    """Chave de cache para um texto de relatório e versão de prompt"""
+    return hashlib.sha256(f"{version}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class AIResultCacheStore:
+    """Cache em duas camadas (memória LRU + tabela no banco) com contadores de acertos"""
+
+    def __init__(self, max_size=MEMORY_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _remember(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """Retorna o resultado em cache (cópia) ou None"""
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return dict(result)
+
+        try:
+            with Session(db.engine) as session:
+                entry = session.get(AIResultCache, key)
+                result = json.loads(entry.result) if entry is not None else None
+            if result is not None:
+                self._remember(key, result)
+                self._count("db_hits")
+                return dict(result)
+        except Exception as e:
+            self._count("errors")
+            logging.error(f"Erro ao consultar o cache de análises: {str(e)}")
+
+        self._count("misses")
+        return None
+
+    def put(self, key, version, result):
+        """Guarda um resultado nas duas camadas"""
+        self._remember(key, dict(result))
+        try:
+            with Session(db.engine) as session:
+                if session.get(AIResultCache, key) is None:
+                    session.add(AIResultCache(
+                        key=key, prompt_version=version, result=json.dumps(result, ensure_ascii=False)))
+                    session.commit()
+            self._count("stores")
+        except Exception as e:
+            # Outra requisição pode ter gravado a mesma chave ao mesmo tempo
+            self._count("errors")
+            logging.warning(f"Não foi possível gravar no cache de análises: {str(e)}")
+
+    def clear_memory(self):
+        """Esvazia a camada em memória"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Contadores de acertos/falhas e tamanho da camada em memória"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_size"] = len(self._entries)
+        lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["db_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+result_cache = AIResultCacheStore()
@@ -1,13 +1,39 @@
 import os
+import io
+import csv
+import json
+import base64
 import logging
-import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, jsonify
-from models import db, Report
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context, url_for
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+from models import (db, Report, ReportTotals, DataVersion, ReportChange, AnalysisJob, EXPORT_COLUMNS,
+                    ReportArchive, ReportPeriodSummary, ClosedPeriod, METRIC_COLUMNS, build_totals_dict,
+                    Unit, unit_registry, EDGE_MODE, SyncOutbox,
+                    LIST_FIELDS, ROLLUP_MODELS, TIMESERIES_METRICS, get_timeseries,
+                    COVERAGE_MAX_DAYS, get_coverage)
+from jobs import job_runner
+from ai_cache import result_cache
+from report_splitter import split_reports
+from extractor import extract_report_fields
+from print_report import render_print_report, print_cache, PDFUnavailableError
+from calendar_cache import calendar_cache
+from edge_sync import sync_worker, configure_sqlite
+import ai_analyzer
+import assets
+import metrics
+import profiling
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 
+# Sem chave da OpenAI, todas as análises usam a extração por regex
+# (avisado aqui, depois do basicConfig, para não fixar o nível do log em WARNING)
+if not ai_analyzer.is_configured():
+    logging.warning("OPENAI_API_KEY não definida: análise por IA desativada, usando apenas regex")
+
 # Create Flask app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET")
@@ -15,6 +41,13 @@ app.secret_key = os.environ.get("SESSION_SECRET")
 # Configure database
 database_url = os.environ.get("DATABASE_URL")
 
+# Modo edge: banco SQLite local (instance/edge.db ou EDGE_DATABASE_URL); o banco central
+# (CENTRAL_DATABASE_URL) recebe os relatórios em segundo plano (ver edge_sync.py)
+if EDGE_MODE:
+    os.makedirs(app.instance_path, exist_ok=True)
+    database_url = os.environ.get("EDGE_DATABASE_URL") or f"sqlite:///{os.path.join(app.instance_path, 'edge.db')}"
+    logging.info("Modo edge: relatórios gravados no SQLite local e enviados ao banco central")
+
 # Fallback para ambiente de desenvolvimento/teste quando não há DATABASE_URL
 if not database_url:
     # Para Railway que não define DATABASE_URL imediatamente
@@ -44,20 +77,79 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_pre_ping": True,
     "pool_size": 10,
     "max_overflow": 15,
+    "poolclass": metrics.InstrumentedQueuePool,  # mede a espera por conexões (/metrics)
 }
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# Limites da ingestão em lote (/analyze/batch)
+BATCH_MAX_REPORTS = int(os.environ.get("BATCH_MAX_REPORTS", "200"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "4"))
+
+# Quando verdadeiro, /analyze processa em segundo plano por padrão (resposta 202 com id do job)
+ANALYZE_ASYNC_DEFAULT = os.environ.get("ANALYZE_ASYNC", "false").lower() in ("1", "true", "yes")
+
 # Initialize database
 db.init_app(app)
 
+# SQLite (modo edge ou desenvolvimento) em WAL, com os pragmas de edge_sync.SQLITE_PRAGMAS
+with app.app_context():
+    configure_sqlite(db.engine)
+
+# Cache do calendário compartilhado entre os workers (arquivo SQLite em instance/)
+calendar_cache.init_app(app)
+
+# Métricas do Prometheus (/metrics)
+metrics.init_app(app)
+
+# Contagem de SQL por requisição, log de requisições lentas e cProfile por amostragem
+profiling.init_app(app)
+
+# Arquivos estáticos com hash (asset_url nos templates e /assets com cache imutável)
+assets.init_app(app)
+
 # Create tables
 with app.app_context():
     db.create_all()
 
+    # Cadastrar a unidade padrão em bancos sem unidades
+    try:
+        Unit.ensure_default()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Erro ao cadastrar a unidade padrão: {str(e)}")
+
+    # Bancos anteriores às unidades: as consultas falham até a migração ser executada
+    inspector = inspect(db.engine)
+    missing_unit = [model.__tablename__ for model in [Report, ReportTotals, AnalysisJob] + ROLLUP_MODELS
+                    if 'unit' not in {column['name'] for column in inspector.get_columns(model.__tablename__)}]
+    if missing_unit:
+        logging.warning(f"Tabelas sem a coluna unit ({', '.join(missing_unit)}): "
+                        f"execute python update_report_unit.py para atualizar o banco")
+
+    # Inicializar os totais acumulados e as estatísticas por período para bancos que já possuem relatórios
+    try:
+        if not missing_unit and db.session.query(Report.id).first() is not None:
+            for model in [ReportTotals] + ROLLUP_MODELS:
+                if model.query.first() is None:
+                    logging.info(f"Tabela {model.__tablename__} vazia, reconstruindo a partir dos relatórios existentes")
+                    model.rebuild()
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Erro ao inicializar os totais acumulados: {str(e)}")
+
 @app.route("/healthz")
 def healthz():
     """Health check endpoint for deployment."""
-    return jsonify({"status": "ok"}), 200
+    return jsonify({
+        "status": "ok",
+        "ai_cache": result_cache.stats(),
+        "ai_provider": ai_analyzer.provider_status(),
+        "print_cache": print_cache.stats(),
+        "calendar_cache": calendar_cache.stats(),
+        "edge_sync": sync_worker.stats() if EDGE_MODE else None
+    }), 200
 
 @app.route("/")
 def index():
@@ -80,9 +172,23 @@ def reset_database():
     This deletes all reports and resets the counters.
     """
     try:
-        # Excluir todos os relatórios
+        # Excluir todos os relatórios e os totais acumulados
+        # (exclusão em massa não passa pelos eventos do ORM)
         Report.query.delete()
+        ReportTotals.query.delete()
+        for model in ROLLUP_MODELS:
+            model.query.delete()
+        # Meses fechados: relatórios arquivados e resumos
+        ReportArchive.query.delete()
+        ReportPeriodSummary.query.delete()
+        ClosedPeriod.query.delete()
+        # Todas as datas mudaram: clientes do calendário compacto recarregam a janela inteira
+        ReportChange.query.delete()
+        ReportChange.record(DataVersion.bump(), [None])
+        # Modo edge: o reset vale apenas para o banco local (nada é excluído no banco central)
+        SyncOutbox.query.delete()
         db.session.commit()
+        calendar_cache.clear()
         
         return jsonify({
             "success": True,
@@ -107,11 +213,150 @@ def reset_database():
         logging.error(f"Erro ao resetar o banco de dados: {str(e)}")
         return jsonify({"error": f"Ocorreu um erro ao resetar os dados: {str(e)}"}), 500
 
+def unit_arg(value=None):
+    """Código da unidade (parâmetro unit), validado no cadastro; None se ausente"""
+    unit = value if value is not None else request.args.get("unit")
+    if not unit:
+        return None
+    if not unit_registry.exists(unit):
+        raise ValueError(f"Unidade desconhecida: {unit}")
+    return unit
+
+@app.route("/api/units", methods=["GET"])
+def list_units():
+    """API endpoint com as unidades cadastradas e seus locais"""
+    return jsonify({"success": True, "units": unit_registry.units()})
+
+@app.route("/api/totals", methods=["GET"])
+def get_totals():
+    """
+    API endpoint somente leitura com os totais acumulados (de todas as unidades ou,
+    com o parâmetro unit, de uma unidade).
+
+    A resposta traz um ETag baseado na versão dos dados; requisições com
+    If-None-Match correspondente recebem 304 sem recalcular nada.
+    """
+    try:
+        unit = unit_arg()
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    try:
+        version = DataVersion.current()
+        etag = f"totals-{version}"
+        
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        else:
+            response = jsonify({
+                "success": True,
+                "version": version,
+                "totals": ReportTotals.get_totals(unit)
+            })
+        
+        # Sempre revalidar com o servidor, mas permitir reaproveitar a resposta em cache
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+        
+    except Exception as e:
+        logging.error(f"Erro ao obter os totais: {str(e)}")
+        return jsonify({"error": f"Ocorreu um erro ao obter os totais: {str(e)}"}), 500
+
+def build_report(report_text):
+    """
+    Extrai os dados de um relatório policial e cria o objeto Report (sem salvar).
+
+    Tenta primeiro a análise por IA e usa a análise por regex como alternativa.
+    """
+    fields = None
+    
+    # Tentar usar a análise por IA primeiro (provedor resolvido na inicialização)
+    regex_reason = "ai_not_configured"
+    if ai_analyzer.is_configured():
+        try:
+            logging.info("Attempting to use AI analysis...")
+            
+            # Obter resultados da análise por IA
+            fields = ai_analyzer.analyze_police_report(report_text)
+            logging.info(f"Successfully created report from AI analysis")
+            metrics.record_extraction("ai")
+            
+        except ai_analyzer.AIUnavailableError as unavailable:
+            logging.warning(f"AI analysis unavailable, using regex: {str(unavailable)}")
+            regex_reason = "breaker_open"
+        except Exception as ai_error:
+            logging.error(f"Error using AI analysis, falling back to regex: {str(ai_error)}")
+            regex_reason = "ai_error"
+    
+    # Se não conseguimos usar IA, usamos a análise por regex
+    if fields is None:
+        logging.info("Using regex-based analysis...")
+        fields = extract_report_fields(report_text)
+        metrics.record_extraction("regex", regex_reason)
+    
+    return Report.from_analysis(fields)
+
+def is_true(value):
+    return str(value).lower() in ("1", "true", "yes")
+
+def submission_key_for(report_text, client_key=None):
+    """
+    Chave de idempotência da submissão: a enviada pelo cliente (cabeçalho
+    Idempotency-Key ou campo idempotency_key) ou o hash do texto do relatório
+    """
+    if client_key:
+        client_key = str(client_key).strip()
+        # Chaves longas são reduzidas ao hash para caber na coluna
+        return client_key if len(client_key) <= 64 else Report.submission_key_for(client_key)
+    return Report.submission_key_for(report_text)
+
+def save_reports(reports, replace=False):
+    """
+    Grava os relatórios em uma única transação e um único flush, respeitando a chave
+    natural (ver Report.store_all).
+
+    Se outra requisição gravar o mesmo relatório ao mesmo tempo, a restrição única
+    desfaz a transação e a gravação é refeita uma vez (encontrando o relatório já salvo).
+
+    Returns:
+        list: (relatório, resultado) na ordem recebida
+    """
+    for attempt in range(2):
+        try:
+            results = Report.store_all(reports, replace)
+            db.session.commit()
+            return results
+        except IntegrityError as e:
+            db.session.rollback()
+            if attempt:
+                raise
+            logging.warning(f"Relatório gravado por outra requisição, tentando novamente: {str(e)}")
+            for report in reports:
+                report.id = None
+
+def conflict_message(report):
+    return (f"Já existe um relatório de {report.location} em {report.date} ({report.shift}); "
+            f"envie replace=true para substituí-lo")
+
+def closed_message(report):
+    return f"O mês de {report.report_date.strftime('%m/%Y')} está fechado e não aceita novos relatórios"
+
 @app.route("/analyze", methods=["POST"])
 def analyze():
     """
     API endpoint to analyze police report text.
     This processes and stores the data in the database.
+
+    Cada data/local/turno tem um único relatório. Uma submissão repetida (mesma
+    chave Idempotency-Key/idempotency_key ou mesmo texto) devolve o relatório já
+    salvo sem nova análise; um relatório diferente para a mesma data/local/turno
+    responde 409, a menos que replace=true seja enviado para substituí-lo.
+    Relatórios de meses fechados também respondem 409 (outcome "closed").
+
+    O campo opcional unit limita os totais da resposta a uma unidade; a unidade do
+    relatório vem do seu local (cadastro de unidades), ou é a unidade informada
+    quando o local não está cadastrado (ex.: "NÃO IDENTIFICADO").
     """
     try:
         if not request.is_json:
@@ -122,270 +367,255 @@ def analyze():
             return jsonify({"error": "No text provided for analysis"}), 400
             
         report_text = data['text']
-        # Normalize text
-        normalized_text = report_text.upper()
         
-        # Verificar se é apenas uma solicitação de totais (para exibição ao voltar do calendário)
+        # Verificar se é apenas uma solicitação de totais (compatibilidade com clientes antigos;
+        # a página principal agora usa GET /api/totals)
         is_totals_only_request = "Relatório apenas para carregar totais" in report_text
         
+        submission_key = submission_key_for(
+            report_text, request.headers.get('Idempotency-Key') or data.get('idempotency_key'))
+        replace = is_true(data.get('replace', request.args.get('replace', False)))
+        try:
+            unit = unit_arg(data.get('unit'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        
+        # Submissão repetida: devolver o relatório já salvo, sem chamar a IA novamente
+        if not is_totals_only_request and not replace:
+            existing = Report.query.filter_by(submission_key=submission_key).first()
+            if existing is not None:
+                return jsonify({
+                    "success": True,
+                    "outcome": "duplicate",
+                    "data": existing.to_dict(),
+                    "totals": ReportTotals.get_totals(unit)
+                })
+        
+        # Modo assíncrono: gravar a submissão e responder imediatamente com o id do job
+        run_async = data.get('async', request.args.get('async', ANALYZE_ASYNC_DEFAULT))
+        if not is_totals_only_request and is_true(run_async):
+            job = job_runner.create_job(report_text, submission_key, replace, unit)
+            status_url = url_for("get_analysis_job", job_id=job.id)
+            response = jsonify({
+                "success": True,
+                "job": job.to_dict(),
+                "status_url": status_url
+            })
+            response.headers["Location"] = status_url
+            return response, 202
+        
         # Se não for apenas para obter totais, vamos processar e salvar o relatório
         if not is_totals_only_request:
-            # Variável para indicar se usamos IA ou não
-            using_ai_analysis = False
-            
-            # Tentar usar a análise por IA primeiro
-            try:
-                from ai_analyzer import analyze_police_report
-                logging.info("Attempting to use AI analysis...")
-                
-                # Obter resultados da análise por IA
-                ai_results = analyze_police_report(report_text)
-                
-                # Criar relatório com os dados analisados pela IA
-                new_report = Report(
-                    location=ai_results.get('location', 'NÃO IDENTIFICADO'),
-                    date=ai_results.get('date', ''),
-                    shift=ai_results.get('shift', 'Não identificado'),
-                    people_count=ai_results.get('people_count', 0),
-                    motorcycles_count=ai_results.get('motorcycles_count', 0),
-                    cars_count=ai_results.get('cars_count', 0),
-                    bicycles_count=ai_results.get('bicycles_count', 0),
-                    arrests_count=ai_results.get('arrests_count', 0),
-                    seized_motorcycles_count=ai_results.get('seized_motorcycles_count', 0),
-                    drugs_seized_count=ai_results.get('drugs_seized_count', 0),
-                    fugitives_count=ai_results.get('fugitives_count', 0),
-                    bladed_weapons_count=ai_results.get('bladed_weapons_count', 0),
-                    firearms_count=ai_results.get('firearms_count', 0),
-                    occurrence=ai_results.get('occurrence', 'Sem ocorrência relevante')
-                )
-                
-                using_ai_analysis = True
-                logging.info(f"Successfully created report from AI analysis")
-                
-            except Exception as ai_error:
-                logging.error(f"Error using AI analysis, falling back to regex: {str(ai_error)}")
-                using_ai_analysis = False
-            
-            # Se não conseguimos usar IA, usamos a análise por regex
-            if not using_ai_analysis:
-                logging.info("Using regex-based analysis...")
-                # Extract location
-                location = "NÃO IDENTIFICADO"
-                if "MUANÁ" in normalized_text:
-                    location = "MUANÁ"
-                elif "PONTA DE PEDRAS" in normalized_text:
-                    location = "PONTA DE PEDRAS"
-                
-                # Extract date
-                date_match = re.findall(r'\d{2}/\d{2}/\d{4}', report_text)
-                date = date_match[0] if date_match else None
-                
-                # Extract shift
-                shift = "Não identificado"
-                if "07:30" in normalized_text and "19:30" in normalized_text:
-                    shift = "Diurno (07:30 às 19:30)"
-                elif "19:30" in normalized_text and "07:30" in normalized_text:
-                    shift = "Noturno (19:30 às 07:30)"
-                
-                # Extract inspection counts
-                people_match = re.search(r'PESSOAS A PÉ\s*:\s*(\d+)', normalized_text, re.IGNORECASE)
-                motorcycles_match = re.search(r'MOTOS\s*:\s*(\d+)', normalized_text, re.IGNORECASE)
-                cars_match = re.search(r'CARRO[S]*\s*:\s*(\d+)', normalized_text, re.IGNORECASE)
-                bicycles_match = re.search(r'BICICLETAS\s*:\s*(\d+)', normalized_text, re.IGNORECASE)
-                
-                # Extract occurrence
-                occurrence_match = re.search(r'OCORRÊNCIA[^:]*:\s*(.+?)(?=\n|$)', normalized_text, re.IGNORECASE)
-                occurrence = occurrence_match[1].strip() if occurrence_match else "Sem ocorrência relevante"
-                
-                # Extrair dados de prisões, apreensões de motos e apreensões de drogas
-                arrests_match = re.search(r'PRIS[ÕO]ES\s*:\s*(\d+)', normalized_text, re.IGNORECASE) or \
-                                re.search(r'PRESOS\s*:\s*(\d+)', normalized_text, re.IGNORECASE)
-                                
-                seized_motorcycles_match = re.search(r'MOTOS\s*APREENDIDAS\s*:\s*(\d+)', normalized_text, re.IGNORECASE) or \
-                                          re.search(r'APREENS[ÃA]O\s*DE\s*MOTOS\s*:\s*(\d+)', normalized_text, re.IGNORECASE)
-                                          
-                drugs_match = re.search(r'DROGAS\s*APREENDIDAS\s*:\s*(\d+)', normalized_text, re.IGNORECASE) or \
-                              re.search(r'APREENS[ÃA]O\s*DE\s*DROGAS\s*:\s*(\d+)', normalized_text, re.IGNORECASE)
-                
-                # Verificar texto da ocorrência para inferir valores não explícitos
-                arrests_count = int(arrests_match[1]) if arrests_match else 0
-                seized_motorcycles_count = int(seized_motorcycles_match[1]) if seized_motorcycles_match else 0
-                drugs_seized_count = int(drugs_match[1]) if drugs_match else 0
-                
-                # Agora vamos verificar por múltiplas prisões/conduções no texto
-                # Iniciar contagem com o valor explícito
-                arrests_count = int(arrests_match[1]) if arrests_match else 0
-                
-                # Lista de palavras-chave que indicam prisão
-                arrest_keywords = [
-                    'PRISÃO', 'PRESO', 'DETIDO', 'DETENÇÃO', 'FLAGRANTE',
-                    'APRESENTAÇÃO NA DELEGACIA', 'APRESENTADO NA DELEGACIA',
-                    'CONDUZIDO À DELEGACIA', 'CONDUZIDO PARA DELEGACIA',
-                    'CONDUZINDO O MESMO ATÉ A DELEGACIA', 'CONDUZINDO A DELEGACIA',
-                    'CONDUZINDO PARA A DELEGACIA', 'ENCAMINHADO À DELEGACIA'
-                ]
-                
-                # Verificar se qualquer keyword existe no texto
-                has_arrest_keywords = any(keyword in normalized_text for keyword in arrest_keywords)
-                
-                # Procurar nomes próprios/identificados no texto
-                # Padrões de nome (entre asteriscos ou destacados)
-                name_patterns = [
-                    r'\*([A-ZÁÀÂÃÉÈÊÍÏÓÔÕÖÚÇÑ]+\s+(?:[A-ZÁÀÂÃÉÈÊÍÏÓÔÕÖÚÇÑ]+\s+){1,3}[A-ZÁÀÂÃÉÈÊÍÏÓÔÕÖÚÇÑ]+)\*',  # Nomes entre asteriscos
-                    r'SR\.?\s+([A-ZÁÀÂÃÉÈÊÍÏÓÔÕÖÚÇÑ]+\s+(?:[A-ZÁÀÂÃÉÈÊÍÏÓÔÕÖÚÇÑ]+\s+){1,3}[A-ZÁÀÂÃÉÈÊÍÏÓÔÕÖÚÇÑ]+)',  # Nomes com Sr.
-                    r'SRA\.?\s+([A-ZÁÀÂÃÉÈÊÍÏÓÔÕÖÚÇÑ]+\s+(?:[A-ZÁÀÂÃÉÈÊÍÏÓÔÕÖÚÇÑ]+\s+){1,3}[A-ZÁÀÂÃÉÈÊÍÏÓÔÕÖÚÇÑ]+)',  # Nomes com Sra.
-                    r'NACIONAL\s*:\s*([A-ZÁÀÂÃÉÈÊÍÏÓÔÕÖÚÇÑ]+\s+(?:[A-ZÁÀÂÃÉÈÊÍÏÓÔÕÖÚÇÑ]+\s+){1,3}[A-ZÁÀÂÃÉÈÊÍÏÓÔÕÖÚÇÑ]+)',  # Após NACIONAL:
-                    r'NOME\s*:\s*([A-ZÁÀÂÃÉÈÊÍÏÓÔÕÖÚÇÑ]+\s+(?:[A-ZÁÀÂÃÉÈÊÍÏÓÔÕÖÚÇÑ]+\s+){1,3}[A-ZÁÀÂÃÉÈÊÍÏÓÔÕÖÚÇÑ]+)'  # Após NOME:
-                ]
-                
-                # Encontrar todos os nomes no texto
-                identified_names = []
-                for pattern in name_patterns:
-                    names = re.finditer(pattern, normalized_text)
-                    for name_match in names:
-                        identified_names.append(name_match.group(1).strip())
-                
-                # Remover duplicados
-                identified_names = list(set(identified_names))
-                
-                # Se encontramos nomes E há palavras-chave de prisão, cada nome conta como 1 prisão
-                if has_arrest_keywords and identified_names:
-                    # Se há mais nomes do que a contagem atual de prisões, use o número de nomes como contagem
-                    if len(identified_names) > arrests_count:
-                        arrests_count = len(identified_names)
-                        logging.info(f"Identified {arrests_count} arrests based on names: {identified_names}")
-                        
-                # Se ainda não encontramos nenhuma prisão, mas temos keywords, considere pelo menos 1
-                if arrests_count == 0 and has_arrest_keywords:
-                    arrests_count = 1  # Assume pelo menos uma prisão
-                    
-                if seized_motorcycles_count == 0 and 'MOTO APREENDIDA' in normalized_text:
-                    seized_motorcycles_count = 1  # Assume pelo menos uma moto apreendida se mencionado
-                    
-                if drugs_seized_count == 0 and ('DROGA' in normalized_text or 'ENTORPECENTE' in normalized_text):
-                    drugs_seized_count = 1  # Assume pelo menos uma apreensão se mencionado
-                    
-                # Verificação adicional para contabilizar prisão quando há texto longo
-                # com palavras-chave que indicam prisão
-                if arrests_count == 0 and len(occurrence) > 50:
-                    arrest_indicators = [
-                        'DETENÇÃO', 'FAZENDO SUA DETENÇÃO', 
-                        'PRESO EM FLAGRANTE', 'DELEGACIA DE POLÍCIA', 
-                        'CONDUZINDO', 'CONDUZIDO', 'DETIDO'
-                    ]
-                    
-                    for indicator in arrest_indicators:
-                        if indicator in normalized_text:
-                            # Verificar se há pelo menos um nome próprio (palavras maiúsculas entre asteriscos)
-                            name_pattern = r'\*[A-ZÁÀÂÃÉÈÊÍÏÓÔÕÖÚÇÑ]+\s+[A-ZÁÀÂÃÉÈÊÍÏÓÔÕÖÚÇÑ]+\s+[A-ZÁÀÂÃÉÈÊÍÏÓÔÕÖÚÇÑ]+\*'
-                            if re.search(name_pattern, normalized_text):
-                                arrests_count = 1
-                                break
-                
-                # Verificar se tem foragidos
-                fugitives_count = 0
-                fugitive_keywords = ['FORAGIDO', 'EVADIDO', 'MANDADO DE PRISÃO']
-                for keyword in fugitive_keywords:
-                    if keyword in normalized_text:
-                        fugitives_count = 1
-                        
-                        # Se for foragido, também contabiliza como prisão
-                        if arrests_count == 0:
-                            arrests_count = 1
-                        break
-                
-                # Verificar se tem armas brancas apreendidas
-                bladed_weapons_count = 0
-                bladed_weapons_keywords = ['ARMA BRANCA', 'FACA', 'FACÃO', 'CANIVETE', 'ESTILETE', 'FACAS', 'PEIXEIRA']
-                for keyword in bladed_weapons_keywords:
-                    if keyword in normalized_text:
-                        bladed_weapons_count = 1
-                        break
-                
-                # Verificar se tem armas de fogo apreendidas
-                firearms_count = 0
-                firearms_keywords = ['ARMA DE FOGO', 'REVÓLVER', 'PISTOLA', 'ESPINGARDA', 'RIFLE', 'REVOLVER', 'ARMAMENTO', 'MUNIÇÃO']
-                for keyword in firearms_keywords:
-                    if keyword in normalized_text:
-                        firearms_count = 1
-                        break
-                        
-                # Create new report
-                new_report = Report(
-                    location=location,
-                    date=date,
-                    shift=shift,
-                    people_count=int(people_match[1]) if people_match else 0,
-                    motorcycles_count=int(motorcycles_match[1]) if motorcycles_match else 0,
-                    cars_count=int(cars_match[1]) if cars_match else 0,
-                    bicycles_count=int(bicycles_match[1]) if bicycles_match else 0,
-                    arrests_count=arrests_count,
-                    seized_motorcycles_count=seized_motorcycles_count,
-                    drugs_seized_count=drugs_seized_count,
-                    fugitives_count=fugitives_count,
-                    bladed_weapons_count=bladed_weapons_count,
-                    firearms_count=firearms_count,
-                    occurrence=occurrence
-                )
+            new_report = build_report(report_text)
+            new_report.submission_key = submission_key
+            new_report.unit = unit_registry.unit_for(new_report.location, unit)
             
             # Save to database
-            db.session.add(new_report)
-            db.session.commit()
+            [(new_report, outcome)] = save_reports([new_report], replace)
         
-        # Get all data for totals
-        reports = Report.query.all()
-        total_people = sum(report.people_count for report in reports)
-        total_motorcycles = sum(report.motorcycles_count for report in reports)
-        total_cars = sum(report.cars_count for report in reports)
-        total_bicycles = sum(report.bicycles_count for report in reports)
-        total_arrests = sum(report.arrests_count for report in reports)
-        total_seized_motorcycles = sum(report.seized_motorcycles_count for report in reports)
-        total_drugs_seized = sum(report.drugs_seized_count for report in reports)
-        total_fugitives = sum(report.fugitives_count for report in reports)
-        total_bladed_weapons = sum(report.bladed_weapons_count for report in reports)
-        total_firearms = sum(report.firearms_count for report in reports)
-        # Total de inspeções deve incluir apenas pessoas e veículos abordados
-        # Conforme solicitado pelo usuário: não incluir drogas apreendidas no total
-        total_inspections = (total_people + total_motorcycles + total_cars + total_bicycles +
-                            total_arrests + total_fugitives)
-        
-        # Return response based on request type
+        # Totais acumulados mantidos incrementalmente na tabela report_totals
         response_data = {
             "success": True,
-            "totals": {
-                "people": total_people,
-                "motorcycles": total_motorcycles,
-                "cars": total_cars,
-                "bicycles": total_bicycles,
-                "arrests": total_arrests,
-                "seizedMotorcycles": total_seized_motorcycles,
-                "drugsSeized": total_drugs_seized,
-                "fugitives": total_fugitives,
-                "bladedWeapons": total_bladed_weapons,
-                "firearms": total_firearms,
-                "totalInspections": total_inspections,
-                "reportsCount": len(reports)
-            }
+            "totals": ReportTotals.get_totals(unit)
         }
         
         # Se não for uma requisição apenas para totais, incluir os dados do relatório atual
         if not is_totals_only_request:
             response_data["data"] = new_report.to_dict()
+            response_data["outcome"] = outcome
+            if outcome == "conflict":
+                # Relatório existente mantido; o cliente decide se deve substituí-lo
+                response_data["success"] = False
+                response_data["error"] = conflict_message(new_report)
+                return jsonify(response_data), 409
+            if outcome == "closed":
+                response_data["success"] = False
+                response_data["error"] = closed_message(new_report)
+                return jsonify(response_data), 409
         
         return jsonify(response_data)
         
     except Exception as e:
+        db.session.rollback()
         logging.error(f"Error processing report: {str(e)}")
         return jsonify({"error": f"Ocorreu um erro ao processar o relatório: {str(e)}"}), 500
 
+def build_report_in_context(report_text):
+    """Executa build_report em uma thread separada, com contexto próprio da aplicação"""
+    with app.app_context():
+        return build_report(report_text)
+
+@app.route("/analyze/batch", methods=["POST"])
+def analyze_batch():
+    """
+    API endpoint para analisar vários relatórios de uma vez.
+
+    Aceita JSON com "text" (colagem com vários relatórios, separados pelos
+    cabeçalhos repetidos) ou "texts" (lista), ou um arquivo enviado no campo
+    "file". Todos os relatórios são gravados em uma única transação.
+
+    Relatórios já enviados (mesmo texto) e textos repetidos dentro do lote não
+    são analisados novamente (outcome "duplicate"); os que repetem a data/local/turno de um relatório
+    existente são ignorados (outcome "conflict"), ou substituem o existente
+    com replace=true. Relatórios de meses fechados são ignorados (outcome "closed").
+    O campo opcional unit limita os totais da resposta a uma unidade e recebe os
+    relatórios de locais não cadastrados.
+    """
+    try:
+        replace = is_true(request.args.get('replace', False))
+        unit = request.args.get('unit')
+        if request.is_json:
+            data = request.get_json()
+            replace = is_true(data.get('replace', replace))
+            unit = data.get('unit', unit)
+            if isinstance(data.get('texts'), list):
+                texts = [str(text).strip() for text in data['texts'] if str(text).strip()]
+            elif data.get('text'):
+                texts = split_reports(data['text'])
+            else:
+                return jsonify({"error": "No text provided for analysis"}), 400
+        elif 'file' in request.files:
+            replace = is_true(request.form.get('replace', replace))
+            unit = request.form.get('unit', unit)
+            content = request.files['file'].read().decode('utf-8', errors='replace')
+            texts = split_reports(content)
+        else:
+            return jsonify({"error": "Envie JSON com text/texts ou um arquivo no campo file"}), 400
+        
+        if not texts:
+            return jsonify({"error": "Nenhum relatório encontrado no texto enviado"}), 400
+        try:
+            unit = unit_arg(unit or "")
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        if len(texts) > BATCH_MAX_REPORTS:
+            return jsonify({
+                "error": f"O lote possui {len(texts)} relatórios; o máximo permitido é {BATCH_MAX_REPORTS}"
+            }), 413
+        
+        # Relatórios já enviados (mesma chave) não são analisados novamente
+        keys = [Report.submission_key_for(text) for text in texts]
+        existing = {}
+        if not replace:
+            existing = {report.submission_key: report
+                        for report in Report.query.filter(Report.submission_key.in_(set(keys)))}
+        
+        # Textos repetidos no lote são analisados uma vez só (primeira ocorrência)
+        first = {}
+        for index, key in enumerate(keys):
+            if key not in existing:
+                first.setdefault(key, index)
+        
+        # Extrair os relatórios com concorrência limitada (chamadas à IA em paralelo)
+        results = []
+        reports = []
+        pending = sorted(first.values())
+        with ThreadPoolExecutor(max_workers=max(1, min(BATCH_CONCURRENCY, len(pending)))) as executor:
+            futures = {index: executor.submit(build_report_in_context, texts[index]) for index in pending}
+            for index, key in enumerate(keys):
+                if key in existing:
+                    results.append({"index": index, "success": True, "outcome": "duplicate",
+                                    "report": existing[key]})
+                    continue
+                if first[key] != index:
+                    results.append({"index": index, "duplicate_of": first[key]})
+                    continue
+                try:
+                    report = futures[index].result()
+                    report.submission_key = key
+                    report.unit = unit_registry.unit_for(report.location, unit)
+                    reports.append(report)
+                    results.append({"index": index, "success": True, "report": report})
+                except Exception as e:
+                    logging.error(f"Erro ao analisar o relatório {index} do lote: {str(e)}")
+                    results.append({"index": index, "success": False, "error": str(e)})
+        
+        # Gravar todos os relatórios em uma única transação (um flush: totais atualizados uma vez por lote)
+        stored = iter(save_reports(reports, replace))
+        
+        for result in results:
+            if "duplicate_of" in result:
+                # Repetição no lote: mesmo resultado da primeira ocorrência
+                original = results[result.pop("duplicate_of")]
+                result["success"] = original["success"]
+                if original["success"]:
+                    result["outcome"] = "duplicate"
+                    result["data"] = original["data"]
+                else:
+                    result["error"] = original["error"]
+            elif result["success"]:
+                if "outcome" not in result:
+                    result["report"], result["outcome"] = next(stored)
+                result["data"] = result.pop("report").to_dict()
+        
+        outcomes = [result.get("outcome") for result in results]
+        return jsonify({
+            "success": True,
+            "count": outcomes.count("created") + outcomes.count("replaced"),
+            "duplicates": outcomes.count("duplicate"),
+            "conflicts": outcomes.count("conflict"),
+            "closed": outcomes.count("closed"),
+            "failed": outcomes.count(None),
+            "results": results,
+            "totals": ReportTotals.get_totals(unit)
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error processing report batch: {str(e)}")
+        return jsonify({"error": f"Ocorreu um erro ao processar o lote de relatórios: {str(e)}"}), 500
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_analysis_job(job_id):
+    """
+    API endpoint para consultar o andamento de uma análise assíncrona.
+    Quando concluída, a resposta inclui o relatório gerado e os totais atualizados
+    (da unidade informada no parâmetro unit, ou de todas).
+    """
+    try:
+        unit = unit_arg()
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    try:
+        job = db.session.get(AnalysisJob, job_id)
+        if job is None:
+            return jsonify({"success": False, "error": "Job não encontrado"}), 404
+        
+        # Retomar jobs parados (ex.: processo reiniciado durante a análise)
+        job_runner.resubmit_if_stale(job)
+        
+        response_data = {
+            "success": True,
+            "job": job.to_dict()
+        }
+        
+        if job.status == AnalysisJob.STATUS_DONE:
+            report = db.session.get(Report, job.report_id) if job.report_id else None
+            response_data["data"] = report.to_dict() if report else None
+            response_data["totals"] = ReportTotals.get_totals(unit)
+        
+        return jsonify(response_data)
+        
+    except Exception as e:
+        logging.error(f"Erro ao consultar job de análise: {str(e)}")
+        return jsonify({"success": False, "error": f"Ocorreu um erro ao consultar a análise: {str(e)}"}), 500
+
 @app.route("/delete-last", methods=["POST"])
 def delete_last_report():
     """
-    API endpoint para deletar o último relatório adicionado.
+    API endpoint para deletar o último relatório adicionado (da unidade informada no
+    parâmetro unit, ou de todas).
     """
+    try:
+        unit = unit_arg()
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
     try:
         # Buscar o último relatório pela data de criação (created_at)
-        last_report = Report.query.order_by(Report.created_at.desc()).first()
+        query = Report.query.filter(Report.unit == unit) if unit else Report.query
+        last_report = query.order_by(Report.created_at.desc(), Report.id.desc()).first()
         
         if not last_report:
             return jsonify({
@@ -404,40 +634,11 @@ def delete_last_report():
         db.session.delete(last_report)
         db.session.commit()
         
-        # Obter novos totais após a exclusão
-        reports = Report.query.all()
-        total_people = sum(report.people_count for report in reports)
-        total_motorcycles = sum(report.motorcycles_count for report in reports)
-        total_cars = sum(report.cars_count for report in reports)
-        total_bicycles = sum(report.bicycles_count for report in reports)
-        total_arrests = sum(report.arrests_count for report in reports)
-        total_seized_motorcycles = sum(report.seized_motorcycles_count for report in reports)
-        total_drugs_seized = sum(report.drugs_seized_count for report in reports)
-        total_fugitives = sum(report.fugitives_count for report in reports)
-        total_bladed_weapons = sum(report.bladed_weapons_count for report in reports)
-        total_firearms = sum(report.firearms_count for report in reports)
-        # Calcular o total de inspeções (pessoas, veículos, prisões e foragidos)
-        total_inspections = (total_people + total_motorcycles + total_cars + total_bicycles + 
-                            total_arrests + total_fugitives)
-        
         return jsonify({
             "success": True,
             "message": f"Relatório excluído com sucesso: {report_info['local']} - {report_info['data']} ({report_info['turno']})",
             "deleted_report": report_info,
-            "totals": {
-                "people": total_people,
-                "motorcycles": total_motorcycles,
-                "cars": total_cars,
-                "bicycles": total_bicycles,
-                "arrests": total_arrests,
-                "seizedMotorcycles": total_seized_motorcycles,
-                "drugsSeized": total_drugs_seized,
-                "fugitives": total_fugitives,
-                "bladedWeapons": total_bladed_weapons,
-                "firearms": total_firearms,
-                "totalInspections": total_inspections,
-                "reportsCount": len(reports)
-            }
+            "totals": ReportTotals.get_totals(unit)
         })
         
     except Exception as e:
@@ -449,7 +650,19 @@ def delete_last_report():
 
 @app.route("/api/calendar", methods=["GET"])
 def get_reports_calendar():
-    """API endpoint to get the reports calendar."""
+    """
+    API endpoint to get the reports calendar.
+
+    Com format=compact, locais e turnos vêm uma vez e cada dia como [máscara, ids...];
+    com since=<version da resposta anterior>, apenas os dias alterados desde então
+    (ver Report.get_reports_calendar_compact). O parâmetro unit escolhe a unidade
+    (padrão: a unidade principal).
+    """
+    try:
+        unit = unit_arg()
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
     try:
         # Obter a data de início da requisição
         start_date = request.args.get("start_date")
@@ -477,8 +690,20 @@ def get_reports_calendar():
         
         logging.info(f"Carregando calendário para: {start_date} com {days} dias")
         
+        if request.args.get("format") == "compact":
+            since = request.args.get("since")
+            try:
+                since = int(since) if since else None
+            except ValueError:
+                return jsonify({"success": False, "error": "Parâmetro since inválido"}), 400
+            
+            return jsonify({
+                "success": True,
+                **Report.get_reports_calendar_compact(start_date, days, since, unit)
+            })
+        
         # Obter o calendário de relatórios para a data especificada
-        calendar = Report.get_reports_calendar(start_date, days)
+        calendar = Report.get_reports_calendar(start_date, days, unit)
         
         return jsonify({
             "success": True,
@@ -489,62 +714,51 @@ def get_reports_calendar():
         logging.error(f"Error getting reports calendar: {str(e)}")
         return jsonify({"error": f"Ocorreu um erro ao obter o calendário de relatórios: {str(e)}"}), 500
 
+def parse_date_arg(name):
+    """Lê um parâmetro de data (DD/MM/AAAA) da query string; retorna None se ausente"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%d/%m/%Y")
+    except ValueError:
+        raise ValueError(f"Parâmetro {name} inválido, use o formato DD/MM/AAAA")
+
 @app.route("/api/reports-by-location", methods=["GET"])
 def get_reports_by_location():
-    """API endpoint para obter relatórios separados por localização"""
+    """
+    API endpoint para obter relatórios separados por localização.
+
+    Parâmetros opcionais: start_date e end_date (DD/MM/AAAA), shift (Diurno/Noturno)
+    e unit (código da unidade).
+    """
     try:
-        reports = Report.query.all()
+        try:
+            start_date = parse_date_arg("start_date")
+            end_date = parse_date_arg("end_date")
+            unit = unit_arg()
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        shift = request.args.get("shift")
         
-        # Inicializar dicionários para cada localidade
-        locations = {}
+        # Agregação feita no banco: uma linha por localidade mais o total geral (localidade nula)
+        rows = Report.get_totals_by_location(start_date, end_date, shift, unit)
         
-        # Processar cada relatório e separá-los por localidade
-        for report in reports:
-            if report.location not in locations:
-                locations[report.location] = {
-                    'people': 0,
-                    'motorcycles': 0,
-                    'cars': 0,
-                    'bicycles': 0,
-                    'arrests': 0,
-                    'seized_motorcycles': 0,
-                    'drugs_seized': 0,
-                    'fugitives': 0,
-                    'bladed_weapons': 0,
-                    'firearms': 0,
-                    'total_inspections': 0,
-                    'reports_count': 0
-                }
-            
-            # Adicionar contagens ao local específico
-            locations[report.location]['people'] += report.people_count
-            locations[report.location]['motorcycles'] += report.motorcycles_count
-            locations[report.location]['cars'] += report.cars_count
-            locations[report.location]['bicycles'] += report.bicycles_count
-            locations[report.location]['arrests'] += report.arrests_count
-            locations[report.location]['seized_motorcycles'] += report.seized_motorcycles_count
-            locations[report.location]['drugs_seized'] += report.drugs_seized_count
-            locations[report.location]['fugitives'] += report.fugitives_count
-            locations[report.location]['bladed_weapons'] += report.bladed_weapons_count
-            locations[report.location]['firearms'] += report.firearms_count
-            locations[report.location]['total_inspections'] += report.total_inspections
-            locations[report.location]['reports_count'] += 1
-        
-        # Obter também os totais gerais
-        all_totals = {
-            'people': sum(loc['people'] for loc in locations.values()),
-            'motorcycles': sum(loc['motorcycles'] for loc in locations.values()),
-            'cars': sum(loc['cars'] for loc in locations.values()),
-            'bicycles': sum(loc['bicycles'] for loc in locations.values()),
-            'arrests': sum(loc['arrests'] for loc in locations.values()),
-            'seized_motorcycles': sum(loc['seized_motorcycles'] for loc in locations.values()),
-            'drugs_seized': sum(loc['drugs_seized'] for loc in locations.values()),
-            'fugitives': sum(loc['fugitives'] for loc in locations.values()),
-            'bladed_weapons': sum(loc['bladed_weapons'] for loc in locations.values()),
-            'firearms': sum(loc['firearms'] for loc in locations.values()),
-            'total_inspections': sum(loc['total_inspections'] for loc in locations.values()),
-            'reports_count': sum(loc['reports_count'] for loc in locations.values())
-        }
+        keys = ['people', 'motorcycles', 'cars', 'bicycles', 'arrests', 'seized_motorcycles',
+                'drugs_seized', 'fugitives', 'bladed_weapons', 'firearms']
+        locations = {}
+        all_totals = None
+        for location, reports_count, *sums in rows:
+            entry = dict(zip(keys, sums))
+            # Total de inspeções: pessoas, veículos, prisões e foragidos
+            entry['total_inspections'] = (entry['people'] + entry['motorcycles'] + entry['cars'] +
+                                          entry['bicycles'] + entry['arrests'] + entry['fugitives'])
+            entry['reports_count'] = reports_count
+            if location is None:
+                all_totals = entry
+                metrics.record_rows_scanned("reports_by_location", reports_count)
+            else:
+                locations[location] = entry
         
         return jsonify({
             'success': True,
@@ -559,6 +773,336 @@ def get_reports_by_location():
             'error': str(e)
         }), 500
 
+@app.route("/api/stats/timeseries", methods=["GET"])
+def get_stats_timeseries():
+    """
+    API endpoint com a série temporal de um indicador, a partir das estatísticas por dia/mês.
+
+    Parâmetros: metric (ex.: arrests, people, total_inspections, reports_count; obrigatório),
+    grain (day, week ou month; padrão month), by (location, shift, location_shift ou none;
+    padrão location) e os filtros opcionais start_date, end_date (DD/MM/AAAA), location, shift
+    e unit.
+    """
+    grain = request.args.get("grain", "month")
+    metric = request.args.get("metric")
+    by = request.args.get("by", "location")
+    
+    metrics_available = list(TIMESERIES_METRICS) + ['total_inspections', 'reports_count']
+    try:
+        if grain not in ("day", "week", "month"):
+            raise ValueError("Parâmetro grain inválido, use day, week ou month")
+        if metric not in metrics_available:
+            raise ValueError(f"Parâmetro metric inválido, use um de: {', '.join(metrics_available)}")
+        if by not in ("location", "shift", "location_shift", "none"):
+            raise ValueError("Parâmetro by inválido, use location, shift, location_shift ou none")
+        start_date = parse_date_arg("start_date")
+        end_date = parse_date_arg("end_date")
+        unit = unit_arg()
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    try:
+        series = get_timeseries(grain, metric, by, start_date, end_date,
+                                request.args.get("location"), request.args.get("shift"), unit)
+        
+        # Datas no formato DD/MM/AAAA, como no restante da API
+        for entry in series:
+            for point in entry['points']:
+                point['period'] = point['period'].strftime('%d/%m/%Y')
+        
+        return jsonify({
+            'success': True,
+            'grain': grain,
+            'metric': metric,
+            'by': by,
+            'series': series
+        })
+        
+    except Exception as e:
+        logging.error(f"Erro ao obter a série temporal: {str(e)}")
+        return jsonify({'success': False, 'error': f"Ocorreu um erro ao obter a série temporal: {str(e)}"}), 500
+
+@app.route("/api/stats/coverage", methods=["GET"])
+def get_stats_coverage():
+    """
+    API endpoint com a cobertura dos relatórios (enviados e faltantes) por mês, local e turno.
+
+    Parâmetros: start_date e end_date (DD/MM/AAAA; obrigatórios, intervalo de qualquer
+    tamanho até COVERAGE_MAX_DAYS dias) e os filtros opcionais location, shift e unit.
+    """
+    try:
+        start_date = parse_date_arg("start_date")
+        end_date = parse_date_arg("end_date")
+        if not start_date or not end_date:
+            raise ValueError("Parâmetros start_date e end_date são obrigatórios (DD/MM/AAAA)")
+        if end_date < start_date:
+            raise ValueError("Parâmetro end_date deve ser igual ou posterior a start_date")
+        if (end_date - start_date).days >= COVERAGE_MAX_DAYS:
+            raise ValueError(f"Intervalo máximo de {COVERAGE_MAX_DAYS} dias")
+        unit = unit_arg()
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    try:
+        rows = get_coverage(start_date.date(), end_date.date(),
+                            request.args.get("location"), request.args.get("shift"), unit)
+        
+        expected = sum(row['expected'] for row in rows)
+        submitted = sum(row['submitted'] for row in rows)
+        for row in rows:
+            row['coverage_pct'] = round(row['submitted'] * 100.0 / row['expected'], 1)
+        
+        return jsonify({
+            'success': True,
+            'start_date': start_date.strftime('%d/%m/%Y'),
+            'end_date': end_date.strftime('%d/%m/%Y'),
+            'coverage': rows,
+            'totals': {
+                'expected': expected,
+                'submitted': submitted,
+                'missing': expected - submitted,
+                'coverage_pct': round(submitted * 100.0 / expected, 1) if expected else None
+            }
+        })
+        
+    except Exception as e:
+        logging.error(f"Erro ao obter a cobertura dos relatórios: {str(e)}")
+        return jsonify({'success': False, 'error': f"Ocorreu um erro ao obter a cobertura dos relatórios: {str(e)}"}), 500
+
+def period_dict(closed):
+    return {
+        "period": closed.period.strftime('%m/%Y'),
+        "reports_count": closed.reports_count,
+        "closed_at": closed.closed_at.isoformat() if closed.closed_at else None
+    }
+
+@app.route("/api/periods", methods=["GET"])
+def list_closed_periods():
+    """
+    API endpoint com os meses fechados e os totais de cada um por localidade
+    (lidos de report_period_summary).
+    """
+    try:
+        summaries = {}
+        for row in ReportPeriodSummary.query.order_by(ReportPeriodSummary.location, ReportPeriodSummary.shift):
+            entry = build_totals_dict({column: getattr(row, column) for column in METRIC_COLUMNS}, row.reports_count)
+            summaries.setdefault(row.period, []).append({"location": row.location, "shift": row.shift, **entry})
+        
+        periods = []
+        for closed in ClosedPeriod.query.order_by(ClosedPeriod.period):
+            periods.append({**period_dict(closed), "totals": summaries.get(closed.period, [])})
+        
+        return jsonify({"success": True, "periods": periods})
+        
+    except Exception as e:
+        logging.error(f"Erro ao listar os meses fechados: {str(e)}")
+        return jsonify({"success": False, "error": f"Ocorreu um erro ao listar os meses fechados: {str(e)}"}), 500
+
+@app.route("/api/periods/close", methods=["POST"])
+def close_period():
+    """
+    API endpoint para fechar um mês (JSON ou query string: period=MM/AAAA).
+
+    Os relatórios do mês saem da tabela report para report_archive e os totais do mês
+    ficam em report_period_summary; as consultas do dia a dia (/analyze, calendário,
+    totais por localidade) passam a percorrer apenas o período aberto. Apenas meses
+    anteriores ao mês atual podem ser fechados.
+    """
+    data = request.get_json(silent=True) or {}
+    value = data.get("period") or request.args.get("period")
+    try:
+        try:
+            period = datetime.strptime(str(value), "%m/%Y").date()
+        except ValueError:
+            return jsonify({"success": False, "error": "Parâmetro period inválido, use o formato MM/AAAA"}), 400
+        try:
+            closed = ClosedPeriod.close(period)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        
+        db.session.commit()
+        logging.info(f"Mês {period.strftime('%m/%Y')} fechado com {closed.reports_count} relatórios")
+        return jsonify({"success": True, **period_dict(closed), "totals": ReportTotals.get_totals()})
+        
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Erro ao fechar o mês: {str(e)}")
+        return jsonify({"success": False, "error": f"Ocorreu um erro ao fechar o mês: {str(e)}"}), 500
+
+# Tamanho de página da listagem /api/reports
+REPORTS_PAGE_DEFAULT = 50
+REPORTS_PAGE_MAX = 500
+
+def encode_cursor(key):
+    """Cursor opaco com o (created_at, id) da última linha da página"""
+    created_at, report_id = key
+    raw = json.dumps([created_at.isoformat(), report_id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor):
+    try:
+        created_at, report_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), int(report_id)
+    except Exception:
+        raise ValueError("Parâmetro cursor inválido")
+
+@app.route("/api/reports", methods=["GET"])
+def list_reports():
+    """
+    API endpoint para listar relatórios, do mais recente para o mais antigo.
+
+    Parâmetros opcionais: location, shift (Diurno/Noturno), start_date e end_date
+    (DD/MM/AAAA), fields (lista separada por vírgulas, ex.: id,location,date),
+    limit (padrão 50, máximo 500) e cursor (valor de next_cursor da página anterior).
+    """
+    try:
+        start_date = parse_date_arg("start_date")
+        end_date = parse_date_arg("end_date")
+        
+        limit = request.args.get("limit", REPORTS_PAGE_DEFAULT, type=int)
+        if limit < 1 or limit > REPORTS_PAGE_MAX:
+            raise ValueError(f"Parâmetro limit deve estar entre 1 e {REPORTS_PAGE_MAX}")
+        
+        fields = list(LIST_FIELDS) + ['totalInspections']
+        if request.args.get("fields"):
+            fields = [field.strip() for field in request.args["fields"].split(",") if field.strip()]
+            unknown = [field for field in fields if field not in LIST_FIELDS and field != 'totalInspections']
+            if unknown:
+                raise ValueError(f"Campos desconhecidos: {', '.join(unknown)}")
+        
+        cursor = request.args.get("cursor")
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    try:
+        items, next_key = Report.list_page(fields, limit, after, start_date, end_date,
+                                           request.args.get("shift"), request.args.get("location"))
+        return jsonify({
+            'success': True,
+            'reports': items,
+            'next_cursor': encode_cursor(next_key) if next_key else None
+        })
+        
+    except Exception as e:
+        logging.error(f"Erro ao listar relatórios: {str(e)}")
+        return jsonify({'success': False, 'error': f"Ocorreu um erro ao listar os relatórios: {str(e)}"}), 500
+
+@app.route("/print/report", methods=["GET"])
+def print_report():
+    """
+    Documento de impressão (totais gerais e por município) renderizado no servidor.
+
+    Parâmetros opcionais: start_date e end_date (DD/MM/AAAA), shift (Diurno/Noturno),
+    unit (código da unidade) e format (html ou pdf, padrão html). O documento fica em
+    cache até a próxima alteração nos relatórios.
+    """
+    output_format = request.args.get("format", "html").lower()
+    if output_format not in ("html", "pdf"):
+        return jsonify({'success': False, 'error': "Parâmetro format inválido, use html ou pdf"}), 400
+    
+    try:
+        start_date = parse_date_arg("start_date")
+        end_date = parse_date_arg("end_date")
+        unit = unit_arg()
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    try:
+        # O navegador revalida com o ETag; sem alterações nos dados a resposta é 304
+        etag = f"print-{DataVersion.current()}"
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        else:
+            body, version = render_print_report(start_date, end_date, request.args.get("shift"), output_format,
+                                                unit)
+            etag = f"print-{version}"
+            mimetype = "application/pdf" if output_format == "pdf" else "text/html"
+            response = app.response_class(body, mimetype=mimetype)
+            if output_format == "pdf":
+                response.headers["Content-Disposition"] = "inline; filename=relatorio-produtividade.pdf"
+        
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+        
+    except PDFUnavailableError as e:
+        return jsonify({'success': False, 'error': str(e)}), 501
+    except Exception as e:
+        logging.error(f"Erro ao gerar o relatório de impressão: {str(e)}")
+        return jsonify({'success': False, 'error': f"Ocorreu um erro ao gerar o relatório de impressão: {str(e)}"}), 500
+
+# Linhas acumuladas antes de enviar cada pedaço da exportação
+EXPORT_CHUNK_ROWS = 500
+
+def _export_value(value):
+    """Converte datas para texto ISO na exportação"""
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+def generate_csv(rows):
+    """Gera o CSV em pedaços (cabeçalho com os nomes das colunas)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for index, row in enumerate(rows, 1):
+        writer.writerow([_export_value(value) for value in row])
+        if index % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def generate_ndjson(rows):
+    """Gera um objeto JSON por linha, em pedaços"""
+    lines = []
+    for row in rows:
+        record = {column: _export_value(value) for column, value in zip(EXPORT_COLUMNS, row)}
+        lines.append(json.dumps(record, ensure_ascii=False))
+        if len(lines) == EXPORT_CHUNK_ROWS:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+@app.route("/api/reports/export", methods=["GET"])
+def export_reports():
+    """
+    Exporta os relatórios em CSV ou NDJSON, enviando as linhas conforme são lidas do banco.
+
+    Parâmetros opcionais: format (csv ou ndjson, padrão csv), location, start_date e
+    end_date (DD/MM/AAAA) e shift (Diurno/Noturno).
+    """
+    export_format = request.args.get("format", "csv").lower()
+    if export_format not in ("csv", "ndjson"):
+        return jsonify({'success': False, 'error': "Parâmetro format inválido, use csv ou ndjson"}), 400
+    
+    try:
+        start_date = parse_date_arg("start_date")
+        end_date = parse_date_arg("end_date")
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    rows = Report.iter_export_rows(start_date, end_date, request.args.get("shift"), request.args.get("location"))
+    
+    if export_format == "csv":
+        body, mimetype = generate_csv(rows), "text/csv"
+    else:
+        body, mimetype = generate_ndjson(rows), "application/x-ndjson"
+    
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename=relatorios.{export_format}"
+    return response
+
+# Inicializar o processamento assíncrono de análises e retomar jobs pendentes
+job_runner.init_app(app, build_report)
+if not missing_unit:
+    job_runner.recover()
+
+# Modo edge: envio dos relatórios ao banco central em segundo plano
+if EDGE_MODE:
+    sync_worker.init_app(app)
+    sync_worker.start()
+
 # Run the app
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,346 @@
+"""
+Arquivos estáticos com hash de conteúdo, minificados e pré-comprimidos.
+
+`python assets.py` gera static/dist/ a partir de static/: CSS e JS minificados,
+o nome de cada arquivo com o hash do conteúdo (ex.: js/analyzer.3fa85f6457.js),
+versões .gz (e .br, com o pacote opcional brotli) e o manifest.json com o nome
+gerado de cada arquivo. O gunicorn executa o build ao iniciar (gunicorn.conf.py).
+
+Os templates usam asset_url('js/analyzer.js'). Com o manifesto, a URL aponta
+para /assets/<nome com hash>, servido com cache imutável de um ano e na
+codificação pré-comprimida aceita pelo navegador; sem o manifesto (ex.: python
+main.py sem build) ou com arquivos editados depois do build, volta para
+/static/<arquivo> sem hash.
+"""
+import os
+import re
+import sys
+import gzip
+import json
+import shutil
+import hashlib
+import logging
+import mimetypes
+
+from flask import request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_NAME = "manifest.json"
+
+# Arquivos com hash nunca mudam de conteúdo: cache de um ano, sem revalidação
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Extensões comprimidas (imagens PNG/JPG já são comprimidas)
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt"}
+
+# Codificações pré-comprimidas, na ordem de preferência
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+IDENTIFIER_CHARS = re.compile(r"[\w$]")
+
+# Palavras após as quais uma barra inicia uma expressão regular (e não uma divisão)
+REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "new", "delete", "void", "throw"}
+
+
+def _skip_string(source, start):
+    """Índice logo após a string (aspas simples/duplas ou template literal) iniciada em start"""
+    quote = source[start]
+    i = start + 1
+    while i < len(source):
+        char = source[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char == quote:
+            return i + 1
+        if quote == "`" and source.startswith("${", i):
+            i = _skip_template_expression(source, i + 2)
+            continue
+        i += 1
+    return len(source)
+
+
+def _skip_template_expression(source, start):
+    """Índice logo após o '}' que fecha uma expressão ${...} de um template literal"""
+    depth = 1
+    i = start
+    while i < len(source) and depth:
+        char = source[i]
+        if char in "'\"`":
+            i = _skip_string(source, i)
+            continue
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+        i += 1
+    return i
+
+
+def _skip_regex(source, start):
+    """Índice logo após a expressão regular literal (com as flags) iniciada em start"""
+    i = start + 1
+    in_class = False
+    while i < len(source) and source[i] != "\n":
+        char = source[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char == "[":
+            in_class = True
+        elif char == "]":
+            in_class = False
+        elif char == "/" and not in_class:
+            i += 1
+            break
+        i += 1
+    while i < len(source) and IDENTIFIER_CHARS.match(source[i]):
+        i += 1
+    return i
+
+
+def _regex_allowed(output):
+    """Verifica, pelo código já emitido, se uma barra nesta posição inicia uma regex"""
+    tail = "".join(output[-12:]).rstrip()
+    if not tail:
+        return True
+    if tail[-1] in "(,=:[!&|?{};+-*%<>~^":
+        return True
+    word = re.search(r"[\w$]+$", tail)
+    return bool(word) and word.group(0) in REGEX_KEYWORDS
+
+
+def _separator(whitespace, previous, following):
+    """
+    Separador necessário entre dois trechos de código: nenhum, espaço ou quebra de linha.
+    Quebras de linha só são removidas quando a inserção automática de ';' não pode mudar
+    o significado (após { ; , ( [ ou antes de } ) ] , ;).
+    """
+    if not previous:
+        return ""
+    if whitespace == "\n":
+        if previous in "{;,([" or following in "}),;]":
+            return ""
+        return "\n"
+    if IDENTIFIER_CHARS.match(previous) and IDENTIFIER_CHARS.match(following):
+        return " "
+    # "a - -b" e "a + +b" não podem ser unidos
+    if previous == following and previous in "+-":
+        return " "
+    return ""
+
+
+def minify_js(source):
+    """
+    Minificação conservadora de JavaScript: remove comentários, indentação e espaços
+    entre símbolos, mantendo as quebras de linha em que a inserção automática de ';'
+    pode ser necessária. Strings, template literals e regex literais não são alterados.
+    """
+    output = []
+    pending = None  # Espaço (" ") ou quebra de linha ("\n") ainda não emitidos
+    i = 0
+
+    def emit(token):
+        nonlocal pending
+        if pending is not None:
+            separator = _separator(pending, output[-1][-1] if output else "", token[0])
+            if separator:
+                output.append(separator)
+            pending = None
+        output.append(token)
+
+    while i < len(source):
+        char = source[i]
+
+        if char.isspace() or source.startswith("//", i) or source.startswith("/*", i):
+            # Espaços e comentários contam como um único separador
+            if char.isspace():
+                end = i
+                while end < len(source) and source[end].isspace():
+                    end += 1
+                newline = "\n" in source[i:end]
+            elif source.startswith("//", i):
+                end = source.find("\n", i)
+                end = len(source) if end < 0 else end
+                newline = False
+            else:
+                end = source.find("*/", i + 2)
+                end = len(source) if end < 0 else end + 2
+                newline = "\n" in source[i:end]
+            pending = "\n" if newline or pending == "\n" else " "
+            i = end
+            continue
+
+        if char in "'\"`":
+            end = _skip_string(source, i)
+        elif char == "/" and _regex_allowed(output):
+            end = _skip_regex(source, i)
+        else:
+            end = i + 1
+        emit(source[i:end])
+        i = end
+
+    return "".join(output) + "\n"
+
+
+def minify_css(source):
+    """
+    Minificação de CSS: remove comentários e espaços ao redor de { } ; , e >, após ':',
+    e o ';' antes de '}'. Strings (ex.: data URIs em url("...")) não são alteradas.
+    """
+    output = []
+    i = 0
+    while i < len(source):
+        char = source[i]
+        if char in "'\"":
+            end = _skip_string(source, i)
+            output.append(source[i:end])
+            i = end
+            continue
+        if source.startswith("/*", i):
+            end = source.find("*/", i + 2)
+            i = len(source) if end < 0 else end + 2
+            continue
+        if char.isspace():
+            while i < len(source) and source[i].isspace():
+                i += 1
+            # Antes de ':' o espaço é mantido (".card :hover" é diferente de ".card:hover")
+            if output and output[-1][-1] not in "{};,:>" and i < len(source) and source[i] not in "{};,>!":
+                output.append(" ")
+            continue
+        if char == "}" and output and output[-1] == ";":
+            output.pop()
+        output.append(char)
+        i += 1
+    return "".join(output).strip() + "\n"
+
+
+MINIFIERS = {".js": minify_js, ".css": minify_css}
+
+
+def hashed_name(path, content):
+    """Nome do arquivo com os 10 primeiros caracteres do SHA-256 do conteúdo"""
+    root, extension = os.path.splitext(path)
+    return f"{root}.{hashlib.sha256(content).hexdigest()[:10]}{extension}"
+
+
+def _source_files(static_dir, dist_dir):
+    """Arquivos de static/ (caminhos relativos com '/'), sem o diretório gerado"""
+    for directory, subdirectories, files in os.walk(static_dir):
+        if os.path.abspath(directory) == os.path.abspath(dist_dir):
+            subdirectories[:] = []
+            continue
+        subdirectories[:] = [name for name in subdirectories
+                             if os.path.abspath(os.path.join(directory, name)) != os.path.abspath(dist_dir)]
+        for name in sorted(files):
+            yield os.path.relpath(os.path.join(directory, name), static_dir).replace(os.sep, "/")
+
+
+def build(static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+    """
+    Gera o diretório dist_dir com os arquivos processados e o manifesto.
+
+    Returns:
+        dict: Manifesto {caminho original: caminho com hash}
+    """
+    shutil.rmtree(dist_dir, ignore_errors=True)
+    manifest = {}
+    original_size = 0
+    built_size = 0
+
+    for path in _source_files(static_dir, dist_dir):
+        with open(os.path.join(static_dir, path), "rb") as f:
+            content = f.read()
+        original_size += len(content)
+
+        extension = os.path.splitext(path)[1].lower()
+        if extension in MINIFIERS:
+            content = MINIFIERS[extension](content.decode("utf-8")).encode("utf-8")
+
+        target = hashed_name(path, content)
+        target_path = os.path.join(dist_dir, target)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        with open(target_path, "wb") as f:
+            f.write(content)
+
+        if extension in COMPRESSIBLE:
+            compressed = gzip.compress(content, compresslevel=9, mtime=0)
+            with open(target_path + ".gz", "wb") as f:
+                f.write(compressed)
+            if brotli is not None:
+                compressed = brotli.compress(content, quality=11)
+                with open(target_path + ".br", "wb") as f:
+                    f.write(compressed)
+            built_size += len(compressed)
+        else:
+            built_size += len(content)
+
+        manifest[path] = target
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    logging.info(f"{len(manifest)} arquivos estáticos gerados em {dist_dir} "
+                 f"({original_size} bytes originais, {built_size} bytes transferidos)"
+                 + ("" if brotli else "; instale o pacote brotli para gerar as versões .br"))
+    return manifest
+
+
+def load_manifest(static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+    """
+    Lê o manifesto do build. Retorna {} se ele não existir ou se algum arquivo de
+    static/ foi alterado depois do build (ex.: edição local sem rodar o build novamente).
+    """
+    manifest_path = os.path.join(dist_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        logging.info("Arquivos estáticos sem build (python assets.py); usando static/ sem hash")
+        return {}
+
+    built_at = os.path.getmtime(manifest_path)
+    for path in _source_files(static_dir, dist_dir):
+        if os.path.getmtime(os.path.join(static_dir, path)) > built_at:
+            logging.warning(f"{path} foi alterado depois do build dos arquivos estáticos; usando static/ sem hash")
+            return {}
+
+    with open(manifest_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def init_app(app):
+    """Registra asset_url nos templates e a rota /assets com cache imutável"""
+    manifest = load_manifest()
+
+    @app.template_global()
+    def asset_url(filename):
+        """URL do arquivo estático (com hash, quando houver build)"""
+        hashed = manifest.get(filename)
+        if hashed is None:
+            return url_for("static", filename=filename)
+        return url_for("serve_asset", filename=hashed)
+
+    @app.route("/assets/<path:filename>")
+    def serve_asset(filename):
+        """Arquivo gerado pelo build, na versão pré-comprimida aceita pelo navegador"""
+        mimetype = mimetypes.guess_type(filename)[0]
+        for encoding, suffix in ENCODINGS:
+            if request.accept_encodings[encoding] and os.path.exists(os.path.join(DIST_DIR, filename + suffix)):
+                response = send_from_directory(DIST_DIR, filename + suffix, mimetype=mimetype)
+                response.headers["Content-Encoding"] = encoding
+                break
+        else:
+            response = send_from_directory(DIST_DIR, filename)
+        response.headers["Cache-Control"] = CACHE_CONTROL
+        response.vary.add("Accept-Encoding")
+        return response
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    build()
+    sys.exit(0)
@@ -0,0 +1,94 @@
+"""
+Geração de um corpus sintético de relatórios de produtividade a partir do
+exemplo real em attached_assets/.
+"""
+import glob
+import os
+import random
+from datetime import date, timedelta
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LOCATIONS = ["MUANÁ", "PONTA DE PEDRAS"]
+SHIFTS = [("07:30 às 19:30", "Diurno (07:30 às 19:30)"), ("19:30 às 07:30", "Noturno (19:30 às 07:30)")]
+
+# Trechos de ocorrência que exercitam as regras de palavras-chave do extrator
+OCCURRENCE_SNIPPETS = [
+    "Sem alterações durante o turno.",
+    "O nacional *JOÃO PEREIRA DA SILVA* foi preso em flagrante e conduzido à delegacia.",
+    "Durante abordagem foi apreendida uma faca tipo peixeira com o suspeito.",
+    "Cumprimento de mandado de prisão contra foragido da justiça, capturado sem resistência.",
+    "Apreensão de um revólver calibre 38 e munição, o autor foi apresentado na delegacia.",
+    "Moto apreendida por irregularidade, encaminhada ao pátio.",
+    "Foram encontradas 12 petecas de entorpecente em poder do suspeito.",
+]
+
+
+def load_sample():
+    """Texto do relatório real usado como modelo"""
+    pattern = os.path.join(ROOT_DIR, "attached_assets", "Pasted--POL*.txt")
+    with open(sorted(glob.glob(pattern))[0], encoding="utf-8") as f:
+        return f.read()
+
+
+def generate_texts(count, seed=42, start=date(2025, 1, 1)):
+    """
+    Gera textos de relatório variando local, data, turno, contagens e ocorrência.
+
+    Args:
+        count (int): Quantidade de relatórios
+        seed (int): Semente para resultados reproduzíveis
+        start (date): Data do primeiro relatório
+    """
+    rng = random.Random(seed)
+    sample = load_sample()
+    header, _, _ = sample.partition("⚠️ *OCORRÊNCIA :*")
+
+    texts = []
+    for index in range(count):
+        location = rng.choice(LOCATIONS)
+        hours, _ = rng.choice(SHIFTS)
+        day = start + timedelta(days=index // 4)
+        text = (header
+                .replace("PONTA DE PEDRAS", location)
+                .replace("04/04/2025", day.strftime("%d/%m/%Y"))
+                .replace("07:30 às 19:30", hours)
+                .replace("PESSOAS A PÉ : 02", f"PESSOAS A PÉ : {rng.randint(0, 40):02d}")
+                .replace("MOTOS: 01", f"MOTOS: {rng.randint(0, 20):02d}")
+                .replace("VEÍCULOS CARRO: 00", f"VEÍCULOS CARRO: {rng.randint(0, 10):02d}")
+                .replace("BICICLETAS: 01", f"BICICLETAS: {rng.randint(0, 10):02d}"))
+        text += "⚠️ *OCORRÊNCIA :* " + " ".join(rng.sample(OCCURRENCE_SNIPPETS, rng.randint(1, 3)))
+        texts.append(text)
+    return texts
+
+
+def generate_rows(count, seed=42, start=date(2025, 1, 1)):
+    """
+    Gera linhas prontas para inserção em massa na tabela report.
+
+    Cada dia recebe os quatro relatórios (2 locais x 2 turnos), como na operação real.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for index in range(count):
+        day = start + timedelta(days=index // 4)
+        location = LOCATIONS[(index // 2) % 2]
+        shift = SHIFTS[index % 2][1]
+        rows.append({
+            "location": location,
+            "date": day.strftime("%d/%m/%Y"),
+            "report_date": day,
+            "shift": shift,
+            "people_count": rng.randint(0, 40),
+            "motorcycles_count": rng.randint(0, 20),
+            "cars_count": rng.randint(0, 10),
+            "bicycles_count": rng.randint(0, 10),
+            "arrests_count": rng.randint(0, 2),
+            "seized_motorcycles_count": rng.randint(0, 1),
+            "drugs_seized_count": float(rng.choice([0, 0, 0, 3, 15, 117])),
+            "fugitives_count": rng.randint(0, 1),
+            "bladed_weapons_count": rng.randint(0, 1),
+            "firearms_count": rng.randint(0, 1),
+            "occurrence": rng.choice(OCCURRENCE_SNIPPETS),
+        })
+    return rows
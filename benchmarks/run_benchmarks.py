@@ -0,0 +1,208 @@
+"""
+Microbenchmarks dos caminhos críticos da aplicação, sobre um banco SQLite local.
+
+Mede:
+    - extração por regex (extractor.extract_report_fields), por relatório
+    - Report.get_reports_calendar para um mês, com N relatórios armazenados (sem e com cache)
+    - cálculo dos totais retornados por /analyze (ReportTotals.get_totals)
+    - GET /api/reports-by-location
+
+Uso:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --sizes 1000,10000 --repeat 20
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/anterior.json
+
+Os resultados são gravados em JSON (benchmarks/results/ por padrão) para
+comparação entre execuções.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from corpus import generate_rows, generate_texts  # noqa: E402
+
+
+def measure(fn, repeat):
+    """Executa fn `repeat` vezes e retorna estatísticas em milissegundos"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "repeat": repeat,
+        "min_ms": round(samples[0], 4),
+        "mean_ms": round(statistics.mean(samples), 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "max_ms": round(samples[-1], 4),
+    }
+
+
+def git_commit():
+    """Commit atual do repositório (se disponível)"""
+    try:
+        return subprocess.check_output(
+            ["git", "-C", ROOT_DIR, "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def bench_extractor(repeat, corpus_size):
+    """Tempo médio de extração por regex por relatório"""
+    from extractor import extract_report_fields
+
+    texts = generate_texts(corpus_size)
+
+    def run():
+        for text in texts:
+            extract_report_fields(text)
+
+    stats = measure(run, repeat)
+    # Converter para tempo por relatório
+    per_report = {key: (round(value / corpus_size, 6) if key.endswith("_ms") else value)
+                  for key, value in stats.items()}
+    return {"name": "extractor.extract_report_fields", "size": corpus_size, "unit": "per_report",
+            "stats": per_report}
+
+
+def populate(app, size):
+    """Recria o banco com `size` relatórios sintéticos (inserção em massa)"""
+    from sqlalchemy import insert
+    from models import db, Report, ReportTotals, ROLLUP_MODELS
+    from calendar_cache import calendar_cache
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        rows = generate_rows(size)
+        for start in range(0, len(rows), 5000):
+            db.session.execute(insert(Report), rows[start:start + 5000])
+        ReportTotals.rebuild()
+        for model in ROLLUP_MODELS:
+            model.rebuild()
+        db.session.commit()
+        # Inserção em massa não passa pelos eventos do ORM que invalidam o cache do calendário
+        calendar_cache.clear()
+        return rows[len(rows) // 2]["report_date"]
+
+
+def bench_database(app, size, repeat):
+    """Benchmarks que dependem da quantidade de relatórios armazenados"""
+    from models import Report, ReportTotals
+    from calendar_cache import calendar_cache
+
+    middle_date = populate(app, size)
+    month_start = middle_date.replace(day=1).strftime("%d/%m/%Y")
+    client = app.test_client()
+    results = []
+
+    with app.app_context():
+        def calendar_uncached():
+            calendar_cache.clear()
+            Report.get_reports_calendar(month_start, 31)
+
+        results.append({
+            "name": "Report.get_reports_calendar", "size": size, "unit": "per_call",
+            "stats": measure(calendar_uncached, repeat),
+        })
+        results.append({
+            "name": "Report.get_reports_calendar (cache)", "size": size, "unit": "per_call",
+            "stats": measure(lambda: Report.get_reports_calendar(month_start, 31), repeat),
+        })
+        results.append({
+            "name": "totals (/analyze)", "size": size, "unit": "per_call",
+            "stats": measure(ReportTotals.get_totals, repeat),
+        })
+
+    def by_location():
+        response = client.get("/api/reports-by-location")
+        assert response.status_code == 200, response.data
+
+    results.append({
+        "name": "GET /api/reports-by-location", "size": size, "unit": "per_request",
+        "stats": measure(by_location, repeat),
+    })
+    return results
+
+
+def compare(results, previous_path):
+    """Imprime a variação da mediana em relação a uma execução anterior"""
+    with open(previous_path, encoding="utf-8") as f:
+        previous = {(r["name"], r["size"]): r for r in json.load(f)["results"]}
+
+    print(f"\nComparação com {previous_path}:")
+    for result in results:
+        old = previous.get((result["name"], result["size"]))
+        if not old:
+            continue
+        before, after = old["stats"]["median_ms"], result["stats"]["median_ms"]
+        change = ((after - before) / before * 100) if before else 0.0
+        print(f"  {result['name']:<35} n={result['size']:<7} {before:>10.4f} -> {after:>10.4f} ms ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks dos caminhos críticos")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="Quantidades de relatórios armazenados (separadas por vírgula)")
+    parser.add_argument("--repeat", type=int, default=10, help="Repetições por medição")
+    parser.add_argument("--corpus", type=int, default=200, help="Relatórios no corpus do extrator")
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: benchmarks/results/<data>.json)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparação")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Configurar o banco antes de importar a aplicação
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        from app import app
+        logging.getLogger().setLevel(logging.WARNING)
+
+        results = [bench_extractor(args.repeat, args.corpus)]
+        for size in sizes:
+            print(f"Populando banco com {size} relatórios...")
+            results.extend(bench_database(app, size, args.repeat))
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": "sqlite",
+        "sizes": sizes,
+        "results": results,
+    }
+
+    output = args.output or os.path.join(
+        BENCH_DIR, "results", f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    for result in results:
+        print(f"{result['name']:<35} n={result['size']:<7} mediana={result['stats']['median_ms']:.4f} ms "
+              f"p95={result['stats']['p95_ms']:.4f} ms")
+    print(f"\nResultados gravados em {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
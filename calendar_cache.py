@@ -0,0 +1,210 @@
+"""
+Cache do calendário de relatórios (/api/calendar), compartilhado entre os
+workers do gunicorn por meio de um arquivo SQLite local.
+
+Cada entrada guarda o calendário de uma unidade em uma janela (start_date, days).
+Quando um relatório é inserido, alterado ou excluído, apenas as entradas da
+unidade cuja janela contém a data desse relatório são removidas (ver listeners em models.py),
+depois do commit. Um contador de geração impede que um calendário calculado
+durante uma invalidação seja gravado com dados antigos.
+
+O número de entradas é limitado por CALENDAR_CACHE_SIZE; as menos usadas
+recentemente são descartadas.
+"""
+import os
+import json
+import hashlib
+import time
+import sqlite3
+import logging
+import threading
+
+# Quantidade máxima de janelas de calendário guardadas
+CALENDAR_CACHE_SIZE = int(os.environ.get("CALENDAR_CACHE_SIZE", "240"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calendar_entry (
+    unit TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    days INTEGER NOT NULL,
+    end_date TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (unit, start_date, days)
+);
+CREATE INDEX IF NOT EXISTS ix_calendar_entry_window ON calendar_entry (unit, start_date, end_date);
+CREATE INDEX IF NOT EXISTS ix_calendar_entry_last_used ON calendar_entry (last_used);
+CREATE TABLE IF NOT EXISTS calendar_generation (
+    id INTEGER PRIMARY KEY,
+    generation INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO calendar_generation (id, generation) VALUES (1, 0);
+"""
+
+
+class CalendarCache:
+    """Cache das janelas do calendário em um arquivo SQLite (datas em ISO, AAAA-MM-DD)"""
+
+    def __init__(self, max_size=CALENDAR_CACHE_SIZE):
+        self.max_size = max_size
+        self.path = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "invalidated": 0, "errors": 0}
+
+    def init_app(self, app):
+        """
+        Define o arquivo e cria as tabelas. Padrão: instance/calendar_cache-<hash do banco>.sqlite3,
+        para que bancos diferentes (ex.: testes e benchmarks) não compartilhem entradas.
+        """
+        database_hash = hashlib.sha256(
+            app.config["SQLALCHEMY_DATABASE_URI"].encode("utf-8")).hexdigest()[:12]
+        self.path = os.environ.get("CALENDAR_CACHE_PATH") or os.path.join(
+            app.instance_path, f"calendar_cache-{database_hash}.sqlite3")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        try:
+            with self._connect() as connection:
+                # Arquivos criados antes das unidades (entradas sem a coluna unit) são recriados
+                columns = [row[1] for row in connection.execute("PRAGMA table_info(calendar_entry)")]
+                if columns and "unit" not in columns:
+                    connection.execute("DROP TABLE calendar_entry")
+                connection.executescript(SCHEMA)
+        except sqlite3.Error as e:
+            logging.error(f"Erro ao inicializar o cache do calendário: {str(e)}")
+
+    def _connect(self):
+        """Conexão SQLite da thread atual (em modo WAL, para leituras concorrentes)"""
+        # Conexões não podem ser reaproveitadas depois de um fork (ex.: gunicorn --preload)
+        owner, connection = getattr(self._local, "connection", (None, None))
+        if connection is None or owner != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = (os.getpid(), connection)
+        return connection
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def generation(self):
+        """Contador incrementado a cada invalidação (usado para descartar gravações antigas)"""
+        if self.path is None:
+            return None
+        try:
+            return self._connect().execute(
+                "SELECT generation FROM calendar_generation WHERE id = 1").fetchone()[0]
+        except sqlite3.Error as e:
+            self._count("errors")
+            logging.error(f"Erro ao ler o cache do calendário: {str(e)}")
+            return None
+
+    def get(self, unit, start_date, days):
+        """Retorna o calendário em cache da unidade na janela ou None"""
+        if self.path is None:
+            return None
+        try:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT payload FROM calendar_entry WHERE unit = ? AND start_date = ? AND days = ?",
+                (unit, start_date.isoformat(), days)).fetchone()
+            if row is None:
+                self._count("misses")
+                return None
+            connection.execute(
+                "UPDATE calendar_entry SET last_used = ? WHERE unit = ? AND start_date = ? AND days = ?",
+                (time.time(), unit, start_date.isoformat(), days))
+            self._count("hits")
+            return json.loads(row[0])
+        except sqlite3.Error as e:
+            self._count("errors")
+            logging.error(f"Erro ao ler o cache do calendário: {str(e)}")
+            return None
+
+    def put(self, unit, start_date, days, end_date, calendar, generation):
+        """
+        Guarda o calendário da unidade na janela, desde que nenhuma invalidação tenha ocorrido
+        desde `generation` (lido antes de consultar o banco).
+        """
+        if self.path is None or generation is None:
+            return
+        try:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                current = connection.execute(
+                    "SELECT generation FROM calendar_generation WHERE id = 1").fetchone()[0]
+                if current != generation:
+                    connection.execute("ROLLBACK")
+                    return
+                connection.execute(
+                    "INSERT OR REPLACE INTO calendar_entry (unit, start_date, days, end_date, payload, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (unit, start_date.isoformat(), days, end_date.isoformat(),
+                     json.dumps(calendar, ensure_ascii=False), time.time()))
+                # Descartar as entradas menos usadas além do limite
+                connection.execute(
+                    "DELETE FROM calendar_entry WHERE rowid IN ("
+                    "SELECT rowid FROM calendar_entry ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_size,))
+                connection.execute("COMMIT")
+            except Exception:
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+                raise
+            self._count("stores")
+        except sqlite3.Error as e:
+            self._count("errors")
+            logging.error(f"Erro ao gravar o cache do calendário: {str(e)}")
+
+    def invalidate_dates(self, dates):
+        """
+        Remove as janelas que contêm alguma das datas, dadas como pares (unidade, data);
+        unidade None vale para todas as unidades, e dates=None remove tudo
+        """
+        if self.path is None:
+            return
+        try:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                removed = 0
+                if dates is None:
+                    removed = connection.execute("DELETE FROM calendar_entry").rowcount
+                else:
+                    for unit, day in dates:
+                        if unit is None:
+                            removed += connection.execute(
+                                "DELETE FROM calendar_entry WHERE start_date <= ? AND end_date >= ?",
+                                (day.isoformat(), day.isoformat())).rowcount
+                        else:
+                            removed += connection.execute(
+                                "DELETE FROM calendar_entry WHERE unit = ? AND start_date <= ? AND end_date >= ?",
+                                (unit, day.isoformat(), day.isoformat())).rowcount
+                connection.execute("UPDATE calendar_generation SET generation = generation + 1 WHERE id = 1")
+                connection.execute("COMMIT")
+            except Exception:
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+                raise
+            self._count("invalidated", removed)
+        except sqlite3.Error as e:
+            self._count("errors")
+            logging.error(f"Erro ao invalidar o cache do calendário: {str(e)}")
+
+    def clear(self):
+        self.invalidate_dates(None)
+
+    def stats(self):
+        """Contadores deste processo e quantidade de entradas no arquivo"""
+        with self._lock:
+            stats = dict(self._stats)
+        try:
+            stats["size"] = self._connect().execute(
+                "SELECT COUNT(*) FROM calendar_entry").fetchone()[0] if self.path else 0
+        except sqlite3.Error:
+            stats["size"] = None
+        return stats
+
+
+calendar_cache = CalendarCache()
@@ -0,0 +1,110 @@
+"""
+Disjuntor (circuit breaker) para chamadas a serviços externos.
+
+Após `failure_threshold` falhas consecutivas o disjuntor abre e as chamadas
+vão direto para a alternativa durante `cooldown_seconds`. Passado esse
+tempo, uma única chamada de teste é liberada (estado meio-aberto): se der
+certo o disjuntor fecha, se falhar volta a abrir por mais um período.
+
+O estado é mantido em memória, por processo (cada worker do gunicorn tem o seu).
+"""
+import time
+import logging
+import threading
+
+
+class CircuitOpenError(Exception):
+    """Chamada recusada porque o disjuntor está aberto"""
+
+
+class CircuitBreaker:
+    STATE_CLOSED = "closed"
+    STATE_OPEN = "open"
+    STATE_HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=5, cooldown_seconds=60.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        self._state = self.STATE_CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self._last_error = None
+        self._counters = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def _refresh(self):
+        """Passa de aberto para meio-aberto quando o período de espera termina (com o lock)"""
+        if self._state == self.STATE_OPEN and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+            self._state = self.STATE_HALF_OPEN
+            self._probe_in_flight = False
+
+    def allow_request(self):
+        """Indica se a chamada pode ser feita; no estado meio-aberto libera apenas uma"""
+        with self._lock:
+            self._refresh()
+            if self._state == self.STATE_CLOSED:
+                return True
+            if self._state == self.STATE_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                logging.info(f"Disjuntor {self.name}: liberando chamada de teste")
+                return True
+            self._counters["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._counters["successes"] += 1
+            self._consecutive_failures = 0
+            if self._state != self.STATE_CLOSED:
+                logging.info(f"Disjuntor {self.name}: serviço recuperado, fechando")
+            self._state = self.STATE_CLOSED
+            self._probe_in_flight = False
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self._counters["failures"] += 1
+            self._consecutive_failures += 1
+            self._last_error = str(error) if error is not None else None
+            if (self._state == self.STATE_HALF_OPEN
+                    or self._consecutive_failures >= self.failure_threshold):
+                if self._state != self.STATE_OPEN:
+                    self._counters["opened"] += 1
+                    logging.warning(f"Disjuntor {self.name}: aberto por {self.cooldown_seconds}s "
+                                    f"após {self._consecutive_failures} falha(s)")
+                self._state = self.STATE_OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Executa fn pelo disjuntor. Levanta CircuitOpenError quando a chamada é recusada;
+        qualquer exceção de fn é registrada como falha e propagada.
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(f"Disjuntor {self.name} aberto")
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
+        return result
+
+    def stats(self):
+        """Estado atual (exposto em /healthz)"""
+        with self._lock:
+            self._refresh()
+            retry_in = None
+            if self._state == self.STATE_OPEN:
+                retry_in = round(max(0.0, self.cooldown_seconds - (time.monotonic() - self._opened_at)), 1)
+            return {
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "cooldown_seconds": self.cooldown_seconds,
+                "retry_in_seconds": retry_in,
+                "last_error": self._last_error,
+                **self._counters,
+            }
@@ -0,0 +1,292 @@
+"""
+Modo edge: banco SQLite local (WAL) e envio dos relatórios para o banco central.
+
+Em destacamentos com conexão instável a aplicação grava os relatórios apenas no
+SQLite local, então nenhuma requisição espera pela rede. Cada inclusão, alteração
+ou exclusão fica registrada em sync_outbox (listener em models.py) e uma thread
+envia essas alterações ao banco central (CENTRAL_DATABASE_URL) em lotes.
+
+O envio é idempotente: no banco central cada relatório é localizado pela chave
+natural (unidade, data, local, turno) ou pela chave de idempotência e é
+atualizado em vez de duplicado, então reenviar um lote não muda o resultado. As
+linhas de sync_outbox só são removidas depois do commit no banco central; se a
+conexão cair ou o processo reiniciar, o envio recomeça da primeira linha pendente.
+
+Uso manual (ex.: teste com dois arquivos SQLite):
+    EDGE_MODE=true EDGE_DATABASE_URL=sqlite:////tmp/edge.db \\
+    CENTRAL_DATABASE_URL=sqlite:////tmp/central.db python edge_sync.py
+"""
+import os
+import sys
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy import create_engine, delete, event, func, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import db, Report, ClosedPeriod, SyncOutbox, METRIC_COLUMNS
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos (o envio é idempotente)
+    fcntl = None
+
+# Banco central que recebe os relatórios do modo edge
+CENTRAL_DATABASE_URL = os.environ.get("CENTRAL_DATABASE_URL")
+
+# Intervalo, em segundos, entre os envios (e espera após uma falha de conexão)
+SYNC_INTERVAL = int(os.environ.get("SYNC_INTERVAL", "30"))
+
+# Alterações enviadas por transação no banco central
+SYNC_BATCH_SIZE = int(os.environ.get("SYNC_BATCH_SIZE", "100"))
+
+# Tempo máximo, em milissegundos, de espera por uma trava do SQLite local
+SQLITE_BUSY_TIMEOUT = int(os.environ.get("SQLITE_BUSY_TIMEOUT", "5000"))
+
+# Pragmas aplicados a cada conexão SQLite: WAL permite leituras simultâneas a uma
+# escrita, e synchronous=NORMAL (seguro com WAL) evita um fsync por commit
+SQLITE_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=134217728",
+]
+
+# Colunas copiadas do relatório local para o banco central
+SYNC_COLUMNS = ['unit', 'location', 'date', 'shift', 'occurrence', 'submission_key'] + METRIC_COLUMNS
+
+
+class RejectedChange(Exception):
+    """Alteração que o banco central não aceita (ex.: relatório de mês fechado)"""
+    pass
+
+
+def configure_sqlite(engine):
+    """Aplica os pragmas do SQLite às novas conexões do engine (nada a fazer em outros bancos)"""
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def central_engine(url):
+    """Engine do banco central, com pragmas (SQLite) ou tempo limite de conexão (PostgreSQL)"""
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    options = {"pool_pre_ping": True, "pool_recycle": 300}
+    if make_url(url).get_backend_name() == "postgresql":
+        options["connect_args"] = {"connect_timeout": 10}
+    engine = create_engine(url, **options)
+    configure_sqlite(engine)
+    return engine
+
+
+class SyncWorker:
+    """Thread que envia as linhas de sync_outbox ao banco central"""
+
+    def __init__(self):
+        self.app = None
+        self.engine = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock_file = None
+        self._schema_ready = False
+        self._stats = {"pushed": 0, "failed": 0, "last_success": None, "last_error": None}
+
+    def init_app(self, app, central_url=CENTRAL_DATABASE_URL):
+        """
+        Configura o envio para o banco central.
+
+        Args:
+            app: Aplicação Flask (contexto aberto na thread de envio)
+            central_url: URL do banco central; sem ela o modo edge funciona apenas offline
+        """
+        self.app = app
+        if central_url:
+            self.engine = central_engine(central_url)
+        else:
+            logging.warning("CENTRAL_DATABASE_URL não definida: relatórios do modo edge ficam apenas no banco local")
+
+    @property
+    def enabled(self):
+        return self.engine is not None
+
+    def start(self):
+        """Inicia a thread de envio (uma por processo; a trava em instance/ deixa um único processo enviando)"""
+        if not self.enabled or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="edge-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            if self._acquire_process_lock():
+                with self.app.app_context():
+                    try:
+                        # Enquanto houver lotes completos, envia sem esperar o intervalo
+                        while self.sync_once() == SYNC_BATCH_SIZE and not self._stop.is_set():
+                            pass
+                    except Exception as e:
+                        db.session.rollback()
+                        self._stats["last_error"] = f"{datetime.utcnow().isoformat()} {str(e)}"
+                        logging.warning(f"Envio ao banco central adiado: {str(e)}")
+                    finally:
+                        db.session.remove()
+            self._stop.wait(SYNC_INTERVAL)
+
+    def _acquire_process_lock(self):
+        """Trava de arquivo que mantém um único worker do gunicorn enviando"""
+        if fcntl is None or self._lock_file is not None:
+            return True
+        os.makedirs(self.app.instance_path, exist_ok=True)
+        lock_file = open(os.path.join(self.app.instance_path, "edge_sync.lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def sync_once(self, batch_size=SYNC_BATCH_SIZE):
+        """
+        Envia um lote de alterações pendentes em uma única transação no banco central
+        (requer o contexto da aplicação).
+
+        Se o banco central recusar o lote (ex.: mês fechado ou chave de idempotência
+        já usada por outro relatório), as alterações são reenviadas uma a uma e as
+        recusadas ficam marcadas com o erro em sync_outbox. Falhas de conexão são
+        propagadas e o lote fica pendente.
+
+        Returns:
+            int: Quantidade de alterações processadas
+        """
+        if not self.enabled:
+            return 0
+        entries = (SyncOutbox.query.filter(SyncOutbox.error.is_(None))
+                   .order_by(SyncOutbox.id).limit(batch_size).all())
+        if not entries:
+            return 0
+        self._ensure_schema()
+
+        try:
+            self._push(entries)
+            done, failed = entries, {}
+        except (IntegrityError, RejectedChange):
+            done, failed = [], {}
+            for entry in entries:
+                try:
+                    self._push([entry])
+                    done.append(entry)
+                except (IntegrityError, RejectedChange) as e:
+                    failed[entry.id] = str(getattr(e, 'orig', e))
+                    logging.error(f"Alteração {entry.id} recusada pelo banco central: {failed[entry.id]}")
+
+        if done:
+            db.session.execute(delete(SyncOutbox).where(SyncOutbox.id.in_([entry.id for entry in done])))
+        for entry_id, error in failed.items():
+            db.session.execute(update(SyncOutbox).where(SyncOutbox.id == entry_id).values(error=error))
+        db.session.commit()
+
+        self._stats["pushed"] += len(done)
+        self._stats["failed"] += len(failed)
+        self._stats["last_success"] = datetime.utcnow().isoformat()
+        logging.info(f"{len(done)} alterações enviadas ao banco central")
+        return len(entries)
+
+    def _ensure_schema(self):
+        """Cria no banco central as tabelas que ainda não existem (ex.: banco novo)"""
+        if not self._schema_ready:
+            db.metadata.create_all(self.engine)
+            self._schema_ready = True
+
+    def _push(self, entries):
+        """Aplica as alterações no banco central em uma transação (totais atualizados pelos listeners)"""
+        with Session(self.engine, info={"sync_push": True}) as central:
+            for entry in entries:
+                if entry.operation == SyncOutbox.OPERATION_DELETE:
+                    self._push_delete(central, entry)
+                else:
+                    self._push_upsert(central, entry)
+                central.flush()
+            central.commit()
+
+    def _push_upsert(self, central, entry):
+        report = db.session.get(Report, entry.report_id)
+        if report is None:
+            # Relatório excluído (ou arquivado) depois da alteração: nada a enviar
+            return
+        if report.report_date is not None and central.get(ClosedPeriod, report.report_date.replace(day=1)):
+            raise RejectedChange(f"O mês de {report.date} está fechado no banco central")
+        # A unidade vem antes do local, para que o validador não a substitua
+        values = {column: getattr(report, column) for column in SYNC_COLUMNS}
+        incoming = Report(**values)
+        existing = Report.find_existing(incoming, central)
+        if existing is None:
+            incoming.created_at = report.created_at
+            central.add(incoming)
+        else:
+            for column, value in values.items():
+                setattr(existing, column, value)
+
+    def _push_delete(self, central, entry):
+        key = Report(unit=entry.unit, location=entry.location, shift=entry.shift,
+                     submission_key=entry.submission_key)
+        key.report_date = entry.report_date
+        existing = Report.find_existing(key, central)
+        if existing is not None:
+            central.delete(existing)
+
+    def pending(self):
+        """Alterações aguardando envio e recusadas pelo banco central"""
+        rows = db.session.query(SyncOutbox.error.is_(None), func.count(SyncOutbox.id)).group_by(
+            SyncOutbox.error.is_(None)).all()
+        counts = {bool(waiting): count for waiting, count in rows}
+        return {"pending": counts.get(True, 0), "rejected": counts.get(False, 0)}
+
+    def stats(self):
+        """Estado do envio (exposto em /healthz)"""
+        stats = {"enabled": self.enabled, **self._stats}
+        try:
+            stats.update(self.pending())
+        except Exception as e:
+            logging.error(f"Erro ao contar as alterações pendentes: {str(e)}")
+        return stats
+
+    def retry_rejected(self):
+        """Libera as alterações recusadas para um novo envio (não faz commit)"""
+        db.session.execute(update(SyncOutbox).where(SyncOutbox.error.isnot(None)).values(error=None))
+
+
+sync_worker = SyncWorker()
+
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        if not sync_worker.enabled:
+            sync_worker.init_app(app)
+        if '--retry-rejected' in sys.argv:
+            sync_worker.retry_rejected()
+            db.session.commit()
+        total = 0
+        while True:
+            count = sync_worker.sync_once()
+            total += count
+            if count < SYNC_BATCH_SIZE:
+                break
+        print(f"Envio concluído: {total} alterações processadas, {sync_worker.pending()}")
@@ -0,0 +1,250 @@
+"""
+Extração por regras (regex) dos dados de um relatório de produtividade.
+
+Usada como alternativa quando a análise por IA não está disponível. Todos
+os padrões são compilados uma única vez na importação e as famílias de
+palavras-chave (prisão, foragido, armas, etc.) são procuradas em uma única
+passagem pelo texto.
+"""
+import re
+
+# Letras maiúsculas (com acentos) usadas nos padrões de nomes próprios
+_UPPER = 'A-ZÁÀÂÃÉÈÊÍÏÓÔÕÖÚÇÑ'
+_NAME = rf'[{_UPPER}]+\s+(?:[{_UPPER}]+\s+){{1,3}}[{_UPPER}]+'
+
+# Famílias de palavras-chave, procuradas como substrings do texto em maiúsculas
+KEYWORD_FAMILIES = {
+    # Lista de palavras-chave que indicam prisão
+    'arrest': [
+        'PRISÃO', 'PRESO', 'DETIDO', 'DETENÇÃO', 'FLAGRANTE',
+        'APRESENTAÇÃO NA DELEGACIA', 'APRESENTADO NA DELEGACIA',
+        'CONDUZIDO À DELEGACIA', 'CONDUZIDO PARA DELEGACIA',
+        'CONDUZINDO O MESMO ATÉ A DELEGACIA', 'CONDUZINDO A DELEGACIA',
+        'CONDUZINDO PARA A DELEGACIA', 'ENCAMINHADO À DELEGACIA',
+    ],
+    # Indicadores de prisão em ocorrências longas sem contagem explícita
+    'arrest_indicator': [
+        'DETENÇÃO', 'FAZENDO SUA DETENÇÃO',
+        'PRESO EM FLAGRANTE', 'DELEGACIA DE POLÍCIA',
+        'CONDUZINDO', 'CONDUZIDO', 'DETIDO',
+    ],
+    'fugitive': ['FORAGIDO', 'EVADIDO', 'MANDADO DE PRISÃO'],
+    'bladed_weapon': ['ARMA BRANCA', 'FACA', 'FACÃO', 'CANIVETE', 'ESTILETE', 'FACAS', 'PEIXEIRA'],
+    'firearm': ['ARMA DE FOGO', 'REVÓLVER', 'PISTOLA', 'ESPINGARDA', 'RIFLE', 'REVOLVER', 'ARMAMENTO', 'MUNIÇÃO'],
+    'seized_motorcycle': ['MOTO APREENDIDA'],
+    'drugs': ['DROGA', 'ENTORPECENTE'],
+    'location_muana': ['MUANÁ'],
+    'location_ponta_de_pedras': ['PONTA DE PEDRAS'],
+    'time_0730': ['07:30'],
+    'time_1930': ['19:30'],
+}
+
+
+def _trie_pattern(words):
+    """
+    Monta uma alternação em forma de árvore de prefixos (trie), ex.:
+    ["FACA", "FACAS", "FACÃO"] -> "FAC(?:A(?:S)?|Ã(?:O))". O casamento é guloso,
+    então em cada posição a palavra mais longa é a escolhida.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        alternatives = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not alternatives:
+            return ''
+        body = alternatives[0] if len(alternatives) == 1 else '(?:' + '|'.join(alternatives) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """
+    Procura várias famílias de palavras-chave em uma única passagem pelo texto.
+
+    Todas as palavras são compiladas em uma única expressão (trie). A busca
+    avança uma posição após o início de cada ocorrência, então palavras
+    sobrepostas também são visitadas (ex.: "PRISÃO" dentro de
+    "MANDADO DE PRISÃO"). As palavras contidas na ocorrência mais longa de
+    cada posição são resolvidas pela tabela pré-calculada ``_families_by_word``,
+    mantendo a mesma semântica de ``keyword in text`` para cada família.
+    """
+
+    def __init__(self, families):
+        words = {word for family_words in families.values() for word in family_words}
+        self._pattern = re.compile(_trie_pattern(words))
+        self._families_by_word = {
+            word: frozenset(family for family, family_words in families.items()
+                            if any(candidate in word for candidate in family_words))
+            for word in words
+        }
+
+    def find(self, text):
+        """Retorna o conjunto de famílias com ao menos uma palavra presente no texto"""
+        found = set()
+        search = self._pattern.search
+        position = 0
+        while True:
+            match = search(text, position)
+            if match is None:
+                return found
+            found.update(self._families_by_word[match.group()])
+            position = match.start() + 1
+
+
+_KEYWORD_MATCHER = KeywordMatcher(KEYWORD_FAMILIES)
+
+DATE_PATTERN = re.compile(r'\d{2}/\d{2}/\d{4}')
+
+# Os padrões abaixo são aplicados ao texto já convertido para maiúsculas,
+# por isso não usam re.IGNORECASE (que impede a busca rápida pelo prefixo literal)
+
+# Contagens de abordagens
+PEOPLE_PATTERN = re.compile(r'PESSOAS A PÉ\s*:\s*(\d+)')
+MOTORCYCLES_PATTERN = re.compile(r'MOTOS\s*:\s*(\d+)')
+CARS_PATTERN = re.compile(r'CARRO[S]*\s*:\s*(\d+)')
+BICYCLES_PATTERN = re.compile(r'BICICLETAS\s*:\s*(\d+)')
+
+OCCURRENCE_PATTERN = re.compile(r'OCORRÊNCIA[^:]*:\s*(.+?)(?=\n|$)')
+
+# Prisões, apreensões de motos e apreensões de drogas (padrão principal e alternativo)
+ARRESTS_PATTERNS = (
+    re.compile(r'PRIS[ÕO]ES\s*:\s*(\d+)'),
+    re.compile(r'PRESOS\s*:\s*(\d+)'),
+)
+SEIZED_MOTORCYCLES_PATTERNS = (
+    re.compile(r'MOTOS\s*APREENDIDAS\s*:\s*(\d+)'),
+    re.compile(r'APREENS[ÃA]O\s*DE\s*MOTOS\s*:\s*(\d+)'),
+)
+DRUGS_PATTERNS = (
+    re.compile(r'DROGAS\s*APREENDIDAS\s*:\s*(\d+)'),
+    re.compile(r'APREENS[ÃA]O\s*DE\s*DROGAS\s*:\s*(\d+)'),
+)
+
+# Padrões de nome (entre asteriscos ou destacados)
+NAME_PATTERNS = (
+    re.compile(rf'\*({_NAME})\*'),  # Nomes entre asteriscos
+    re.compile(rf'SR\.?\s+({_NAME})'),  # Nomes com Sr.
+    re.compile(rf'SRA\.?\s+({_NAME})'),  # Nomes com Sra.
+    re.compile(rf'NACIONAL\s*:\s*({_NAME})'),  # Após NACIONAL:
+    re.compile(rf'NOME\s*:\s*({_NAME})'),  # Após NOME:
+)
+
+# Nome próprio com três palavras entre asteriscos
+THREE_WORD_NAME_PATTERN = re.compile(rf'\*[{_UPPER}]+\s+[{_UPPER}]+\s+[{_UPPER}]+\*')
+
+
+def find_keyword_families(normalized_text):
+    """
+    Retorna o conjunto de famílias de KEYWORD_FAMILIES presentes no texto.
+
+    Args:
+        normalized_text (str): Texto do relatório em maiúsculas
+    """
+    return _KEYWORD_MATCHER.find(normalized_text)
+
+
+def _first_count(patterns, text):
+    """Valor numérico do primeiro padrão que casar, ou 0"""
+    for pattern in patterns:
+        match = pattern.search(text)
+        if match:
+            return int(match[1])
+    return 0
+
+
+def extract_report_fields(report_text):
+    """
+    Extrai os dados de um relatório usando regras fixas.
+
+    Args:
+        report_text (str): Texto do relatório policial
+
+    Returns:
+        dict: Mesmas chaves retornadas pela análise por IA (ai_analyzer)
+    """
+    # Normalize text
+    normalized_text = report_text.upper()
+    families = find_keyword_families(normalized_text)
+
+    # Extract location
+    location = "NÃO IDENTIFICADO"
+    if 'location_muana' in families:
+        location = "MUANÁ"
+    elif 'location_ponta_de_pedras' in families:
+        location = "PONTA DE PEDRAS"
+
+    # Extract date
+    date_match = DATE_PATTERN.search(report_text)
+    date = date_match[0] if date_match else None
+
+    # Extract shift
+    # (os horários aparecem nos dois turnos; mantida a regra original, que resulta em Diurno)
+    shift = "Não identificado"
+    if 'time_0730' in families and 'time_1930' in families:
+        shift = "Diurno (07:30 às 19:30)"
+
+    # Extract occurrence
+    occurrence_match = OCCURRENCE_PATTERN.search(normalized_text)
+    occurrence = occurrence_match[1].strip() if occurrence_match else "Sem ocorrência relevante"
+
+    # Iniciar contagens com os valores explícitos
+    arrests_count = _first_count(ARRESTS_PATTERNS, normalized_text)
+    seized_motorcycles_count = _first_count(SEIZED_MOTORCYCLES_PATTERNS, normalized_text)
+    drugs_seized_count = _first_count(DRUGS_PATTERNS, normalized_text)
+
+    has_arrest_keywords = 'arrest' in families
+    if has_arrest_keywords:
+        # Encontrar todos os nomes no texto (sem duplicados)
+        identified_names = {match.group(1).strip()
+                            for pattern in NAME_PATTERNS
+                            for match in pattern.finditer(normalized_text)}
+
+        # Se encontramos nomes E há palavras-chave de prisão, cada nome conta como 1 prisão
+        if len(identified_names) > arrests_count:
+            arrests_count = len(identified_names)
+
+        # Se ainda não encontramos nenhuma prisão, mas temos keywords, considere pelo menos 1
+        if arrests_count == 0:
+            arrests_count = 1
+
+    if seized_motorcycles_count == 0 and 'seized_motorcycle' in families:
+        seized_motorcycles_count = 1  # Assume pelo menos uma moto apreendida se mencionado
+
+    if drugs_seized_count == 0 and 'drugs' in families:
+        drugs_seized_count = 1  # Assume pelo menos uma apreensão se mencionado
+
+    # Verificação adicional para contabilizar prisão quando há texto longo
+    # com palavras-chave que indicam prisão e ao menos um nome próprio
+    if (arrests_count == 0 and len(occurrence) > 50 and 'arrest_indicator' in families
+            and THREE_WORD_NAME_PATTERN.search(normalized_text)):
+        arrests_count = 1
+
+    # Foragido também contabiliza como prisão
+    fugitives_count = 0
+    if 'fugitive' in families:
+        fugitives_count = 1
+        if arrests_count == 0:
+            arrests_count = 1
+
+    return {
+        "location": location,
+        "date": date,
+        "shift": shift,
+        "people_count": _first_count((PEOPLE_PATTERN,), normalized_text),
+        "motorcycles_count": _first_count((MOTORCYCLES_PATTERN,), normalized_text),
+        "cars_count": _first_count((CARS_PATTERN,), normalized_text),
+        "bicycles_count": _first_count((BICYCLES_PATTERN,), normalized_text),
+        "arrests_count": arrests_count,
+        "seized_motorcycles_count": seized_motorcycles_count,
+        "drugs_seized_count": drugs_seized_count,
+        "fugitives_count": fugitives_count,
+        "bladed_weapons_count": 1 if 'bladed_weapon' in families else 0,
+        "firearms_count": 1 if 'firearm' in families else 0,
+        "occurrence": occurrence,
+    }
@@ -0,0 +1,36 @@
+"""
+Configuração do gunicorn (carregada automaticamente a partir do diretório do projeto).
+
+Prepara o modo multiprocesso do prometheus_client: os workers gravam suas
+métricas em PROMETHEUS_MULTIPROC_DIR e o /metrics agrega todos eles, e gera
+os arquivos estáticos com hash (assets.py) antes dos workers iniciarem. As
+opções de linha de comando (Procfile, .replit) continuam valendo.
+"""
+import os
+import shutil
+import logging
+import tempfile
+
+# Diretório das métricas compartilhadas (definido antes dos workers importarem a aplicação)
+if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = os.path.join(tempfile.gettempdir(), "prometheus-multiproc")
+
+
+def on_starting(server):
+    """Limpa as métricas de execuções anteriores e gera os arquivos estáticos"""
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+    # Sem o build, as páginas usam os arquivos de static/ sem hash
+    try:
+        import assets
+        assets.build()
+    except Exception as e:
+        logging.error(f"Erro ao gerar os arquivos estáticos: {str(e)}")
+
+
+def child_exit(server, worker):
+    """Descarta as métricas de valor atual do worker encerrado"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
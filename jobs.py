@@ -0,0 +1,192 @@
+"""
+Processamento assíncrono das análises de relatórios.
+
+O endpoint /analyze grava a submissão como um AnalysisJob e devolve o id
+imediatamente; um pool limitado de threads faz a extração (IA ou regex) e
+salva o Report. O estado fica no banco, então jobs pendentes ou
+interrompidos são retomados quando o processo reinicia.
+"""
+import os
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, AnalysisJob, Report, unit_registry
+
+# Quantidade máxima de análises simultâneas por processo
+MAX_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", "2"))
+
+# Tentativas antes de marcar o job como falho
+MAX_ATTEMPTS = int(os.environ.get("ANALYSIS_MAX_ATTEMPTS", "3"))
+
+# Tempo após o qual um job "running" sem atualização é considerado interrompido
+STALE_AFTER = timedelta(seconds=int(os.environ.get("ANALYSIS_STALE_SECONDS", "300")))
+
+
+class JobRunner:
+    """Pool de threads que processa os AnalysisJob gravados no banco"""
+
+    def __init__(self):
+        self.app = None
+        self.process_fn = None
+        self.executor = None
+
+    def init_app(self, app, process_fn, max_workers=MAX_WORKERS):
+        """
+        Configura o executor.
+
+        Args:
+            app: Aplicação Flask (usada para abrir o contexto nas threads)
+            process_fn: Função que recebe o texto e retorna um Report não salvo
+            max_workers: Quantidade máxima de threads de análise
+        """
+        self.app = app
+        self.process_fn = process_fn
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis")
+
+    def create_job(self, text, submission_key=None, replace=False, unit=None):
+        """
+        Grava uma nova submissão e agenda sua análise. Uma submissão repetida
+        (mesma chave) ainda em andamento devolve o job existente. ``unit`` recebe o
+        relatório quando o local extraído não pertence a nenhuma unidade.
+        """
+        if submission_key and not replace:
+            job = (AnalysisJob.query
+                   .filter(AnalysisJob.submission_key == submission_key,
+                           AnalysisJob.status.in_([AnalysisJob.STATUS_PENDING, AnalysisJob.STATUS_RUNNING]))
+                   .order_by(AnalysisJob.created_at.desc())
+                   .first())
+            if job is not None:
+                return job
+        job = AnalysisJob(id=uuid.uuid4().hex, status=AnalysisJob.STATUS_PENDING, text=text,
+                          submission_key=submission_key, replace_existing=replace, unit=unit)
+        db.session.add(job)
+        db.session.commit()
+        self.submit(job.id)
+        return job
+
+    def submit(self, job_id):
+        """Agenda a análise de um job no pool de threads"""
+        self.executor.submit(self._run, job_id)
+
+    def resubmit_if_stale(self, job):
+        """Reagenda um job parado há mais tempo que o limite (ex.: processo reiniciado)"""
+        if job.status not in (AnalysisJob.STATUS_PENDING, AnalysisJob.STATUS_RUNNING):
+            return
+        if job.updated_at and datetime.utcnow() - job.updated_at < STALE_AFTER:
+            return
+        if self._release(job.id, job.status, job.updated_at):
+            self.submit(job.id)
+
+    def recover(self):
+        """Reagenda jobs pendentes e jobs interrompidos por reinício do processo"""
+        with self.app.app_context():
+            try:
+                jobs = AnalysisJob.query.filter(
+                    AnalysisJob.status.in_([AnalysisJob.STATUS_PENDING, AnalysisJob.STATUS_RUNNING])
+                ).all()
+                for job in jobs:
+                    if job.status == AnalysisJob.STATUS_PENDING:
+                        self.submit(job.id)
+                    else:
+                        self.resubmit_if_stale(job)
+                if jobs:
+                    logging.info(f"{len(jobs)} jobs de análise verificados para retomada")
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Erro ao retomar jobs de análise: {str(e)}")
+
+    def _release(self, job_id, status, updated_at):
+        """Devolve um job parado para a fila (somente se ninguém o alterou nesse meio tempo)"""
+        result = db.session.execute(
+            update(AnalysisJob)
+            .where(AnalysisJob.id == job_id,
+                   AnalysisJob.status == status,
+                   AnalysisJob.updated_at == updated_at)
+            .values(status=AnalysisJob.STATUS_PENDING, updated_at=datetime.utcnow()))
+        db.session.commit()
+        return result.rowcount == 1
+
+    def _claim(self, job_id):
+        """Marca o job como em execução; retorna False se outro processo já o assumiu"""
+        result = db.session.execute(
+            update(AnalysisJob)
+            .where(AnalysisJob.id == job_id, AnalysisJob.status == AnalysisJob.STATUS_PENDING)
+            .values(status=AnalysisJob.STATUS_RUNNING,
+                    attempts=AnalysisJob.attempts + 1,
+                    updated_at=datetime.utcnow()))
+        db.session.commit()
+        return result.rowcount == 1
+
+    def _run(self, job_id):
+        """Executa a análise de um job dentro do contexto da aplicação"""
+        with self.app.app_context():
+            try:
+                if not self._claim(job_id):
+                    return
+
+                job = db.session.get(AnalysisJob, job_id)
+                report = self.process_fn(job.text)
+                report.submission_key = job.submission_key
+                report.unit = unit_registry.unit_for(report.location, job.unit)
+
+                # Salvar o relatório (ou manter/substituir o existente da mesma data/local/turno)
+                # e concluir o job na mesma transação
+                stored, outcome = self._store(job_id, report)
+                logging.info(f"Job de análise {job_id} concluído (relatório {stored.id}, {outcome})")
+
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Erro no job de análise {job_id}: {str(e)}")
+                self._fail(job_id, str(e))
+
+            finally:
+                db.session.remove()
+
+    def _store(self, job_id, report):
+        """
+        Grava o relatório e conclui o job na mesma transação.
+
+        Se outra requisição gravar o mesmo relatório (ou a mesma linha de totais) ao
+        mesmo tempo, a restrição única desfaz a transação e a gravação é refeita uma
+        vez, sem nova análise (como em save_reports).
+        """
+        for attempt in range(2):
+            try:
+                job = db.session.get(AnalysisJob, job_id)
+                stored, outcome = Report.store(report, job.replace_existing)
+                job.report_id = stored.id
+                job.outcome = outcome
+                job.status = AnalysisJob.STATUS_DONE
+                job.error = None
+                db.session.commit()
+                return stored, outcome
+            except IntegrityError as e:
+                db.session.rollback()
+                if attempt:
+                    raise
+                logging.warning(f"Relatório do job {job_id} gravado por outra requisição, tentando novamente: {str(e)}")
+                report.id = None
+
+    def _fail(self, job_id, error):
+        """Registra a falha; o job volta para a fila enquanto houver tentativas"""
+        try:
+            job = db.session.get(AnalysisJob, job_id)
+            if job is None:
+                return
+            job.error = error
+            retry = job.attempts < MAX_ATTEMPTS
+            job.status = AnalysisJob.STATUS_PENDING if retry else AnalysisJob.STATUS_FAILED
+            db.session.commit()
+            if retry:
+                self.submit(job_id)
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Erro ao registrar falha do job {job_id}: {str(e)}")
+
+
+job_runner = JobRunner()
@@ -0,0 +1,163 @@
+"""
+Servidor local que imita a API de chat completions da OpenAI, para testes de carga.
+
+As respostas são geradas pelo extrator por regex (extractor.py), no mesmo
+formato JSON pedido pelo prompt de ai_analyzer.py. Latência, taxa de erro e
+travamentos (timeouts) são configuráveis.
+
+Uso:
+    python loadtest/fake_openai.py --port 8090 --latency 800 --jitter 400 --error-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8090/v1 OPENAI_API_KEY=fake python main.py
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extractor import extract_report_fields  # noqa: E402
+
+
+class FakeOpenAIConfig:
+    """Comportamento do servidor falso (pode ser alterado com o servidor rodando)"""
+
+    def __init__(self, latency_ms=500, jitter_ms=0, error_rate=0.0, timeout_rate=0.0, hang_seconds=120.0,
+                 seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "ok": 0, "errors": 0, "timeouts": 0}
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def draw(self):
+        """Sorteia o resultado e a latência de uma requisição"""
+        with self.lock:
+            roll = self.random.random()
+            delay = max(0.0, self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        if roll < self.timeout_rate:
+            return "timeout", self.hang_seconds
+        if roll < self.timeout_rate + self.error_rate:
+            return "error", delay
+        return "ok", delay
+
+
+def make_handler(config):
+    """Cria a classe de handler HTTP ligada a uma configuração"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            # Silenciar o log de cada requisição
+            pass
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                with config.lock:
+                    self._send_json(200, dict(config.counters))
+            else:
+                self._send_json(404, {"error": {"message": "Not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "Not found"}})
+                return
+
+            config.count("requests")
+            outcome, delay = config.draw()
+            time.sleep(delay)
+
+            if outcome == "timeout":
+                config.count("timeouts")
+                # Depois do travamento, fechar a conexão sem resposta
+                self.close_connection = True
+                return
+            if outcome == "error":
+                config.count("errors")
+                self._send_json(500, {"error": {"message": "Simulated server error", "type": "server_error"}})
+                return
+
+            user_messages = [m.get("content", "") for m in request.get("messages", []) if m.get("role") == "user"]
+            content = json.dumps(extract_report_fields(user_messages[-1] if user_messages else ""),
+                                 ensure_ascii=False)
+            config.count("ok")
+            self._send_json(200, {
+                "id": f"chatcmpl-fake-{int(time.time() * 1000)}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "gpt-3.5-turbo"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+
+    return Handler
+
+
+def start_server(config, host="127.0.0.1", port=0):
+    """Inicia o servidor em uma thread; retorna (servidor, URL base para OPENAI_BASE_URL)"""
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def add_arguments(parser):
+    """Argumentos de comportamento do servidor falso (compartilhados com run_load.py)"""
+    parser.add_argument("--latency", type=float, default=500, help="Latência média em ms")
+    parser.add_argument("--jitter", type=float, default=0, help="Variação da latência em ms (+/-)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração de respostas HTTP 500")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Fração de requisições que travam")
+    parser.add_argument("--hang", type=float, default=120.0, help="Segundos de travamento nas requisições que travam")
+    parser.add_argument("--seed", type=int, help="Semente para resultados reproduzíveis")
+
+
+def config_from_args(args):
+    return FakeOpenAIConfig(latency_ms=args.latency, jitter_ms=args.jitter, error_rate=args.error_rate,
+                            timeout_rate=args.timeout_rate, hang_seconds=args.hang, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor falso da API da OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server, base_url = start_server(config_from_args(args), args.host, args.port)
+    print(f"Servidor falso da OpenAI em {base_url} (Ctrl+C para encerrar)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
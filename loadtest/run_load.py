@@ -0,0 +1,299 @@
+"""
+Teste de carga HTTP de ponta a ponta.
+
+Sobe o servidor falso da OpenAI (fake_openai.py) e a aplicação sobre um
+SQLite temporário, com o cliente OpenAI de ai_analyzer.py apontado para o
+servidor falso, e reenvia textos de relatório a uma taxa fixa. Ao final
+mostra latência p50/p95/p99, vazão e erros por endpoint.
+
+Uso:
+    python loadtest/run_load.py --rate 5 --duration 60 --workers 4 --latency 2000 --error-rate 0.1
+    python loadtest/run_load.py --mix analyze=1,totals=3,calendar=1 --output resultado.json
+    python loadtest/run_load.py --url http://127.0.0.1:5000   # aplicação já em execução
+
+As latências são medidas a partir do instante programado de cada envio,
+então incluem a espera na fila do próprio cliente quando o servidor não
+acompanha a taxa (sem omissão coordenada).
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+LOADTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(LOADTEST_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+sys.path.insert(0, LOADTEST_DIR)
+
+from corpus import generate_texts  # noqa: E402
+from fake_openai import add_arguments, config_from_args, start_server  # noqa: E402
+
+DEFAULT_MIX = "analyze=1,totals=2,calendar=1,by_location=1"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def http_request(method, url, payload=None, timeout=150):
+    """Envia uma requisição; retorna (status, corpo JSON ou None)"""
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    request = urllib.request.Request(url, data=data, method=method,
+                                     headers={"Content-Type": "application/json"} if data else {})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = response.read()
+            return response.status, json.loads(body) if body else None
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+class Endpoints:
+    """Operações disponíveis para o teste de carga"""
+
+    def __init__(self, base_url, texts, timeout):
+        self.base_url = base_url.rstrip("/")
+        self.texts = texts
+        self.timeout = timeout
+        self._index = 0
+        self._lock = threading.Lock()
+
+    def next_text(self):
+        with self._lock:
+            text = self.texts[self._index % len(self.texts)]
+            self._index += 1
+            return text
+
+    # O corpus repete data/local/turno; replace mantém cada envio gravando (inclusão ou substituição)
+    # em vez de responder 409
+    def analyze(self):
+        return http_request("POST", f"{self.base_url}/analyze",
+                            {"text": self.next_text(), "replace": True}, self.timeout)[0]
+
+    def analyze_async(self):
+        """Envia em modo assíncrono e acompanha o job até a conclusão"""
+        status, body = http_request("POST", f"{self.base_url}/analyze",
+                                    {"text": self.next_text(), "async": True, "replace": True}, self.timeout)
+        if status != 202:
+            return status
+        status_url = self.base_url + body["status_url"]
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.25)
+            status, body = http_request("GET", status_url, timeout=self.timeout)
+            if status != 200:
+                return status
+            if body["job"]["status"] == "done":
+                return 200
+            if body["job"]["status"] == "failed":
+                return 500
+        return 504
+
+    def totals(self):
+        return http_request("GET", f"{self.base_url}/api/totals", timeout=self.timeout)[0]
+
+    def calendar(self):
+        return http_request("GET", f"{self.base_url}/api/calendar", timeout=self.timeout)[0]
+
+    def by_location(self):
+        return http_request("GET", f"{self.base_url}/api/reports-by-location", timeout=self.timeout)[0]
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    index = min(len(samples) - 1, max(0, int(round(fraction * len(samples))) - 1))
+    return samples[index]
+
+
+def summarize(records, duration):
+    """Agrupa os registros (endpoint, latência em s, resultado) por endpoint"""
+    by_endpoint = defaultdict(list)
+    for record in records:
+        by_endpoint[record[0]].append(record)
+
+    summary = {}
+    for endpoint, items in sorted(by_endpoint.items()):
+        latencies = sorted(latency * 1000 for _, latency, _ in items)
+        errors = defaultdict(int)
+        for _, _, outcome in items:
+            if outcome != 200:
+                errors[str(outcome)] += 1
+        summary[endpoint] = {
+            "requests": len(items),
+            "errors": sum(errors.values()),
+            "errors_by_kind": dict(errors),
+            "throughput_rps": round(len(items) / duration, 3) if duration else None,
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "mean_ms": round(sum(latencies) / len(latencies), 2),
+            "max_ms": round(latencies[-1], 2),
+        }
+    return summary
+
+
+def start_app(args, openai_base_url, database_path):
+    """Sobe a aplicação em um subprocesso (gunicorn ou servidor do Flask)"""
+    port = free_port()
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{database_path}",
+               OPENAI_API_KEY="fake-key-for-load-test",
+               OPENAI_BASE_URL=openai_base_url,
+               OPENAI_TIMEOUT=str(args.openai_timeout),
+               OPENAI_MAX_RETRIES=str(args.openai_retries),
+               PORT=str(port))
+
+    if args.server == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "wsgi:app",
+                   "--bind", f"127.0.0.1:{port}",
+                   "--workers", str(args.workers),
+                   "--threads", str(args.threads),
+                   "--timeout", str(args.gunicorn_timeout),
+                   "--log-level", "warning"]
+    else:
+        command = [sys.executable, "-m", "flask", "--app", "app", "run",
+                   "--host", "127.0.0.1", "--port", str(port), "--with-threads"]
+
+    process = subprocess.Popen(command, cwd=ROOT_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+
+    # Aguardar a aplicação responder
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"A aplicação encerrou durante a inicialização (código {process.returncode})")
+        try:
+            if http_request("GET", f"{base_url}/healthz", timeout=2)[0] == 200:
+                return process, base_url
+        except OSError:
+            pass
+        time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError("A aplicação não respondeu em /healthz dentro de 60 segundos")
+
+
+def run(endpoints, mix, rate, duration, concurrency, seed):
+    """Dispara as requisições a uma taxa fixa e coleta (endpoint, latência, resultado)"""
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    records = []
+    records_lock = threading.Lock()
+
+    def execute(name, scheduled):
+        try:
+            outcome = getattr(endpoints, name)()
+        except socket.timeout:
+            outcome = "timeout"
+        except Exception as e:
+            outcome = type(e).__name__
+        latency = time.monotonic() - scheduled
+        with records_lock:
+            records.append((name, latency, outcome))
+
+    total = int(rate * duration)
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for index in range(total):
+            scheduled = started + index / rate
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(execute, rng.choices(names, weights)[0], scheduled)
+    elapsed = time.monotonic() - started
+    return records, elapsed
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if not hasattr(Endpoints, name):
+            raise argparse.ArgumentTypeError(f"Endpoint desconhecido no mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga HTTP com servidor falso da OpenAI")
+    parser.add_argument("--url", help="URL de uma aplicação já em execução (não sobe servidor)")
+    parser.add_argument("--server", choices=["gunicorn", "flask"], default="gunicorn")
+    parser.add_argument("--workers", type=int, default=4, help="Workers do gunicorn")
+    parser.add_argument("--threads", type=int, default=1, help="Threads por worker do gunicorn")
+    parser.add_argument("--gunicorn-timeout", type=int, default=120)
+    parser.add_argument("--openai-timeout", type=float, default=20.0, help="OPENAI_TIMEOUT da aplicação")
+    parser.add_argument("--openai-retries", type=int, default=1, help="OPENAI_MAX_RETRIES da aplicação")
+    parser.add_argument("--rate", type=float, default=2.0, help="Requisições por segundo")
+    parser.add_argument("--duration", type=float, default=30.0, help="Duração em segundos")
+    parser.add_argument("--concurrency", type=int, default=64, help="Requisições simultâneas no cliente")
+    parser.add_argument("--request-timeout", type=float, default=150.0)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Pesos por endpoint (padrão: {DEFAULT_MIX}); "
+                             "disponíveis: analyze, analyze_async, totals, calendar, by_location")
+    parser.add_argument("--corpus", type=int, default=200, help="Textos de relatório distintos")
+    parser.add_argument("--output", help="Arquivo JSON com o resumo")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    texts = generate_texts(args.corpus, seed=args.seed or 42)
+    config = config_from_args(args)
+    fake_server, openai_base_url = start_server(config)
+    process = None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            if args.url:
+                base_url = args.url
+            else:
+                process, base_url = start_app(args, openai_base_url, os.path.join(tmp, "load.db"))
+            print(f"Aplicação em {base_url}; OpenAI falsa em {openai_base_url}")
+            print(f"Enviando {args.rate} req/s por {args.duration}s...")
+
+            endpoints = Endpoints(base_url, texts, args.request_timeout)
+            records, elapsed = run(endpoints, args.mix, args.rate, args.duration, args.concurrency, args.seed)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=30)
+            fake_server.shutdown()
+
+    summary = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "settings": {key: value for key, value in vars(args).items() if key != "mix"},
+        "mix": args.mix,
+        "elapsed_s": round(elapsed, 2),
+        "fake_openai": dict(config.counters),
+        "endpoints": summarize(records, elapsed),
+    }
+
+    print(f"\n{'endpoint':<15}{'req':>7}{'erros':>7}{'req/s':>9}{'p50':>10}{'p95':>10}{'p99':>10}  (ms)")
+    for endpoint, stats in summary["endpoints"].items():
+        print(f"{endpoint:<15}{stats['requests']:>7}{stats['errors']:>7}{stats['throughput_rps']:>9}"
+              f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+    print(f"OpenAI falsa: {summary['fake_openai']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f"Resumo gravado em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Script para cadastrar unidades (CIPMs/pelotões) e seus locais.
+
+    python manage_units.py list
+    python manage_units.py add CODIGO "Nome da unidade" "LOCAL 1" "LOCAL 2" ...
+
+Ao cadastrar, os locais informados passam para a nova unidade (inclusive os
+relatórios já enviados e arquivados) e os totais, estatísticas e resumos são
+reconstruídos. O cadastro é lido pelos workers na primeira consulta: reinicie a
+aplicação depois de alterar as unidades.
+"""
+import sys
+import logging
+
+from app import app
+from models import db, Report, Unit, UnitLocation, unit_registry
+from calendar_cache import calendar_cache
+from update_report_unit import assign_units, rebuild_all
+
+logging.basicConfig(level=logging.INFO)
+
+
+def list_units():
+    """Lista as unidades e seus locais"""
+    with app.app_context():
+        for unit in unit_registry.units():
+            print(f"{unit['code']}: {unit['name']} ({', '.join(unit['locations'])})")
+
+
+def add_unit(code, name, locations):
+    """Cadastra (ou atualiza) a unidade e move os locais informados para ela."""
+    with app.app_context():
+        try:
+            locations = [Report.normalize_location(location) for location in locations]
+            if not locations:
+                raise ValueError("Informe ao menos um local da unidade")
+
+            unit = db.session.get(Unit, code)
+            if unit is None:
+                unit = Unit(code=code, name=name)
+                db.session.add(unit)
+            unit.name = name
+
+            UnitLocation.query.filter(UnitLocation.location.in_(locations)).delete(synchronize_session=False)
+            db.session.flush()
+            position = len([entry for entry in unit.locations if entry.location not in locations])
+            for offset, location in enumerate(locations):
+                db.session.add(UnitLocation(location=location, unit_code=code, position=position + offset))
+            db.session.commit()
+            unit_registry.clear()
+
+            assign_units()
+            rebuild_all()
+            db.session.commit()
+            calendar_cache.clear()
+
+            logging.info(f"Unidade {code} cadastrada com os locais: {', '.join(locations)}")
+            logging.info("Reinicie a aplicação para que os workers leiam o novo cadastro")
+
+        except Exception as e:
+            logging.error(f"Erro ao cadastrar a unidade: {str(e)}")
+            db.session.rollback()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 2 and sys.argv[1] == 'list':
+        list_units()
+    elif len(sys.argv) >= 4 and sys.argv[1] == 'add':
+        add_unit(sys.argv[2], sys.argv[3], sys.argv[4:])
+    else:
+        print(__doc__)
@@ -0,0 +1,97 @@
+"""
+Métricas no formato do Prometheus, expostas em /metrics.
+
+Com vários workers do gunicorn, cada processo grava suas métricas em
+arquivos no diretório PROMETHEUS_MULTIPROC_DIR (configurado em
+gunicorn.conf.py antes dos workers iniciarem) e o /metrics agrega os
+valores de todos os processos. Sem essa variável (ex.: python main.py),
+as métricas são apenas do processo atual.
+"""
+import os
+import time
+import logging
+
+from flask import g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY,
+                               generate_latest, multiprocess)
+from sqlalchemy.pool import QueuePool
+
+# Faixas de latência (segundos) para requisições HTTP e chamadas à OpenAI
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Duração das requisições HTTP por rota",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+
+OPENAI_REQUEST_DURATION = Histogram(
+    "openai_request_duration_seconds", "Duração das chamadas à API da OpenAI (incluindo novas tentativas)",
+    ["outcome"], buckets=LATENCY_BUCKETS)
+OPENAI_RETRIES = Counter(
+    "openai_retries_total", "Novas tentativas HTTP feitas pelo cliente da OpenAI")
+OPENAI_FAILURES = Counter(
+    "openai_failures_total", "Chamadas à OpenAI que falharam, por tipo de erro", ["error"])
+
+REPORT_EXTRACTIONS = Counter(
+    "report_extractions_total", "Relatórios extraídos por IA ou por regex (com o motivo do uso da regex)",
+    ["method", "reason"])
+
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Espera para obter uma conexão do pool do SQLAlchemy",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5, 30))
+
+AGGREGATE_ROWS_SCANNED = Histogram(
+    "aggregate_rows_scanned", "Linhas de relatório lidas pelas consultas de agregação",
+    ["query"], buckets=(0, 10, 100, 1000, 10000, 100000, 1000000))
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool que mede o tempo de espera por uma conexão livre"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+
+# O pool registra mensagens de depuração em um logger com o nome da classe; manter o
+# mesmo nível que o SQLAlchemy usa para os seus (WARNING), evitando uma linha por checkout
+logging.getLogger(f"{__name__}.{InstrumentedQueuePool.__name__}").setLevel(logging.WARNING)
+
+
+def record_extraction(method, reason=""):
+    """Registra o uso da IA (method="ai") ou da regex (method="regex", com o motivo)"""
+    REPORT_EXTRACTIONS.labels(method=method, reason=reason).inc()
+
+
+def record_rows_scanned(query, rows):
+    AGGREGATE_ROWS_SCANNED.labels(query=query).observe(rows or 0)
+
+
+def init_app(app):
+    """Registra a medição de latência por rota e o endpoint /metrics"""
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            # Usar o padrão da rota (ex.: /api/jobs/<job_id>) para não criar uma série por URL
+            route = request.url_rule.rule if request.url_rule else "<unmatched>"
+            HTTP_REQUEST_DURATION.labels(request.method, route, str(response.status_code)).observe(
+                time.perf_counter() - started)
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        """Métricas no formato texto do Prometheus"""
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return generate_latest(registry), 200, {"Content-Type": CONTENT_TYPE_LATEST}
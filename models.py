@@ -1,14 +1,179 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import delete, event, func, insert, literal, or_, select, text, tuple_, union_all, update
+from sqlalchemy.orm import Session, validates
+from sqlalchemy.orm.attributes import get_history
 from datetime import datetime, timedelta
+from metrics import record_rows_scanned
+from calendar_cache import calendar_cache
+import os
 import re
+import hashlib
+import threading
 
 db = SQLAlchemy()
 
+# Unidade (CIPM ou pelotão) criada na inicialização de bancos sem unidades cadastradas;
+# também recebe os relatórios de locais que não pertencem a nenhuma unidade
+DEFAULT_UNIT = os.environ.get("DEFAULT_UNIT", "principal")
+DEFAULT_UNIT_NAME = "Unidade principal"
+DEFAULT_UNIT_LOCATIONS = ["MUANÁ", "PONTA DE PEDRAS"]
+
+# Modo edge (destacamentos com conexão instável): banco SQLite local e envio dos relatórios
+# para o banco central em segundo plano (ver edge_sync.py), a partir da tabela sync_outbox
+EDGE_MODE = os.environ.get("EDGE_MODE", "false").lower() in ("1", "true", "yes")
+
+# Maior inteiro representado sem perda em JavaScript (Number.MAX_SAFE_INTEGER)
+MAX_SAFE_JSON_INTEGER = 2 ** 53 - 1
+
+# Versões dos dados mantidas em report_change para o delta do calendário compacto
+REPORT_CHANGE_RETENTION = int(os.environ.get("REPORT_CHANGE_RETENTION", "10000"))
+
+# Colunas numéricas do relatório e a chave usada nas respostas JSON de totais
+METRIC_FIELDS = [
+    ('people_count', 'people'),
+    ('motorcycles_count', 'motorcycles'),
+    ('cars_count', 'cars'),
+    ('bicycles_count', 'bicycles'),
+    ('arrests_count', 'arrests'),
+    ('seized_motorcycles_count', 'seizedMotorcycles'),
+    ('drugs_seized_count', 'drugsSeized'),
+    ('fugitives_count', 'fugitives'),
+    ('bladed_weapons_count', 'bladedWeapons'),
+    ('firearms_count', 'firearms'),
+]
+METRIC_COLUMNS = [column for column, _ in METRIC_FIELDS]
+
+# Colunas que entram no total de inspeções (pessoas, veículos, prisões e foragidos)
+INSPECTION_COLUMNS = ['people_count', 'motorcycles_count', 'cars_count', 'bicycles_count',
+                      'arrests_count', 'fugitives_count']
+
+# Campos disponíveis na listagem /api/reports (mesmas chaves de Report.to_dict) e suas colunas
+LIST_FIELDS = {
+    'id': 'id',
+    'location': 'location',
+    'date': 'date',
+    'shift': 'shift',
+    **{key: column for column, key in METRIC_FIELDS},
+    'occurrence': 'occurrence',
+    'created_at': 'created_at',
+}
+
+# Colunas exportadas por /api/reports/export, na ordem do arquivo
+EXPORT_COLUMNS = ['id', 'location', 'date', 'report_date', 'shift'] + METRIC_COLUMNS + ['occurrence', 'created_at']
+
+
+class Unit(db.Model):
+    """Unidade (CIPM ou pelotão) e seus locais, na ordem exibida no calendário"""
+    __tablename__ = 'unit'
+
+    code = db.Column(db.String(30), primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    locations = db.relationship('UnitLocation', order_by='UnitLocation.position',
+                                cascade='all, delete-orphan')
+
+    @classmethod
+    def ensure_default(cls):
+        """Cadastra a unidade padrão se nenhuma unidade existir (não faz commit)"""
+        if cls.query.first() is not None:
+            return
+        unit = cls(code=DEFAULT_UNIT, name=DEFAULT_UNIT_NAME)
+        unit.locations = [UnitLocation(location=location, position=position)
+                          for position, location in enumerate(DEFAULT_UNIT_LOCATIONS)]
+        db.session.add(unit)
+
+
+class UnitLocation(db.Model):
+    """Local de uma unidade (cada local pertence a uma única unidade)"""
+    __tablename__ = 'unit_location'
+
+    location = db.Column(db.String(50), primary_key=True)
+    unit_code = db.Column(db.String(30), db.ForeignKey('unit.code', ondelete='CASCADE'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False, default=0)
+
+
+class UnitRegistry:
+    """
+    Cadastro de unidades e locais, lido do banco na primeira consulta e mantido em
+    memória pelo restante do processo. Alterações feitas com manage_units.py valem
+    depois que os workers são reiniciados.
+    """
+
+    def __init__(self):
+        self._units = None
+        self._unit_by_location = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        units = self._units
+        if units is not None:
+            return units
+        with self._lock:
+            if self._units is None:
+                units = {}
+                for unit in Unit.query.order_by(Unit.code):
+                    units[unit.code] = {
+                        "code": unit.code,
+                        "name": unit.name,
+                        "locations": [entry.location for entry in unit.locations],
+                    }
+                self._unit_by_location = {location: code for code, unit in units.items()
+                                          for location in unit["locations"]}
+                self._units = units
+            return self._units
+
+    def units(self):
+        """Unidades cadastradas: [{'code', 'name', 'locations'}]"""
+        return list(self._load().values())
+
+    def get(self, code):
+        """Unidade {'code', 'name', 'locations'} ou None"""
+        return self._load().get(code)
+
+    def exists(self, code):
+        return code in self._load()
+
+    def locations(self, code):
+        """Locais da unidade, na ordem do cadastro"""
+        unit = self._load().get(code)
+        return list(unit["locations"]) if unit else []
+
+    def unit_for(self, location, default=None):
+        """Unidade do local (``default`` ou a unidade padrão para locais não cadastrados)"""
+        self._load()
+        return self._unit_by_location.get(location, default or DEFAULT_UNIT)
+
+    def clear(self):
+        with self._lock:
+            self._units = None
+            self._unit_by_location = {}
+
+
+unit_registry = UnitRegistry()
+
+
 class Report(db.Model):
     """Model to store police productivity reports"""
+    __table_args__ = (
+        # Chave natural: um relatório por unidade, data, local e turno (relatórios sem data ficam
+        # de fora). Com a unidade na frente, o mesmo índice atende o calendário e os filtros por
+        # período de cada unidade sem percorrer os relatórios das demais
+        db.Index('uq_report_unit_date_location_shift', 'unit', 'report_date', 'location', 'shift', unique=True),
+        # Filtros por período sem unidade (ex.: exportação e listagem)
+        db.Index('ix_report_report_date', 'report_date'),
+        # Listagem paginada (/api/reports) e /delete-last ordenam por (created_at, id)
+        db.Index('ix_report_created_at_id', 'created_at', 'id'),
+        db.Index('ix_report_unit_created_at_id', 'unit', 'created_at', 'id'),
+    )
+
+    # Turnos exibidos no calendário de relatórios (os locais vêm do cadastro de unidades)
+    CALENDAR_SHIFTS = ["Diurno (07:30 às 19:30)", "Noturno (19:30 às 07:30)"]
+
     id = db.Column(db.Integer, primary_key=True)
+    # Unidade do local (ver unit_registry), preenchida ao definir o local
+    unit = db.Column(db.String(30), nullable=False, default=DEFAULT_UNIT, server_default=DEFAULT_UNIT)
     location = db.Column(db.String(50), nullable=False)
-    date = db.Column(db.String(20), nullable=True)
+    date = db.Column(db.String(20), nullable=True)  # Texto original (DD/MM/AAAA)
+    report_date = db.Column(db.Date, nullable=True)  # Mesma data tipada, preenchida a partir de `date`
     shift = db.Column(db.String(50), nullable=True)
     people_count = db.Column(db.Integer, default=0)
     motorcycles_count = db.Column(db.Integer, default=0)
@@ -25,6 +190,193 @@ class Report(db.Model):
     
     occurrence = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Chave de idempotência da submissão (enviada pelo cliente ou hash do texto)
+    submission_key = db.Column(db.String(64), nullable=True, unique=True, index=True)
+
+    @validates('date')
+    def _sync_report_date(self, key, value):
+        """Mantém report_date sincronizado com o texto da data"""
+        self.report_date = self.to_report_date(value)
+        return value
+
+    @validates('location')
+    def _normalize_location(self, key, value):
+        value = self.normalize_location(value)
+        if self.unit is None:
+            self.unit = unit_registry.unit_for(value)
+        return value
+
+    @validates('shift')
+    def _normalize_shift(self, key, value):
+        return self.normalize_shift(value)
+
+    @staticmethod
+    def normalize_location(location):
+        """Localidade em maiúsculas e sem espaços extras (parte da chave natural)"""
+        return " ".join(location.split()).upper() if location else location
+
+    @classmethod
+    def normalize_shift(cls, shift):
+        """
+        Nome completo do turno ("Diurno" -> "Diurno (07:30 às 19:30)"), para que
+        variações do mesmo turno não gerem relatórios duplicados
+        """
+        if not shift:
+            return shift
+        lowered = shift.lower()
+        for canonical in cls.CALENDAR_SHIFTS:
+            if canonical.split()[0].lower() in lowered:
+                return canonical
+        return " ".join(shift.split())
+
+    @staticmethod
+    def submission_key_for(text):
+        """Chave de idempotência derivada do texto (ignorando diferenças de espaços)"""
+        return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+    @classmethod
+    def find_existing(cls, report, session=None):
+        """
+        Relatório já salvo com a mesma chave natural (unidade, data, local, turno) ou a
+        mesma chave de idempotência, ou None. ``session`` permite consultar outro banco
+        (ex.: o banco central no envio do modo edge).
+        """
+        session = session or db.session
+        with session.no_autoflush:
+            if report.report_date is not None:
+                existing = session.query(cls).filter(cls.unit == report.unit,
+                                                     cls.report_date == report.report_date,
+                                                     cls.location == report.location,
+                                                     cls.shift == report.shift,
+                                                     cls.id != report.id).first()
+                if existing is not None:
+                    return existing
+            if report.submission_key:
+                return session.query(cls).filter(cls.submission_key == report.submission_key,
+                                                 cls.id != report.id).first()
+        return None
+
+    @classmethod
+    def store(cls, report, replace=False):
+        """
+        Adiciona o relatório à sessão (sem commit), respeitando a chave natural.
+
+        Se já existir um relatório com a mesma data/local/turno (ou a mesma chave de
+        idempotência), ele é mantido, ou substituído pelos novos dados quando
+        replace=True (o id e a data de criação são preservados).
+
+        Relatórios de meses já fechados (ver ClosedPeriod) não são gravados.
+
+        Returns:
+            tuple: (relatório salvo, resultado: "created", "replaced", "conflict" ou "closed")
+        """
+        return cls.store_all([report], replace)[0]
+
+    @staticmethod
+    def _store_keys(report):
+        """Chaves usadas por store_all para localizar o relatório: (chave natural ou None, chave de idempotência)"""
+        natural = ((report.unit, report.report_date, report.location, report.shift)
+                   if report.report_date is not None else None)
+        return natural, report.submission_key
+
+    @classmethod
+    def store_all(cls, reports, replace=False):
+        """
+        Adiciona vários relatórios à sessão (sem commit) com as mesmas regras de store,
+        na ordem recebida: um relatório que repete a chave de outro do mesmo lote é
+        tratado como se o anterior já estivesse salvo.
+
+        Os meses fechados e os relatórios existentes são consultados uma vez para o lote
+        todo, e o flush também é único (os listeners atualizam os totais uma vez).
+
+        Returns:
+            list: (relatório salvo, resultado) para cada relatório, na ordem recebida
+        """
+        periods = {report.report_date.replace(day=1) for report in reports if report.report_date is not None}
+        closed = set()
+        if periods:
+            closed = {period for (period,) in db.session.query(ClosedPeriod.period)
+                      .filter(ClosedPeriod.period.in_(periods))}
+
+        dates = {report.report_date for report in reports if report.report_date is not None}
+        submission_keys = {report.submission_key for report in reports if report.submission_key}
+        by_natural, by_submission = {}, {}
+
+        def remember(report):
+            natural, submission_key = cls._store_keys(report)
+            if natural is not None:
+                by_natural.setdefault(natural, report)
+            if submission_key:
+                by_submission.setdefault(submission_key, report)
+
+        def forget(report):
+            natural, submission_key = cls._store_keys(report)
+            if by_natural.get(natural) is report:
+                del by_natural[natural]
+            if by_submission.get(submission_key) is report:
+                del by_submission[submission_key]
+
+        conditions = []
+        if dates:
+            conditions.append(cls.report_date.in_(dates))
+        if submission_keys:
+            conditions.append(cls.submission_key.in_(submission_keys))
+        if conditions:
+            with db.session.no_autoflush:
+                for existing in db.session.query(cls).filter(or_(*conditions)).order_by(cls.id):
+                    remember(existing)
+
+        results, created = [], []
+        for report in reports:
+            if report.report_date is not None and report.report_date.replace(day=1) in closed:
+                results.append((report, "closed"))
+                continue
+            natural, submission_key = cls._store_keys(report)
+            existing = by_natural.get(natural) if natural is not None else None
+            if existing is None and submission_key:
+                existing = by_submission.get(submission_key)
+            if existing is None:
+                created.append(report)
+                remember(report)
+                results.append((report, "created"))
+            elif not replace:
+                results.append((existing, "conflict"))
+            else:
+                forget(existing)
+                for column in ['unit', 'location', 'date', 'shift', 'occurrence', 'submission_key'] + METRIC_COLUMNS:
+                    setattr(existing, column, getattr(report, column))
+                remember(existing)
+                results.append((existing, "replaced"))
+
+        db.session.add_all(created)
+        db.session.flush()
+        return results
+
+    @classmethod
+    def from_analysis(cls, fields):
+        """
+        Cria um relatório a partir do resultado da análise (IA ou regex).
+
+        Args:
+            fields (dict): Dados extraídos, com as chaves retornadas por ai_analyzer/extractor
+        """
+        return cls(
+            location=fields.get('location', 'NÃO IDENTIFICADO'),
+            date=fields.get('date', ''),
+            shift=fields.get('shift', 'Não identificado'),
+            people_count=fields.get('people_count', 0),
+            motorcycles_count=fields.get('motorcycles_count', 0),
+            cars_count=fields.get('cars_count', 0),
+            bicycles_count=fields.get('bicycles_count', 0),
+            arrests_count=fields.get('arrests_count', 0),
+            seized_motorcycles_count=fields.get('seized_motorcycles_count', 0),
+            drugs_seized_count=fields.get('drugs_seized_count', 0),
+            fugitives_count=fields.get('fugitives_count', 0),
+            bladed_weapons_count=fields.get('bladed_weapons_count', 0),
+            firearms_count=fields.get('firearms_count', 0),
+            occurrence=fields.get('occurrence', 'Sem ocorrência relevante')
+        )
 
     @property
     def total_inspections(self):
@@ -56,6 +408,28 @@ class Report(db.Model):
             'totalInspections': self.total_inspections
         }
         
+    @staticmethod
+    def to_report_date(date_str):
+        """
+        Converte a data DD/MM/AAAA em date para a coluna report_date.
+
+        Datas inválidas (ex.: 31/02) usam o primeiro dia do mês, como em parse_date;
+        textos sem data retornam None.
+        """
+        if not date_str:
+            return None
+        match = re.match(r'(\d{2})/(\d{2})/(\d{4})', date_str.strip())
+        if not match:
+            return None
+        day, month, year = map(int, match.groups())
+        try:
+            return datetime(year, month, day).date()
+        except ValueError:
+            try:
+                return datetime(year, month, 1).date()
+            except ValueError:
+                return None
+
     @staticmethod
     def parse_date(date_str):
         """Parse date string into datetime object"""
@@ -81,7 +455,136 @@ class Report(db.Model):
         return datetime(today.year, today.month, 1)
     
     @classmethod
-    def get_reports_calendar(cls, start_date=None, days=30):
+    def filtered_query(cls, query, start_date=None, end_date=None, shift=None, location=None, unit=None):
+        """
+        Aplica filtros opcionais de período, turno, localidade e unidade a uma consulta de relatórios.
+
+        Args:
+            query: Consulta SQLAlchemy sobre a tabela report
+            start_date: Data inicial (datetime, inclusiva)
+            end_date: Data final (datetime, inclusiva)
+            shift: Prefixo do turno ("Diurno" ou "Noturno")
+            location: Localidade exata (ex.: "MUANÁ")
+            unit: Código da unidade
+        """
+        if unit:
+            query = query.filter(cls.unit == unit)
+        if location:
+            query = query.filter(cls.location == location)
+        if start_date is not None:
+            query = query.filter(cls.report_date >= start_date.date())
+        if end_date is not None:
+            query = query.filter(cls.report_date <= end_date.date())
+        if shift:
+            query = query.filter(cls.shift.ilike(f"{shift}%"))
+        return query
+
+    @classmethod
+    def list_page(cls, fields, limit, after=None, start_date=None, end_date=None, shift=None, location=None):
+        """
+        Uma página da listagem de relatórios, do mais recente para o mais antigo.
+
+        Usa paginação por chave (keyset) em (created_at, id) em vez de OFFSET: a
+        próxima página começa logo após a última linha da anterior, usando o
+        índice ix_report_created_at_id, com custo constante em qualquer página.
+
+        Args:
+            fields (list): Chaves de LIST_FIELDS a retornar ('totalInspections' também é aceito)
+            limit (int): Quantidade máxima de relatórios
+            after (tuple): (created_at, id) da última linha da página anterior
+
+        Returns:
+            tuple: (lista de dicts, (created_at, id) para a próxima página ou None)
+        """
+        columns = {LIST_FIELDS[key] for key in fields if key in LIST_FIELDS}
+        if 'totalInspections' in fields:
+            columns.update(INSPECTION_COLUMNS)
+        columns = ['created_at', 'id'] + sorted(columns - {'created_at', 'id'})
+
+        query = db.session.query(*[getattr(cls, column) for column in columns])
+        query = cls.filtered_query(query, start_date, end_date, shift, location)
+        if after is not None:
+            query = query.filter(tuple_(cls.created_at, cls.id) < tuple_(*after))
+        rows = query.order_by(cls.created_at.desc(), cls.id.desc()).limit(limit + 1).all()
+
+        items = []
+        for row in rows[:limit]:
+            values = dict(zip(columns, row))
+            item = {}
+            for key in fields:
+                if key == 'totalInspections':
+                    item[key] = sum(values[column] or 0 for column in INSPECTION_COLUMNS)
+                elif key == 'created_at':
+                    item[key] = values['created_at'].isoformat() if values['created_at'] else None
+                else:
+                    item[key] = values[LIST_FIELDS[key]]
+            items.append(item)
+
+        next_key = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_key = (last[0], last[1])
+        return items, next_key
+
+    @classmethod
+    def iter_export_rows(cls, start_date=None, end_date=None, shift=None, location=None, batch_size=1000):
+        """
+        Percorre os relatórios filtrados em ordem de data, sem carregar a tabela inteira.
+
+        Usa yield_per (cursor no servidor no PostgreSQL), então a memória usada é
+        limitada a um lote de `batch_size` linhas.
+
+        Yields:
+            tuple: Valores na ordem de EXPORT_COLUMNS
+        """
+        columns = [getattr(cls, column) for column in EXPORT_COLUMNS]
+        query = cls.filtered_query(db.session.query(*columns), start_date, end_date, shift, location)
+        query = query.order_by(cls.report_date, cls.id).execution_options(yield_per=batch_size)
+        for row in query:
+            yield tuple(row)
+
+    @classmethod
+    def get_totals_by_location(cls, start_date=None, end_date=None, shift=None, unit=None):
+        """
+        Soma os indicadores por localidade em uma única consulta GROUP BY,
+        incluindo uma linha de total geral (ROLLUP) com localidade ``None``.
+
+        A consulta percorre apenas o período aberto (tabela report); os meses
+        fechados do intervalo são somados a partir das tabelas de resumo. Com
+        `unit`, apenas os relatórios da unidade (índice iniciado pela unidade).
+
+        Returns:
+            list: Tuplas (localidade, quantidade de relatórios, soma de cada coluna de METRIC_COLUMNS)
+        """
+        sums = [func.coalesce(func.sum(getattr(cls, column)), 0) for column in METRIC_COLUMNS]
+
+        if db.engine.dialect.name == 'postgresql':
+            query = cls.filtered_query(
+                db.session.query(cls.location, func.count(cls.id), *sums), start_date, end_date, shift, unit=unit)
+            query = query.group_by(func.rollup(cls.location))
+        else:
+            # SQLite não suporta ROLLUP: total geral via UNION ALL na mesma consulta
+            by_location = cls.filtered_query(
+                db.session.query(cls.location, func.count(cls.id), *sums), start_date, end_date, shift, unit=unit
+            ).group_by(cls.location)
+            grand_total = cls.filtered_query(
+                db.session.query(db.null(), func.count(cls.id), *sums), start_date, end_date, shift, unit=unit)
+            query = by_location.union_all(grand_total)
+
+        rows = [tuple(row) for row in query.all()]
+        closed = ClosedPeriod.totals_by_location(start_date, end_date, shift, unit)
+        if not closed:
+            return rows
+
+        merged = {location: list(values) for location, *values in rows}
+        for location, *values in closed:
+            for key in (location, None):
+                current = merged.setdefault(key, [0] * len(values))
+                merged[key] = [(a or 0) + (b or 0) for a, b in zip(current, values)]
+        return [(location, *values) for location, values in merged.items()]
+
+    @classmethod
+    def get_reports_calendar(cls, start_date=None, days=30, unit=None):
         """
         Generate a calendar of reports showing which dates have reports
         and which are missing for each location and shift.
@@ -89,35 +592,62 @@ class Report(db.Model):
         Args:
             start_date: Starting date (datetime or string in DD/MM/YYYY format)
             days: Number of days to check
+            unit: Código da unidade (padrão: DEFAULT_UNIT)
             
         Returns:
             dict: Calendar with status of each date/location/shift
         """
+        calendar, _ = cls._calendar_window(cls.calendar_start(start_date), days, unit or DEFAULT_UNIT)
+        return calendar
+
+    @classmethod
+    def calendar_start(cls, start_date=None):
+        """Primeiro dia do mês da data informada (datetime ou DD/MM/AAAA), ou do mês atual"""
         if start_date is None:
             # Default para o dia 1 do mês atual
             today = datetime.now()
-            start_date = datetime(today.year, today.month, 1)
-        elif isinstance(start_date, str):
+            return datetime(today.year, today.month, 1)
+        if isinstance(start_date, str):
             # Parse the string date
             start_date = cls.parse_date(start_date)
             if start_date is None:
                 # Se falhar o parsing, usar o primeiro dia do mês atual
                 today = datetime.now()
-                start_date = datetime(today.year, today.month, 1)
-            else:
-                # Se der certo o parsing, garantir que seja dia 1 do mês informado
-                start_date = datetime(start_date.year, start_date.month, 1)
+                return datetime(today.year, today.month, 1)
+            # Se der certo o parsing, garantir que seja dia 1 do mês informado
+            return datetime(start_date.year, start_date.month, 1)
+        return start_date
+
+    @classmethod
+    def _calendar_window(cls, start_date, days, unit):
+        """
+        Calendário da janela para a unidade e a versão dos dados (DataVersion) em que
+        ele foi calculado, lido do cache quando possível.
+        """
+        # Calcular a data final com base nos dias solicitados
+        end_date = start_date + timedelta(days=days - 1)
         
-        # Get all reports within date range
-        all_reports = cls.query.all()
+        # Janelas já calculadas vêm do cache (invalidado quando um relatório da janela muda).
+        # Entradas gravadas por versões anteriores (lista, sem a versão) são recalculadas
+        generation = calendar_cache.generation()
+        cached = calendar_cache.get(unit, start_date.date(), days)
+        if isinstance(cached, dict):
+            version = DataVersion.current()
+            if cached["version"] == version:
+                return cached["calendar"], version
+            # Versão diferente: relatórios gravados por outro servidor (ex.: envio do modo edge)
+            # não passam pela invalidação local; a janela só é recalculada se alguma data mudou
+            if ReportChange.changed_dates(cached["version"], version, start_date.date(), end_date.date(), unit) == set():
+                calendar_cache.put(unit, start_date.date(), days, end_date.date(),
+                                   {"version": version, "calendar": cached["calendar"]}, generation)
+                return cached["calendar"], version
         
-        # Map for quick lookup
-        report_map = {}
-        for report in all_reports:
-            parsed_date = cls.parse_date(report.date)
-            if parsed_date:
-                key = f"{parsed_date.strftime('%d/%m/%Y')}_{report.location}_{report.shift}"
-                report_map[key] = report
+        # Versão lida antes da consulta: alterações gravadas durante o cálculo ficam para o próximo delta
+        version = DataVersion.current()
+        report_map = cls._calendar_report_map(
+            lambda model: (model.unit == unit) & model.report_date.between(start_date.date(), end_date.date()),
+            start_date.date(), end_date.date())
+        locations = unit_registry.locations(unit)
         
         # Generate the calendar
         calendar = []
@@ -125,49 +655,1039 @@ class Report(db.Model):
         # Usar a data de início recebida do usuário
         current_date = start_date
         
-        # Calcular a data final com base nos dias solicitados
-        end_date = current_date + timedelta(days=days - 1)
-        
         # Iterar por todos os dias no intervalo
         while current_date <= end_date:
-            date_str = current_date.strftime('%d/%m/%Y')
-            
-            # Check status for each location and shift
-            locations = ["MUANÁ", "PONTA DE PEDRAS"]
-            shifts = ["Diurno (07:30 às 19:30)", "Noturno (19:30 às 07:30)"]
-            
-            date_entry = {
-                "date": date_str,
-                "reports": []
-            }
-            
-            for location in locations:
-                for shift in shifts:
-                    key = f"{date_str}_{location}_{shift}"
-                    
-                    # Check if we have a report that matches
-                    status = "missing"
-                    report_id = None
-                    
-                    # Try different shift name formats
-                    shift_alt = "Diurno" if "Diurno" in shift else "Noturno"
-                    key_alt = f"{date_str}_{location}_{shift_alt}"
-                    
-                    if key in report_map:
-                        status = "submitted"
-                        report_id = report_map[key].id
-                    elif key_alt in report_map:
-                        status = "submitted"
-                        report_id = report_map[key_alt].id
-                    
-                    date_entry["reports"].append({
-                        "location": location,
-                        "shift": shift,
-                        "status": status,
-                        "report_id": report_id
-                    })
-            
-            calendar.append(date_entry)
+            calendar.append(cls._calendar_day(current_date.date(), report_map, locations))
             current_date += timedelta(days=1)
         
-        return calendar
\ No newline at end of file
+        calendar_cache.put(unit, start_date.date(), days, end_date.date(),
+                           {"version": version, "calendar": calendar}, generation)
+        return calendar, version
+
+    @classmethod
+    def _calendar_report_map(cls, condition, start_date, end_date):
+        """
+        Relatórios que atendem à condição (função que recebe o modelo), como
+        {(data, local, turno): id}. O arquivo (ReportArchive) só é consultado quando
+        o intervalo inclui meses fechados.
+        """
+        models = [cls]
+        if ClosedPeriod.overlaps(start_date, end_date):
+            models.append(ReportArchive)
+        
+        # Buscar apenas os relatórios necessários (usa o índice em report_date)
+        rows = []
+        for model in models:
+            rows += db.session.query(model.id, model.report_date, model.location, model.shift).filter(
+                condition(model)).all()
+        record_rows_scanned("calendar", len(rows))
+        
+        # Map for quick lookup
+        return {(report_date, location, shift): report_id
+                for report_id, report_date, location, shift in rows}
+
+    @classmethod
+    def _calendar_day(cls, day, report_map, locations):
+        """Entrada do calendário de um dia, com o status de cada local (da unidade) e turno"""
+        date_entry = {
+            "date": day.strftime('%d/%m/%Y'),
+            "reports": []
+        }
+        
+        # Check status for each location and shift
+        for location in locations:
+            for shift in cls.CALENDAR_SHIFTS:
+                report_id = report_map.get((day, location, shift))
+                
+                date_entry["reports"].append({
+                    "location": location,
+                    "shift": shift,
+                    "status": "submitted" if report_id else "missing",
+                    "report_id": report_id
+                })
+        
+        return date_entry
+
+    @staticmethod
+    def _compact_day(date_entry):
+        """
+        Dia no formato compacto: [máscara, ids...]. O bit i da máscara indica que o
+        relatório i (locais da unidade x turnos, na ordem do cadastro e de CALENDAR_SHIFTS)
+        foi enviado; os ids seguem a ordem dos bits ligados. Máscaras acima de 2^53 - 1
+        (unidades com mais de 26 locais) vão como texto, que o JavaScript não arredonda.
+        """
+        mask = 0
+        ids = []
+        for index, report in enumerate(date_entry["reports"]):
+            if report["report_id"]:
+                mask |= 1 << index
+                ids.append(report["report_id"])
+        return [mask if mask <= MAX_SAFE_JSON_INTEGER else str(mask)] + ids
+
+    @classmethod
+    def get_reports_calendar_compact(cls, start_date=None, days=30, since=None, unit=None):
+        """
+        Calendário em formato compacto: locais e turnos enviados uma vez e cada dia
+        como [máscara, ids...] (ver _compact_day).
+
+        Com `since` (versão recebida na resposta anterior), retorna apenas os dias da
+        janela alterados desde então, como [índice do dia, máscara, ids...]. Quando o
+        delta não pode ser calculado (ex.: dados resetados), retorna a janela inteira
+        com "full": true.
+        """
+        unit = unit or DEFAULT_UNIT
+        start_date = cls.calendar_start(start_date)
+        end_date = start_date + timedelta(days=days - 1)
+        locations = unit_registry.locations(unit)
+        payload = {
+            "unit": unit,
+            "start_date": start_date.strftime('%d/%m/%Y'),
+            "days": days,
+            "locations": locations,
+            "shifts": cls.CALENDAR_SHIFTS,
+        }
+
+        if since is not None:
+            version = DataVersion.current()
+            changed = ReportChange.changed_dates(since, version, start_date.date(), end_date.date(), unit)
+            if changed is not None:
+                report_map = cls._calendar_report_map(
+                    lambda model: (model.unit == unit) & model.report_date.in_(changed),
+                    min(changed), max(changed)) if changed else {}
+                payload.update({
+                    "version": version,
+                    "full": False,
+                    "changes": [[(day - start_date.date()).days] +
+                                cls._compact_day(cls._calendar_day(day, report_map, locations))
+                                for day in sorted(changed)],
+                })
+                return payload
+
+        calendar, version = cls._calendar_window(start_date, days, unit)
+        payload.update({
+            "version": version,
+            "full": True,
+            "calendar": [cls._compact_day(date_entry) for date_entry in calendar],
+        })
+        return payload
+
+
+class ReportTotals(db.Model):
+    """
+    Totais acumulados por localidade e turno.
+
+    As linhas são atualizadas na mesma transação em que um relatório é
+    inserido, alterado ou excluído (ver listener ``before_flush`` abaixo),
+    evitando somar a tabela ``report`` inteira a cada requisição. Cobrem apenas
+    o período aberto; os meses fechados ficam em ReportPeriodSummary.
+    """
+    __tablename__ = 'report_totals'
+    __table_args__ = (db.UniqueConstraint('unit', 'location', 'shift', name='uq_report_totals_unit_location_shift'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    unit = db.Column(db.String(30), nullable=False, default=DEFAULT_UNIT)
+    location = db.Column(db.String(50), nullable=False)
+    shift = db.Column(db.String(50), nullable=False, default='')
+    reports_count = db.Column(db.Integer, nullable=False, default=0)
+    people_count = db.Column(db.Integer, nullable=False, default=0)
+    motorcycles_count = db.Column(db.Integer, nullable=False, default=0)
+    cars_count = db.Column(db.Integer, nullable=False, default=0)
+    bicycles_count = db.Column(db.Integer, nullable=False, default=0)
+    arrests_count = db.Column(db.Integer, nullable=False, default=0)
+    seized_motorcycles_count = db.Column(db.Integer, nullable=False, default=0)
+    drugs_seized_count = db.Column(db.Float, nullable=False, default=0.0)
+    fugitives_count = db.Column(db.Integer, nullable=False, default=0)
+    bladed_weapons_count = db.Column(db.Integer, nullable=False, default=0)
+    firearms_count = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def get_totals(cls, unit=None):
+        """
+        Retorna os totais gerais (ou da unidade) no formato usado pelas respostas da API:
+        os do período aberto (esta tabela) mais os dos meses fechados (ReportPeriodSummary)
+        """
+        columns = ['reports_count'] + METRIC_COLUMNS
+        sums = [0] * len(columns)
+        for model in (cls, ReportPeriodSummary):
+            query = db.session.query(*[func.coalesce(func.sum(getattr(model, column)), 0) for column in columns])
+            if unit:
+                query = query.filter(model.unit == unit)
+            values = query.one()
+            sums = [total + value for total, value in zip(sums, values)]
+        return build_totals_dict(dict(zip(METRIC_COLUMNS, sums[1:])), sums[0])
+
+    @classmethod
+    def _computed_rows(cls):
+        """Agrega a tabela report por unidade/localidade/turno (usado para verificação e reconstrução)"""
+        shift = func.coalesce(Report.shift, '')
+        return (db.session.query(
+                    Report.unit, Report.location, shift, func.count(Report.id),
+                    *[func.coalesce(func.sum(getattr(Report, column)), 0) for column in METRIC_COLUMNS])
+                .group_by(Report.unit, Report.location, shift))
+
+    @classmethod
+    def check(cls):
+        """
+        Compara os totais persistidos com os valores calculados a partir da tabela report.
+
+        Returns:
+            list: Lista de divergências (vazia se os totais estão consistentes)
+        """
+        columns = ['reports_count'] + METRIC_COLUMNS
+        expected = {(row[0], row[1], row[2]): list(row[3:]) for row in cls._computed_rows()}
+        stored = {(row.unit, row.location, row.shift): [getattr(row, column) for column in columns]
+                  for row in cls.query.all()}
+
+        mismatches = []
+        for key in set(expected) | set(stored):
+            expected_values = expected.get(key, [0] * len(columns))
+            stored_values = stored.get(key, [0] * len(columns))
+            for column, exp, got in zip(columns, expected_values, stored_values):
+                if abs((exp or 0) - (got or 0)) > 1e-6:
+                    mismatches.append({
+                        'unit': key[0],
+                        'location': key[1],
+                        'shift': key[2],
+                        'column': column,
+                        'expected': exp,
+                        'stored': got,
+                    })
+        return mismatches
+
+    @classmethod
+    def rebuild(cls):
+        """Recalcula todos os totais a partir da tabela report (não faz commit)"""
+        db.session.execute(cls.__table__.delete())
+        shift = func.coalesce(Report.shift, '')
+        select_stmt = (db.select(
+                           Report.unit, Report.location, shift, func.count(Report.id),
+                           *[func.coalesce(func.sum(getattr(Report, column)), 0) for column in METRIC_COLUMNS])
+                       .group_by(Report.unit, Report.location, shift))
+        db.session.execute(
+            insert(cls.__table__).from_select(
+                ['unit', 'location', 'shift', 'reports_count'] + METRIC_COLUMNS, select_stmt))
+
+
+class StatsColumnsMixin:
+    """Colunas das tabelas de indicadores somados por período, unidade, localidade e turno"""
+    unit = db.Column(db.String(30), nullable=False, default=DEFAULT_UNIT)
+    location = db.Column(db.String(50), nullable=False)
+    shift = db.Column(db.String(50), nullable=False, default='')
+    reports_count = db.Column(db.Integer, nullable=False, default=0)
+    people_count = db.Column(db.Integer, nullable=False, default=0)
+    motorcycles_count = db.Column(db.Integer, nullable=False, default=0)
+    cars_count = db.Column(db.Integer, nullable=False, default=0)
+    bicycles_count = db.Column(db.Integer, nullable=False, default=0)
+    arrests_count = db.Column(db.Integer, nullable=False, default=0)
+    seized_motorcycles_count = db.Column(db.Integer, nullable=False, default=0)
+    drugs_seized_count = db.Column(db.Float, nullable=False, default=0.0)
+    fugitives_count = db.Column(db.Integer, nullable=False, default=0)
+    bladed_weapons_count = db.Column(db.Integer, nullable=False, default=0)
+    firearms_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class RollupStatsMixin(StatsColumnsMixin):
+    """
+    Operações comuns às tabelas de estatísticas por período (dia ou mês),
+    localidade e turno.
+
+    Como em ReportTotals, as linhas são atualizadas no listener ``before_flush``
+    na mesma transação dos relatórios. Relatórios sem data (report_date nula)
+    não entram nas séries. Os meses fechados continuam nas séries: as
+    reconstruções incluem os relatórios arquivados.
+
+    Cada tabela define ``period_of(day)``, o início do período que contém a data.
+    """
+
+    @classmethod
+    def _computed(cls):
+        """
+        Agrega as tabelas report e report_archive por (unidade, período, localidade, turno)
+        -> [reports_count, *METRIC_COLUMNS]
+        """
+        computed = {}
+        for model in (Report, ReportArchive):
+            shift = func.coalesce(model.shift, '')
+            rows = (db.session.query(
+                        model.unit, model.report_date, model.location, shift, func.count(model.id),
+                        *[func.coalesce(func.sum(getattr(model, column)), 0) for column in METRIC_COLUMNS])
+                    .filter(model.report_date.isnot(None))
+                    .group_by(model.unit, model.report_date, model.location, shift))
+
+            # Agrupamento diário no banco; o agrupamento por período (ex.: mês) é feito aqui,
+            # sobre poucas linhas, para não depender de funções de data de cada banco
+            for unit, day, location, shift_value, *values in rows:
+                key = (unit, cls.period_of(day), location, shift_value)
+                current = computed.setdefault(key, [0] * len(values))
+                for index, value in enumerate(values):
+                    current[index] += value or 0
+        return computed
+
+    @classmethod
+    def check(cls):
+        """
+        Compara as linhas persistidas com os valores calculados a partir da tabela report.
+
+        Returns:
+            list: Lista de divergências (vazia se a tabela está consistente)
+        """
+        columns = ['reports_count'] + METRIC_COLUMNS
+        expected = cls._computed()
+        stored = {(row.unit, row.period, row.location, row.shift): [getattr(row, column) for column in columns]
+                  for row in cls.query.all()}
+
+        mismatches = []
+        for key in set(expected) | set(stored):
+            expected_values = expected.get(key, [0] * len(columns))
+            stored_values = stored.get(key, [0] * len(columns))
+            for column, exp, got in zip(columns, expected_values, stored_values):
+                if abs((exp or 0) - (got or 0)) > 1e-6:
+                    mismatches.append({
+                        'unit': key[0],
+                        'period': key[1],
+                        'location': key[2],
+                        'shift': key[3],
+                        'column': column,
+                        'expected': exp,
+                        'stored': got,
+                    })
+        return mismatches
+
+    @classmethod
+    def rebuild(cls):
+        """Recalcula a tabela a partir dos relatórios e do arquivo (não faz commit)"""
+        db.session.execute(cls.__table__.delete())
+        rows = [{'unit': unit, 'period': period, 'location': location, 'shift': shift,
+                 **dict(zip(['reports_count'] + METRIC_COLUMNS, values))}
+                for (unit, period, location, shift), values in cls._computed().items()]
+        if rows:
+            db.session.execute(insert(cls.__table__), rows)
+
+
+class ReportDailyStats(RollupStatsMixin, db.Model):
+    """Indicadores somados por dia, localidade e turno"""
+    __tablename__ = 'report_daily_stats'
+    __table_args__ = (
+        db.UniqueConstraint('unit', 'period', 'location', 'shift',
+                            name='uq_report_daily_stats_unit_period_location_shift'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.Date, nullable=False)  # O próprio dia
+
+    @staticmethod
+    def period_of(day):
+        """O próprio dia"""
+        return day
+
+
+class ReportMonthlyStats(RollupStatsMixin, db.Model):
+    """Indicadores somados por mês, localidade e turno"""
+    __tablename__ = 'report_monthly_stats'
+    __table_args__ = (
+        db.UniqueConstraint('unit', 'period', 'location', 'shift',
+                            name='uq_report_monthly_stats_unit_period_location_shift'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.Date, nullable=False)  # Primeiro dia do mês
+
+    @staticmethod
+    def period_of(day):
+        """Primeiro dia do mês"""
+        return day.replace(day=1)
+
+
+# Tabelas de estatísticas por período mantidas junto com os relatórios
+ROLLUP_MODELS = [ReportDailyStats, ReportMonthlyStats]
+
+# Indicadores aceitos em /api/stats/timeseries (mesmas chaves de /api/reports-by-location)
+TIMESERIES_METRICS = {column[:-len('_count')]: column for column in METRIC_COLUMNS}
+
+
+def _timeseries_value(metric):
+    """Expressão SQL da soma do indicador (total_inspections e reports_count incluídos)"""
+    if metric == 'reports_count':
+        return lambda model: func.sum(model.reports_count)
+    if metric == 'total_inspections':
+        return lambda model: func.sum(sum(getattr(model, column) for column in INSPECTION_COLUMNS))
+    column = TIMESERIES_METRICS[metric]
+    return lambda model: func.sum(getattr(model, column))
+
+
+def get_timeseries(grain, metric, by='location', start_date=None, end_date=None, location=None, shift=None,
+                   unit=None):
+    """
+    Série temporal de um indicador a partir das tabelas de estatísticas por período.
+
+    Args:
+        grain (str): 'day', 'week' (segunda-feira a domingo) ou 'month'
+        metric (str): Chave de TIMESERIES_METRICS, 'total_inspections' ou 'reports_count'
+        by (str): Separar as séries por 'location', 'shift', 'location_shift' ou 'none'
+        start_date, end_date: Datas (datetime) inclusivas
+        location (str): Localidade exata
+        shift (str): Prefixo do turno ("Diurno" ou "Noturno")
+        unit (str): Código da unidade
+
+    Returns:
+        list: Séries [{'location', 'shift', 'points': [{'period': date, 'value': número}]}]
+    """
+    model = ReportMonthlyStats if grain == 'month' else ReportDailyStats
+    group_columns = {
+        'location': [model.location],
+        'shift': [model.shift],
+        'location_shift': [model.location, model.shift],
+        'none': [],
+    }[by]
+
+    query = db.session.query(model.period, *group_columns, _timeseries_value(metric)(model))
+    if unit:
+        query = query.filter(model.unit == unit)
+    if start_date is not None:
+        query = query.filter(model.period >= model.period_of(start_date.date()))
+    if end_date is not None:
+        query = query.filter(model.period <= end_date.date())
+    if location:
+        query = query.filter(model.location == location)
+    if shift:
+        query = query.filter(model.shift.ilike(f"{shift}%"))
+    rows = query.group_by(model.period, *group_columns).all()
+
+    series = {}
+    for period, *group_values, value in rows:
+        if grain == 'week':
+            period = period - timedelta(days=period.weekday())
+        group = dict(zip([column.key for column in group_columns], group_values))
+        points = series.setdefault(tuple(sorted(group.items())), {})
+        points[period] = points.get(period, 0) + (value or 0)
+
+    return [
+        {**dict(group), 'points': [{'period': period, 'value': points[period]} for period in sorted(points)]}
+        for group, points in sorted(series.items())
+    ]
+
+
+# Maior intervalo aceito pelo relatório de cobertura (a série de datas é gerada no banco)
+COVERAGE_MAX_DAYS = 20 * 366
+
+
+def _coverage_date_functions(dialect_name):
+    """Expressões de data de cada banco: (dia seguinte, mês AAAA-MM)"""
+    if dialect_name == 'sqlite':
+        return (lambda day: func.date(day, '+1 day'),
+                lambda day: func.strftime('%Y-%m', day))
+    return (lambda day: day + 1,
+            lambda day: func.to_char(day, 'YYYY-MM'))
+
+
+def get_coverage(start_date, end_date, location=None, shift=None, unit=None):
+    """
+    Cobertura dos relatórios por mês, local e turno, calculada em uma única consulta:
+    a série de datas do intervalo (CTE recursiva) é combinada com os locais das
+    unidades e os turnos do calendário e ligada aos relatórios por (unidade, data,
+    local, turno), sem laços por dia.
+
+    Args:
+        start_date, end_date: Datas (date) inclusivas
+        location (str): Localidade exata
+        shift (str): Prefixo do turno ("Diurno" ou "Noturno")
+        unit (str): Código da unidade (padrão: todas)
+
+    Returns:
+        list: [{'month': 'AAAA-MM', 'unit', 'location', 'shift', 'expected', 'submitted', 'missing'}]
+    """
+    next_day, month_of = _coverage_date_functions(db.engine.dialect.name)
+
+    days = select(literal(start_date, db.Date).label('day')).cte('coverage_days', recursive=True)
+    days = days.union_all(select(next_day(days.c.day).label('day')).where(days.c.day < end_date))
+
+    units = [unit] if unit else [entry["code"] for entry in unit_registry.units()]
+    slots = [(slot_unit, slot_location, slot_shift)
+             for slot_unit in units
+             for slot_location in unit_registry.locations(slot_unit)
+             for slot_shift in Report.CALENDAR_SHIFTS
+             if (not location or slot_location == location) and
+                (not shift or slot_shift.lower().startswith(shift.lower()))]
+    if not slots:
+        return []
+    slots = union_all(*[select(literal(slot_unit).label('unit'), literal(slot_location).label('location'),
+                               literal(slot_shift).label('shift'))
+                        for slot_unit, slot_location, slot_shift in slots]).subquery('coverage_slots')
+
+    # Relatórios do intervalo, no período aberto e nos meses fechados (arquivo)
+    reports = union_all(*[
+        select(model.id, model.unit, model.report_date, model.location, model.shift)
+        .where(model.report_date.between(start_date, end_date), *([model.unit == unit] if unit else []))
+        for model in (Report, ReportArchive)]).subquery('coverage_reports')
+
+    month = month_of(days.c.day).label('month')
+    rows = db.session.execute(
+        select(month, slots.c.unit, slots.c.location, slots.c.shift,
+               func.count().label('expected'), func.count(reports.c.id).label('submitted'))
+        .select_from(days.join(slots, literal(True)))
+        .outerjoin(reports, (reports.c.unit == slots.c.unit) &
+                            (reports.c.report_date == days.c.day) &
+                            (reports.c.location == slots.c.location) &
+                            (reports.c.shift == slots.c.shift))
+        .group_by(month, slots.c.unit, slots.c.location, slots.c.shift)
+        .order_by(month, slots.c.unit, slots.c.location, slots.c.shift)).all()
+
+    return [
+        {'month': row_month, 'unit': row_unit, 'location': row_location, 'shift': row_shift,
+         'expected': expected, 'submitted': submitted, 'missing': expected - submitted}
+        for row_month, row_unit, row_location, row_shift, expected, submitted in rows
+    ]
+
+
+def month_end(day):
+    """Último dia do mês da data"""
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+class ReportArchive(db.Model):
+    """
+    Relatórios de meses fechados (ver ClosedPeriod), com as mesmas colunas e ids
+    da tabela report.
+
+    No PostgreSQL a tabela é particionada por mês de report_date (uma partição
+    report_archive_AAAA_MM criada ao fechar cada mês); no SQLite é uma tabela comum.
+    """
+    __tablename__ = 'report_archive'
+    __table_args__ = (
+        db.Index('ix_report_archive_unit_date_location_shift', 'unit', 'report_date', 'location', 'shift'),
+        {'postgresql_partition_by': 'RANGE (report_date)'},
+    )
+
+    # Colunas copiadas da tabela report
+    REPORT_COLUMNS = ['id', 'unit', 'location', 'date', 'report_date', 'shift'] + METRIC_COLUMNS + [
+        'occurrence', 'created_at', 'submission_key']
+
+    # A chave de partição precisa fazer parte da chave primária
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    report_date = db.Column(db.Date, primary_key=True)
+    unit = db.Column(db.String(30), nullable=False, default=DEFAULT_UNIT, server_default=DEFAULT_UNIT)
+    location = db.Column(db.String(50), nullable=False)
+    date = db.Column(db.String(20), nullable=True)
+    shift = db.Column(db.String(50), nullable=True)
+    people_count = db.Column(db.Integer, default=0)
+    motorcycles_count = db.Column(db.Integer, default=0)
+    cars_count = db.Column(db.Integer, default=0)
+    bicycles_count = db.Column(db.Integer, default=0)
+    arrests_count = db.Column(db.Integer, default=0)
+    seized_motorcycles_count = db.Column(db.Integer, default=0)
+    drugs_seized_count = db.Column(db.Float, default=0.0)
+    fugitives_count = db.Column(db.Integer, default=0)
+    bladed_weapons_count = db.Column(db.Integer, default=0)
+    firearms_count = db.Column(db.Integer, default=0)
+    occurrence = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime)
+    submission_key = db.Column(db.String(64), nullable=True, index=True)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @classmethod
+    def create_partition(cls, connection, period):
+        """Cria a partição do mês no PostgreSQL (sem efeito nos demais bancos)"""
+        if connection.dialect.name != 'postgresql':
+            return
+        next_month = month_end(period) + timedelta(days=1)
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {cls.__tablename__}_{period:%Y_%m} "
+            f"PARTITION OF {cls.__tablename__} FOR VALUES FROM ('{period}') TO ('{next_month}')"))
+
+
+class ReportPeriodSummary(StatsColumnsMixin, db.Model):
+    """Totais de cada mês fechado por unidade, localidade e turno, gravados no fechamento"""
+    __tablename__ = 'report_period_summary'
+    __table_args__ = (
+        db.UniqueConstraint('unit', 'period', 'location', 'shift',
+                            name='uq_report_period_summary_unit_period_location_shift'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.Date, nullable=False)  # Primeiro dia do mês
+
+    @classmethod
+    def rebuild_period(cls, period):
+        """
+        Recalcula o resumo do mês a partir de report_archive (não faz commit).
+
+        Returns:
+            int: Quantidade de relatórios arquivados do mês
+        """
+        connection = db.session.connection()
+        archive = ReportArchive.__table__
+        summary = cls.__table__
+        shift = func.coalesce(archive.c.shift, '')
+        connection.execute(delete(summary).where(summary.c.period == period))
+        connection.execute(
+            insert(summary).from_select(
+                ['period', 'unit', 'location', 'shift', 'reports_count'] + METRIC_COLUMNS,
+                select(literal(period, db.Date), archive.c.unit, archive.c.location, shift, func.count(archive.c.id),
+                       *[func.coalesce(func.sum(archive.c[column]), 0) for column in METRIC_COLUMNS])
+                .where(archive.c.report_date.between(period, month_end(period)))
+                .group_by(archive.c.unit, archive.c.location, shift)))
+        return connection.execute(
+            select(func.coalesce(func.sum(summary.c.reports_count), 0)).where(summary.c.period == period)).scalar()
+
+
+class ClosedPeriod(db.Model):
+    """
+    Meses fechados. Ao fechar um mês, os relatórios saem da tabela report (que passa a
+    conter apenas o período aberto) para report_archive, e os totais do mês ficam em
+    ReportPeriodSummary. Relatórios de meses fechados não são mais aceitos.
+    """
+    __tablename__ = 'closed_period'
+
+    period = db.Column(db.Date, primary_key=True)  # Primeiro dia do mês
+    reports_count = db.Column(db.Integer, nullable=False, default=0)
+    closed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @classmethod
+    def is_closed(cls, day):
+        return db.session.get(cls, day.replace(day=1)) is not None
+
+    @classmethod
+    def overlaps(cls, start_date, end_date):
+        """Verifica se algum mês fechado intersecta o intervalo de datas"""
+        return db.session.query(cls.period).filter(
+            cls.period.between(start_date.replace(day=1), end_date)).first() is not None
+
+    @classmethod
+    def totals_by_location(cls, start_date=None, end_date=None, shift=None, unit=None):
+        """
+        Indicadores dos meses fechados no intervalo, por localidade, lidos de
+        ReportPeriodSummary (meses inteiros no intervalo) e de ReportDailyStats
+        (meses cobertos em parte).
+
+        Returns:
+            list: Tuplas (localidade, quantidade de relatórios, soma de cada coluna de METRIC_COLUMNS)
+        """
+        start = start_date.date() if start_date is not None else None
+        end = end_date.date() if end_date is not None else None
+        query = db.session.query(cls.period)
+        if start is not None:
+            query = query.filter(cls.period >= start.replace(day=1))
+        if end is not None:
+            query = query.filter(cls.period <= end)
+        periods = [period for period, in query]
+        if not periods:
+            return []
+
+        full = [period for period in periods
+                if (start is None or period >= start) and (end is None or month_end(period) <= end)]
+        partial = [(max(period, start or period), min(month_end(period), end or month_end(period)))
+                   for period in periods if period not in full]
+
+        sources = []
+        if full:
+            sources.append((ReportPeriodSummary, ReportPeriodSummary.period.in_(full)))
+        if partial:
+            sources.append((ReportDailyStats, or_(*[ReportDailyStats.period.between(*bounds)
+                                                    for bounds in partial])))
+
+        rows = []
+        for model, condition in sources:
+            query = db.session.query(
+                model.location, func.sum(model.reports_count),
+                *[func.coalesce(func.sum(getattr(model, column)), 0) for column in METRIC_COLUMNS]
+            ).filter(condition)
+            if unit:
+                query = query.filter(model.unit == unit)
+            if shift:
+                query = query.filter(model.shift.ilike(f"{shift}%"))
+            rows += [tuple(row) for row in query.group_by(model.location)]
+        return rows
+
+    @classmethod
+    def close(cls, period):
+        """
+        Fecha o mês: copia os relatórios do mês para report_archive e os remove da
+        tabela report, grava os totais do mês em ReportPeriodSummary e registra o
+        fechamento (não faz commit). Fechar novamente um mês recalcula o resumo.
+
+        As estatísticas por dia/mês (séries temporais) não mudam: as operações em
+        massa não passam pelo listener ``before_flush``.
+
+        Args:
+            period: Data (date) de qualquer dia do mês
+
+        Returns:
+            ClosedPeriod: O registro do fechamento
+        """
+        start = period.replace(day=1)
+        end = month_end(start)
+        if start >= datetime.now().date().replace(day=1):
+            raise ValueError("Apenas meses anteriores ao mês atual podem ser fechados")
+
+        connection = db.session.connection()
+        ReportArchive.create_partition(connection, start)
+
+        report = Report.__table__
+        in_month = report.c.report_date.between(start, end)
+        connection.execute(
+            insert(ReportArchive.__table__).from_select(
+                ReportArchive.REPORT_COLUMNS + ['archived_at'],
+                select(*[report.c[column] for column in ReportArchive.REPORT_COLUMNS],
+                       literal(datetime.utcnow(), db.DateTime)).where(in_month)))
+        connection.execute(delete(report).where(in_month))
+
+        reports_count = ReportPeriodSummary.rebuild_period(start)
+
+        closed = db.session.get(cls, start)
+        if closed is None:
+            closed = cls(period=start)
+            db.session.add(closed)
+        closed.reports_count = reports_count
+        closed.closed_at = datetime.utcnow()
+
+        # Os totais do período aberto deixam de incluir o mês
+        ReportTotals.rebuild()
+
+        # Os relatórios do mês mudaram de tabela: delta do calendário e cache invalidados
+        # (em todas as unidades)
+        dates = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+        ReportChange.record(DataVersion.bump(connection), dates, connection)
+        db.session.info.setdefault('calendar_dates', set()).update((None, day) for day in dates)
+
+        db.session.flush()
+        return closed
+
+
+class AnalysisJob(db.Model):
+    """
+    Submissão de relatório aguardando análise assíncrona.
+
+    O texto fica salvo no banco para que nenhuma submissão se perca caso o
+    processo seja reiniciado antes da análise terminar.
+    """
+    __tablename__ = 'analysis_job'
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    id = db.Column(db.String(36), primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default=STATUS_PENDING, index=True)
+    text = db.Column(db.Text, nullable=False)
+    report_id = db.Column(db.Integer, db.ForeignKey('report.id', ondelete='SET NULL'), nullable=True)
+    submission_key = db.Column(db.String(64), nullable=True, index=True)
+    replace_existing = db.Column(db.Boolean, nullable=False, default=False)  # Opção replace da submissão
+    unit = db.Column(db.String(30), nullable=True)  # Unidade da submissão (para locais não cadastrados)
+    outcome = db.Column(db.String(20), nullable=True)  # created, replaced ou conflict (ver Report.store)
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        """Convert job to dictionary"""
+        return {
+            'id': self.id,
+            'status': self.status,
+            'report_id': self.report_id,
+            'outcome': self.outcome,
+            'error': self.error,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+
+class AIResultCache(db.Model):
+    """
+    Resultados da análise por IA, indexados pelo hash do texto normalizado
+    e da versão do prompt/modelo (ver ai_cache.py).
+    """
+    __tablename__ = 'ai_result_cache'
+
+    key = db.Column(db.String(64), primary_key=True)
+    prompt_version = db.Column(db.String(16), nullable=False, index=True)
+    result = db.Column(db.Text, nullable=False)  # JSON retornado pela IA
+    hits = db.Column(db.Integer, nullable=False, default=0)  # não incrementado: acertos contados em memória
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+def build_totals_dict(sums, reports_count):
+    """Monta o dicionário de totais (chaves camelCase) a partir das somas por coluna"""
+    totals = {key: sums.get(column) or 0 for column, key in METRIC_FIELDS}
+    # Total de inspeções deve incluir apenas pessoas, veículos, prisões e foragidos
+    # Conforme solicitado pelo usuário: não incluir drogas apreendidas no total
+    totals['totalInspections'] = sum(sums.get(column) or 0 for column in INSPECTION_COLUMNS)
+    totals['reportsCount'] = reports_count or 0
+    return totals
+
+
+def _report_snapshot(report, previous=False):
+    """
+    Retorna (chave, valores) de um relatório para cálculo de deltas, com
+    chave (unidade, localidade, turno, report_date).
+
+    Com ``previous=True`` usa os valores anteriores à alteração pendente
+    (histórico de atributos), para relatórios modificados na sessão.
+    """
+    def value(attr):
+        if previous:
+            history = get_history(report, attr)
+            if history.deleted:
+                return history.deleted[0]
+        return getattr(report, attr)
+
+    key = (value('unit'), value('location'), value('shift') or '', value('report_date'))
+    values = {column: value(column) or 0 for column in METRIC_COLUMNS}
+    return key, values
+
+
+class DataVersion(db.Model):
+    """
+    Contador de versão dos dados de relatórios (linha única).
+
+    É incrementado na mesma transação de qualquer inserção, alteração ou
+    exclusão de relatórios, e serve de base para ETags e caches.
+    """
+    __tablename__ = 'data_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def current(cls):
+        """Retorna a versão atual dos dados (0 se nenhum relatório foi gravado)"""
+        version = db.session.query(cls.version).filter(cls.id == 1).scalar()
+        return version or 0
+
+    @classmethod
+    def bump(cls, connection=None):
+        """Incrementa a versão dos dados na transação atual e retorna a nova versão"""
+        connection = connection or db.session.connection()
+        table = cls.__table__
+        result = connection.execute(
+            update(table).where(table.c.id == 1).values(version=table.c.version + 1))
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(id=1, version=1))
+            return 1
+        return connection.execute(select(table.c.version).where(table.c.id == 1)).scalar()
+
+
+class ReportChange(db.Model):
+    """
+    Datas com relatórios incluídos, alterados ou excluídos em cada versão dos dados,
+    usadas pelo delta do calendário compacto (/api/calendar?format=compact&since=).
+
+    A versão é incrementada com a linha de DataVersion bloqueada até o commit, então
+    as versões ficam na ordem dos commits e nenhum delta perde alterações. Uma linha
+    sem data indica que todas as datas mudaram (ex.: /reset); uma linha sem unidade
+    vale para todas as unidades.
+
+    Apenas as últimas REPORT_CHANGE_RETENTION versões são mantidas (limpeza a cada
+    PRUNE_EVERY versões); deltas a partir de versões mais antigas não são calculados.
+    """
+    __tablename__ = 'report_change'
+
+    PRUNE_EVERY = 100
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, index=True)
+    unit = db.Column(db.String(30), nullable=True)
+    report_date = db.Column(db.Date, nullable=True)
+
+    @classmethod
+    def record(cls, version, dates, connection=None, unit=None):
+        """Registra as datas alteradas na versão (None = todas as datas) para a unidade (None = todas)"""
+        connection = connection or db.session.connection()
+        rows = [{"version": version, "unit": unit, "report_date": day} for day in dates]
+        if rows:
+            connection.execute(insert(cls.__table__), rows)
+        if version % cls.PRUNE_EVERY == 0:
+            connection.execute(delete(cls.__table__).where(cls.version <= version - REPORT_CHANGE_RETENTION))
+
+    @classmethod
+    def changed_dates(cls, since, version, start_date, end_date, unit):
+        """
+        Datas da janela alteradas na unidade entre a versão `since` e `version`, ou
+        None se o delta não puder ser calculado (versão desconhecida, anterior às
+        versões mantidas ou dados resetados).
+        """
+        if since > version:
+            return None
+        if since < version:
+            # As versões mantidas formam um intervalo contínuo até a atual
+            oldest = db.session.query(func.min(cls.version)).scalar()
+            if oldest is None or since < oldest - 1:
+                return None
+        rows = (db.session.query(cls.report_date).distinct()
+                .filter(cls.version > since, cls.version <= version)
+                .filter((cls.report_date.is_(None)) |
+                        (((cls.unit == unit) | cls.unit.is_(None)) & cls.report_date.between(start_date, end_date)))
+                .all())
+        dates = {report_date for report_date, in rows}
+        if None in dates:
+            return None
+        return dates
+
+
+class SyncOutbox(db.Model):
+    """
+    Alterações de relatórios ainda não enviadas ao banco central (modo edge), na ordem
+    em que foram gravadas. Inclusões e alterações guardam o id do relatório (o envio lê
+    os dados atuais); exclusões guardam as chaves do relatório excluído. As linhas são
+    removidas depois que o banco central confirma o envio; ``error`` marca as que o
+    banco central recusou (não são reenviadas automaticamente).
+    """
+    __tablename__ = 'sync_outbox'
+
+    OPERATION_UPSERT = 'upsert'
+    OPERATION_DELETE = 'delete'
+
+    id = db.Column(db.Integer, primary_key=True)
+    operation = db.Column(db.String(10), nullable=False)
+    report_id = db.Column(db.Integer, nullable=True)
+    submission_key = db.Column(db.String(64), nullable=True)
+    unit = db.Column(db.String(30), nullable=True)
+    location = db.Column(db.String(50), nullable=True)
+    shift = db.Column(db.String(50), nullable=True)
+    report_date = db.Column(db.Date, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @classmethod
+    def delete_entry(cls, report):
+        """Linha de exclusão com as chaves do relatório antes das alterações pendentes"""
+        (unit, location, shift, report_date), _ = _report_snapshot(report, previous=True)
+        history = get_history(report, 'submission_key')
+        submission_key = history.deleted[0] if history.deleted else report.submission_key
+        return {"operation": cls.OPERATION_DELETE, "report_id": None, "submission_key": submission_key,
+                "unit": unit, "location": location, "shift": shift or None, "report_date": report_date,
+                "created_at": datetime.utcnow()}
+
+    @classmethod
+    def upsert_entry(cls, report):
+        return {"operation": cls.OPERATION_UPSERT, "report_id": report.id, "submission_key": None,
+                "unit": None, "location": None, "shift": None, "report_date": None,
+                "created_at": datetime.utcnow()}
+
+
+def _changed_reports(session):
+    """Retorna os relatórios pendentes na sessão como (novos, excluídos, modificados)"""
+    new = [obj for obj in session.new if isinstance(obj, Report)]
+    deleted = [obj for obj in session.deleted if isinstance(obj, Report)]
+    dirty = [obj for obj in session.dirty
+             if isinstance(obj, Report) and session.is_modified(obj, include_collections=False)]
+    return new, deleted, dirty
+
+
+def _collect_report_deltas(new, deleted, dirty, group_key):
+    """
+    Agrupa as variações causadas pelos relatórios pendentes na sessão.
+
+    Args:
+        group_key: Função que recebe a chave (unidade, localidade, turno, report_date)
+            do relatório e retorna a chave do agrupamento (ou None para ignorá-lo)
+    """
+    deltas = {}
+
+    def add(key, values, sign):
+        key = group_key(*key)
+        if key is None:
+            return
+        delta = deltas.setdefault(key, dict.fromkeys(['reports_count'] + METRIC_COLUMNS, 0))
+        delta['reports_count'] += sign
+        for column, amount in values.items():
+            delta[column] += sign * amount
+
+    for obj in new:
+        add(*_report_snapshot(obj), 1)
+    for obj in deleted:
+        add(*_report_snapshot(obj, previous=True), -1)
+    for obj in dirty:
+        add(*_report_snapshot(obj, previous=True), -1)
+        add(*_report_snapshot(obj), 1)
+
+    return {key: delta for key, delta in deltas.items() if any(delta.values())}
+
+
+def _apply_deltas(connection, table, key_columns, deltas):
+    """Soma as variações às linhas da tabela (UPDATE col = col + delta), criando as que faltam"""
+    for key, delta in deltas.items():
+        keys = dict(zip(key_columns, key))
+        result = connection.execute(
+            update(table)
+            .where(*[table.c[column] == value for column, value in keys.items()])
+            .values({column: table.c[column] + amount for column, amount in delta.items()}))
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(**keys, **delta))
+
+
+@event.listens_for(Session, 'before_flush')
+def _update_report_totals(session, flush_context, instances):
+    """
+    Aplica as variações de relatórios aos totais, às estatísticas por dia/mês e à
+    versão dos dados na mesma transação do flush
+    """
+    new, deleted, dirty = _changed_reports(session)
+    if not (new or deleted or dirty):
+        return
+
+    # Datas afetadas em cada unidade (inclusive a data e a unidade anteriores de relatórios
+    # alterados): registradas para o delta do calendário e invalidadas no cache do calendário
+    # depois do commit
+    dates = {(obj.unit, obj.report_date) for obj in new + deleted + dirty}
+    for obj in deleted + dirty:
+        (previous_unit, _, _, previous_date), _ = _report_snapshot(obj, previous=True)
+        dates.add((previous_unit, previous_date))
+    dates = {(unit, day) for unit, day in dates if day is not None}
+    session.info.setdefault('calendar_dates', set()).update(dates)
+
+    connection = session.connection()
+    version = DataVersion.bump(connection)
+    for unit in {unit for unit, _ in dates}:
+        ReportChange.record(version, sorted(day for day_unit, day in dates if day_unit == unit), connection, unit)
+
+    _apply_deltas(connection, ReportTotals.__table__, ['unit', 'location', 'shift'],
+                  _collect_report_deltas(new, deleted, dirty,
+                                         lambda unit, location, shift, day: (unit, location, shift)))
+
+    for model in ROLLUP_MODELS:
+        def period_key(unit, location, shift, day, model=model):
+            return (unit, model.period_of(day), location, shift) if day is not None else None
+
+        _apply_deltas(connection, model.__table__, ['unit', 'period', 'location', 'shift'],
+                      _collect_report_deltas(new, deleted, dirty, period_key))
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_sync_outbox(session, flush_context):
+    """
+    No modo edge, registra em sync_outbox os relatórios incluídos, alterados e excluídos
+    (depois do flush, quando os relatórios novos já têm id). As gravações do próprio
+    envio no banco central (session.info['sync_push']) não são registradas.
+    """
+    if not EDGE_MODE or session.info.get('sync_push'):
+        return
+    new, deleted, dirty = _changed_reports(session)
+    rows = [SyncOutbox.delete_entry(obj) for obj in deleted]
+    for obj in dirty:
+        # Relatório que mudou de chave natural (ou, sem data, de chave de idempotência):
+        # a versão antiga é excluída no banco central
+        previous_key = _report_snapshot(obj, previous=True)[0]
+        if previous_key != _report_snapshot(obj)[0] or (
+                previous_key[3] is None and get_history(obj, 'submission_key').deleted):
+            rows.append(SyncOutbox.delete_entry(obj))
+        rows.append(SyncOutbox.upsert_entry(obj))
+    rows.extend(SyncOutbox.upsert_entry(obj) for obj in new)
+    if rows:
+        session.connection().execute(insert(SyncOutbox.__table__), rows)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_calendar_cache(session):
+    """Remove do cache do calendário as janelas que contêm as datas alteradas (por unidade)"""
+    dates = session.info.pop('calendar_dates', None)
+    dates = {(unit, day) for unit, day in dates or () if day is not None}
+    if dates:
+        calendar_cache.invalidate_dates(dates)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_calendar_dates(session):
+    session.info.pop('calendar_dates', None)
@@ -0,0 +1,150 @@
+"""
+Relatório de impressão gerado no servidor (totais gerais e por município).
+
+O documento (HTML ou PDF) é renderizado uma vez por combinação de período,
+turno e versão dos dados (DataVersion) e mantido em um cache LRU por
+processo; reimprimir o mesmo mês é servido direto do cache até que algum
+relatório seja gravado ou excluído.
+
+O PDF usa o WeasyPrint quando ele está instalado (dependência opcional).
+"""
+import os
+import logging
+import threading
+from collections import OrderedDict
+
+from flask import current_app, render_template
+
+from models import Report, DataVersion, unit_registry
+
+# Quantidade de documentos renderizados mantidos em memória por processo
+PRINT_CACHE_SIZE = int(os.environ.get("PRINT_CACHE_SIZE", "32"))
+
+# Chaves das colunas retornadas por Report.get_totals_by_location
+TOTALS_KEYS = ['people', 'motorcycles', 'cars', 'bicycles', 'arrests', 'seized_motorcycles',
+               'drugs_seized', 'fugitives', 'bladed_weapons', 'firearms']
+
+try:
+    from weasyprint import HTML
+except ImportError:
+    HTML = None
+
+
+class PDFUnavailableError(Exception):
+    """WeasyPrint não está instalado"""
+
+
+def format_drugs_amount(amount):
+    """Quantidade de drogas em g, ou em kg a partir de 999 g (mesma regra do painel)"""
+    if amount >= 999:
+        return f"{amount / 1000:.3f} kg"
+    return f"{amount:.1f} g"
+
+
+def period_label(start_date, end_date, shift):
+    """Descrição do período impresso abaixo do título"""
+    if start_date and end_date:
+        label = f"Período: {start_date.strftime('%d/%m/%Y')} a {end_date.strftime('%d/%m/%Y')}"
+    elif start_date:
+        label = f"Período: a partir de {start_date.strftime('%d/%m/%Y')}"
+    elif end_date:
+        label = f"Período: até {end_date.strftime('%d/%m/%Y')}"
+    else:
+        label = "Período: todo o histórico"
+    if shift:
+        label += f" - Turno: {shift}"
+    return label
+
+
+def build_context(start_date=None, end_date=None, shift=None, unit=None):
+    """Consulta os totais do período (uma única agregação no banco) para o template"""
+    totals = dict.fromkeys(TOTALS_KEYS + ['total_inspections', 'reports_count'], 0)
+    locations = []
+    for location, reports_count, *sums in Report.get_totals_by_location(start_date, end_date, shift, unit):
+        entry = dict(zip(TOTALS_KEYS, (value or 0 for value in sums)))
+        entry['total_inspections'] = (entry['people'] + entry['motorcycles'] + entry['cars'] +
+                                      entry['bicycles'] + entry['arrests'] + entry['fugitives'])
+        entry['reports_count'] = reports_count
+        entry['drugs_label'] = format_drugs_amount(entry['drugs_seized'])
+        if location is None:
+            totals = entry
+        else:
+            locations.append((location, entry))
+
+    label = period_label(start_date, end_date, shift)
+    if unit and unit_registry.get(unit):
+        label += f" - Unidade: {unit_registry.get(unit)['name']}"
+
+    return {
+        "period_label": label,
+        "totals": totals,
+        "locations": locations,
+    }
+
+
+class PrintReportCache:
+    """LRU em memória dos documentos renderizados, com contadores de acertos"""
+
+    def __init__(self, max_size=PRINT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return body
+
+    def put(self, key, body):
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "size": len(self._entries)}
+
+
+print_cache = PrintReportCache()
+
+
+def render_print_report(start_date=None, end_date=None, shift=None, output_format="html", unit=None):
+    """
+    Retorna o documento de impressão do período, renderizado ou do cache.
+
+    Returns:
+        tuple: (conteúdo em bytes, versão dos dados usada na renderização)
+
+    Raises:
+        PDFUnavailableError: output_format="pdf" sem o WeasyPrint instalado
+    """
+    if output_format == "pdf" and HTML is None:
+        raise PDFUnavailableError("Geração de PDF indisponível: instale o pacote weasyprint")
+
+    version = DataVersion.current()
+    key = (version, start_date, end_date, shift or None, output_format, unit)
+    body = print_cache.get(key)
+    if body is not None:
+        return body, version
+
+    context = build_context(start_date, end_date, shift, unit)
+    if output_format == "pdf":
+        # CSS embutido: o WeasyPrint não precisa buscar arquivos estáticos pela rede
+        css_path = os.path.join(current_app.static_folder, "css", "print-templates.css")
+        with open(css_path, encoding="utf-8") as f:
+            html = render_template("print_report.html", inline_css=f.read(), **context)
+        body = HTML(string=html).write_pdf()
+    else:
+        body = render_template("print_report.html", **context).encode("utf-8")
+
+    logging.info(f"Relatório de impressão renderizado ({output_format}, versão {version})")
+    print_cache.put(key, body)
+    return body, version
@@ -0,0 +1,136 @@
+"""
+Perfil das requisições: consultas SQL, tempo de IA e captura com cProfile.
+
+Para cada requisição são contadas as instruções SQL (eventos do engine do
+SQLAlchemy) e o tempo gasto nelas e nas chamadas à OpenAI. Requisições
+acima de SLOW_REQUEST_MS são registradas no log com a divisão entre
+banco, IA e Python.
+
+Captura com cProfile (arquivos .pstats em PROFILE_DIR):
+    PROFILE_SAMPLE_RATE=0.05   perfila uma fração das requisições
+    PROFILE_TOKEN=<segredo>    perfila requisições com o cabeçalho X-Profile-Token igual ao segredo
+    PROFILE_DIR                diretório dos arquivos (padrão: instance/profiles)
+"""
+import io
+import os
+import re
+import time
+import pstats
+import random
+import cProfile
+import logging
+from datetime import datetime
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "1000"))
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN")
+PROFILE_DIR = os.environ.get("PROFILE_DIR")
+
+
+class RequestProfile:
+    """Tempos acumulados de uma requisição"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.ai_time = 0.0
+        self.profiler = None
+
+
+def _current():
+    if has_request_context():
+        return g.get("request_profile")
+    return None
+
+
+def record_ai_time(seconds):
+    """Soma o tempo de uma chamada à IA ao perfil da requisição atual (se houver)"""
+    profile = _current()
+    if profile is not None:
+        profile.ai_time += seconds
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("profiling_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["profiling_started"].pop()
+    profile = _current()
+    if profile is not None:
+        profile.sql_count += 1
+        profile.sql_time += time.perf_counter() - started
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("profiling_started"):
+        connection.info["profiling_started"].pop()
+
+
+def _should_profile():
+    if PROFILE_TOKEN and request.headers.get("X-Profile-Token") == PROFILE_TOKEN:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _save_profile(profiler, elapsed_ms):
+    """Grava o .pstats e registra no log as funções mais custosas"""
+    directory = PROFILE_DIR or os.path.join(current_app.instance_path, "profiles")
+    os.makedirs(directory, exist_ok=True)
+    route = re.sub(r'[^A-Za-z0-9]+', '_', request.path).strip('_') or 'root'
+    filename = os.path.join(
+        directory, f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{request.method}-{route}.pstats")
+    profiler.dump_stats(filename)
+
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(15)
+    logging.info(f"Perfil de {request.method} {request.path} ({elapsed_ms:.0f}ms) gravado em {filename}\n"
+                 f"{output.getvalue()}")
+
+
+def init_app(app):
+    """Registra a medição por requisição"""
+
+    @app.before_request
+    def _start_profile():
+        profile = RequestProfile()
+        g.request_profile = profile
+        if _should_profile():
+            profile.profiler = cProfile.Profile()
+            profile.profiler.enable()
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = g.pop("request_profile", None)
+        if profile is None:
+            return response
+
+        if profile.profiler is not None:
+            profile.profiler.disable()
+
+        elapsed_ms = (time.perf_counter() - profile.started) * 1000
+        sql_ms = profile.sql_time * 1000
+        ai_ms = profile.ai_time * 1000
+        python_ms = max(0.0, elapsed_ms - sql_ms - ai_ms)
+
+        if elapsed_ms >= SLOW_REQUEST_MS:
+            logging.warning(
+                f"Requisição lenta: {request.method} {request.full_path.rstrip('?')} -> {response.status_code} "
+                f"em {elapsed_ms:.0f}ms (DB {sql_ms:.0f}ms em {profile.sql_count} consultas, "
+                f"IA {ai_ms:.0f}ms, Python {python_ms:.0f}ms)")
+
+        if profile.profiler is not None:
+            try:
+                _save_profile(profile.profiler, elapsed_ms)
+            except Exception as e:
+                logging.error(f"Erro ao gravar o perfil da requisição: {str(e)}")
+        return response
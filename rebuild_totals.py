@@ -0,0 +1,62 @@
+"""
+Script para verificar e reconstruir os totais acumulados (tabela report_totals)
+e as estatísticas por dia e por mês (report_daily_stats, report_monthly_stats)
+a partir da tabela report.
+
+Uso:
+    python rebuild_totals.py           # verifica e reconstrói as tabelas com divergências
+    python rebuild_totals.py --check   # apenas verifica, sem alterar o banco
+    python rebuild_totals.py --force   # reconstrói todas mesmo sem divergências
+"""
+import sys
+import logging
+
+from app import app
+from models import db, ReportTotals, ROLLUP_MODELS
+
+logging.basicConfig(level=logging.INFO)
+
+
+def describe(mismatch):
+    """Descrição legível de uma divergência"""
+    parts = [str(mismatch['period'])] if 'period' in mismatch else []
+    parts += [mismatch['location'], mismatch['shift'] or '(sem turno)']
+    return (f"{' / '.join(parts)}: {mismatch['column']} "
+            f"esperado={mismatch['expected']} armazenado={mismatch['stored']}")
+
+
+def rebuild_totals(check_only=False, force=False):
+    """Verifica a consistência dos totais e estatísticas e reconstrói quando necessário."""
+    with app.app_context():
+        consistent = True
+
+        for model in [ReportTotals] + ROLLUP_MODELS:
+            table = model.__tablename__
+            mismatches = model.check()
+
+            for mismatch in mismatches:
+                logging.warning(f"Divergência em {table}, {describe(mismatch)}")
+
+            if not mismatches:
+                logging.info(f"Tabela {table} consistente com a tabela report")
+            else:
+                consistent = False
+
+            if check_only or (not mismatches and not force):
+                continue
+
+            try:
+                model.rebuild()
+                db.session.commit()
+                logging.info(f"Tabela {table} reconstruída com sucesso")
+            except Exception as e:
+                logging.error(f"Erro ao reconstruir a tabela {table}: {str(e)}")
+                db.session.rollback()
+                return False
+
+        return consistent or not check_only
+
+
+if __name__ == '__main__':
+    ok = rebuild_totals(check_only='--check' in sys.argv, force='--force' in sys.argv)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,59 @@
+"""
+Separação de textos com vários relatórios de produtividade (ex.: exportação
+de conversa do WhatsApp) em relatórios individuais.
+"""
+import re
+
+# Cabeçalho que abre cada relatório (ver exemplo em attached_assets/)
+HEADER_PATTERN = re.compile(r'POL[IÍ]CIA\s+MILITAR\s+DO\s+PAR[AÁ]', re.IGNORECASE)
+
+# Marcador usado quando o cabeçalho da corporação não foi colado
+PRODUCTIVITY_PATTERN = re.compile(r'\bPRODUTIVIDADE\b', re.IGNORECASE)
+
+# Data no formato DD/MM/AAAA (todo relatório válido traz ao menos uma)
+DATE_PATTERN = re.compile(r'\d{2}/\d{2}/\d{4}')
+
+# Prefixo das mensagens em exportações do WhatsApp, ex.:
+# "04/04/2025 20:15 - Fulano: " ou "[04/04/2025, 20:15:33] Fulano: "
+CHAT_PREFIX_PATTERN = re.compile(
+    r'^\[?\d{1,2}/\d{1,2}/\d{2,4},?\s+\d{1,2}:\d{2}(?::\d{2})?\]?\s*(?:-\s*)?[^:\n]{1,60}:\s?')
+
+
+def _split_at(lines, pattern):
+    """Divide as linhas antes de cada linha que casa com o padrão"""
+    starts = [index for index, line in enumerate(lines) if pattern.search(line)]
+    if len(starts) < 2:
+        return None
+
+    # Texto antes do primeiro marcador (mensagens soltas da conversa) é ignorado
+    bounds = starts + [len(lines)]
+    return ["\n".join(lines[start:end]) for start, end in zip(bounds, bounds[1:])]
+
+
+def split_reports(text):
+    """
+    Divide um texto em relatórios individuais.
+
+    Usa o cabeçalho "POLÍCIA MILITAR DO PARÁ" quando ele se repete; caso
+    contrário, o marcador "PRODUTIVIDADE". Sem marcadores repetidos, o texto
+    inteiro é tratado como um único relatório. Ao dividir, blocos sem data
+    são descartados (normalmente mensagens soltas da conversa).
+
+    Args:
+        text (str): Texto colado ou conteúdo do arquivo enviado
+
+    Returns:
+        list: Textos dos relatórios, na ordem em que aparecem
+    """
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+
+    # Remover data/hora e remetente das mensagens exportadas, que confundiriam a data do relatório
+    lines = [CHAT_PREFIX_PATTERN.sub('', line) for line in lines]
+
+    blocks = _split_at(lines, HEADER_PATTERN) or _split_at(lines, PRODUCTIVITY_PATTERN)
+    if blocks is None:
+        single = "\n".join(lines).strip()
+        return [single] if single else []
+
+    blocks = [block.strip() for block in blocks]
+    return [block for block in blocks if block and DATE_PATTERN.search(block)]
@@ -4,6 +4,18 @@
  * for the 20th Military Police Unit
  */
 
+// Unidade do painel (?unit=<código> na URL): totais e exclusões ficam restritos a ela
+const currentUnit = new URLSearchParams(window.location.search).get('unit');
+
+/**
+ * Acrescentar a unidade do painel à URL (quando houver)
+ * @param {string} url - URL da API
+ */
+function withUnit(url) {
+  if (!currentUnit) return url;
+  return url + (url.includes('?') ? '&' : '?') + 'unit=' + encodeURIComponent(currentUnit);
+}
+
 // Initialize when DOM is fully loaded
 document.addEventListener('DOMContentLoaded', () => {
   console.log('Police Report Analyzer initialized');
@@ -76,6 +88,13 @@ function analyzeReport() {
   // Limpar o texto do relatório imediatamente após validação
   document.getElementById('reportText').value = '';
   
+  // Vários relatórios colados de uma vez (ex.: exportação da conversa) vão para o endpoint em lote
+  const headerMatches = reportTextCopy.match(/POL[IÍ]CIA\s+MILITAR\s+DO\s+PAR[AÁ]/gi);
+  if (headerMatches && headerMatches.length > 1) {
+    analyzeBatch(reportTextCopy);
+    return;
+  }
+  
   try {
     // First do a client-side extraction to quickly display some results
     const results = extractDataFromReport(reportTextCopy);
@@ -86,20 +105,35 @@ function analyzeReport() {
       headers: {
         'Content-Type': 'application/json'
       },
-      body: JSON.stringify({ text: reportTextCopy })
+      // Análise assíncrona: o servidor responde 202 com o id do job e a análise é acompanhada por polling
+      body: JSON.stringify({ text: reportTextCopy, async: true, unit: currentUnit })
     })
     .then(response => {
       if (!response.ok) {
         throw new Error('Erro na requisição ao servidor');
       }
-      return response.json();
+      return response.json().then(data => (
+        response.status === 202 ? pollAnalysisJob(withUnit(data.status_url)) : data
+      ));
     })
     .then(serverData => {
       console.log('Server analysis complete:', serverData);
       
-      if (serverData.success) {
+      const outcome = serverData.outcome || (serverData.job && serverData.job.outcome);
+      if (outcome === 'closed') {
+        // Mês fechado: o relatório não foi salvo
+        displayResults(results, serverData.totals);
+        showError('O mês deste relatório já foi fechado; o relatório não foi salvo.');
+      } else if (serverData.success) {
         // Display the results with totals from server
         displayResults(serverData.data, serverData.totals);
+        
+        // Relatório repetido: o servidor devolve o relatório já salvo
+        if (outcome === 'duplicate') {
+          showError('Este relatório já havia sido enviado; nenhum dado foi alterado.');
+        } else if (outcome === 'conflict') {
+          showError('Já existe um relatório para esta data, local e turno; o relatório existente foi mantido.');
+        }
       } else {
         // If server failed but we have client-side results, still show them
         displayResults(results);
@@ -123,6 +157,97 @@ function analyzeReport() {
   }
 }
 
+/**
+ * Enviar um texto com vários relatórios para análise em lote
+ * @param {string} text - Texto com vários relatórios
+ */
+function analyzeBatch(text) {
+  const loader = document.getElementById('loader');
+  
+  fetch('/analyze/batch', {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json'
+    },
+    body: JSON.stringify({ text, unit: currentUnit })
+  })
+  .then(response => response.json().then(data => {
+    if (!response.ok) {
+      throw new Error(data.error || 'Erro na requisição ao servidor');
+    }
+    return data;
+  }))
+  .then(data => {
+    console.log('Batch analysis complete:', data);
+    
+    // Exibir o último relatório processado com os totais atualizados
+    const processed = data.results.filter(result => result.success);
+    if (processed.length > 0) {
+      displayResults(processed[processed.length - 1].data, data.totals);
+    }
+    
+    const skipped = (data.duplicates || 0) + (data.conflicts || 0);
+    if (data.failed > 0 || skipped > 0 || data.closed > 0) {
+      let message = `${data.count} relatórios salvos`;
+      if (skipped > 0) {
+        message += `; ${skipped} já existiam para a mesma data, local e turno`;
+      }
+      if (data.closed > 0) {
+        message += `; ${data.closed} são de meses fechados`;
+      }
+      if (data.failed > 0) {
+        message += `; ${data.failed} não puderam ser analisados`;
+      }
+      showError(message + '.');
+    }
+  })
+  .catch(error => {
+    console.error('Error sending batch to server:', error);
+    showError('Não foi possível processar os relatórios em lote: ' + error.message);
+  })
+  .finally(() => {
+    loader.style.display = 'none';
+  });
+}
+
+/**
+ * Acompanhar uma análise assíncrona até sua conclusão
+ * @param {string} statusUrl - URL de status do job retornada pelo servidor
+ * @param {number} interval - Intervalo entre consultas em milissegundos
+ * @param {number} timeout - Tempo máximo de espera em milissegundos
+ * @returns {Promise<object>} - Resposta final do job (com data e totals)
+ */
+function pollAnalysisJob(statusUrl, interval = 1000, timeout = 180000) {
+  const startedAt = Date.now();
+  
+  return new Promise((resolve, reject) => {
+    const check = () => {
+      fetch(statusUrl)
+        .then(response => {
+          if (!response.ok) {
+            throw new Error('Erro ao consultar o andamento da análise');
+          }
+          return response.json();
+        })
+        .then(data => {
+          const status = data.job ? data.job.status : 'failed';
+          if (status === 'done') {
+            resolve(data);
+          } else if (status === 'failed') {
+            reject(new Error(data.job && data.job.error ? data.job.error : 'Falha na análise'));
+          } else if (Date.now() - startedAt > timeout) {
+            reject(new Error('Tempo esgotado aguardando a análise'));
+          } else {
+            setTimeout(check, interval);
+          }
+        })
+        .catch(reject);
+    };
+    
+    setTimeout(check, interval);
+  });
+}
+
 /**
  * Extract data from the report text
  * @param {string} text - The report text
@@ -380,16 +505,8 @@ function loadTotals() {
   const loader = document.getElementById('loader');
   if (loader) loader.style.display = 'block';
   
-  // Fazer uma requisição para obter apenas os totais
-  fetch('/analyze', {
-    method: 'POST',
-    headers: {
-      'Content-Type': 'application/json'
-    },
-    body: JSON.stringify({ 
-      text: "RELATÓRIO: MUANÁ\nDATA: 01/01/2025\nPESSOAS A PÉ: 0\nMOTOS: 0\nCARROS: 0\nBICICLETAS: 0\nOCORRÊNCIA: Relatório apenas para carregar totais." 
-    })
-  })
+  // Obter apenas os totais (GET com ETag: o navegador revalida e reaproveita o cache quando nada mudou)
+  fetch(withUnit('/api/totals'))
   .then(response => response.json())
   .then(data => {
     if (data.success && data.totals) {
@@ -541,7 +658,7 @@ function deleteLastReport() {
     // Mostrar loader
     document.getElementById('loader').style.display = 'block';
     
-    fetch('/delete-last', {
+    fetch(withUnit('/delete-last'), {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json'
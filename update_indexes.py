@@ -0,0 +1,38 @@
+"""
+Script para criar, em bancos já existentes, os índices declarados nos
+modelos que ainda não existem (db.create_all só cria índices junto com
+tabelas novas). Pode ser executado mais de uma vez.
+"""
+import logging
+
+from sqlalchemy import inspect
+
+from app import app
+from models import db
+
+logging.basicConfig(level=logging.INFO)
+
+
+def update_indexes():
+    """Cria os índices ausentes de todas as tabelas dos modelos."""
+    with app.app_context():
+        try:
+            inspector = inspect(db.engine)
+            for table in db.metadata.sorted_tables:
+                if not inspector.has_table(table.name):
+                    continue
+                existing = {index['name'] for index in inspector.get_indexes(table.name)}
+                for index in table.indexes:
+                    if index.name not in existing:
+                        logging.info(f"Criando índice {index.name} em {table.name}")
+                        index.create(db.engine)
+
+            logging.info("Atualização dos índices concluída com sucesso")
+
+        except Exception as e:
+            logging.error(f"Erro ao criar os índices: {str(e)}")
+
+
+if __name__ == '__main__':
+    update_indexes()
+    print("Atualização dos índices concluída.")
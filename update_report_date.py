@@ -0,0 +1,69 @@
+"""
+Script para adicionar a coluna tipada report_date (DATE) à tabela report,
+preenchendo-a a partir do texto da coluna date (DD/MM/AAAA).
+"""
+import logging
+
+from sqlalchemy import inspect, text
+
+from app import app
+from models import db, Report
+
+logging.basicConfig(level=logging.INFO)
+
+# Quantidade de relatórios atualizados por lote no preenchimento
+BATCH_SIZE = 1000
+
+
+def update_report_date():
+    """Adiciona, preenche e indexa a coluna report_date se necessário."""
+    with app.app_context():
+        try:
+            # Verificar se a coluna já existe
+            existing_columns = [col['name'] for col in inspect(db.engine).get_columns('report')]
+            if 'report_date' not in existing_columns:
+                logging.info("Adicionando coluna report_date")
+                db.session.execute(text("ALTER TABLE report ADD COLUMN report_date DATE"))
+                db.session.commit()
+
+            # Preencher a coluna a partir do texto da data, em lotes
+            last_id = 0
+            updated = 0
+            while True:
+                rows = db.session.execute(
+                    text("SELECT id, date FROM report "
+                         "WHERE id > :last_id AND report_date IS NULL AND date IS NOT NULL "
+                         "ORDER BY id LIMIT :limit"),
+                    {"last_id": last_id, "limit": BATCH_SIZE}
+                ).fetchall()
+                if not rows:
+                    break
+
+                params = [{"id": row_id, "report_date": Report.to_report_date(date_str)}
+                          for row_id, date_str in rows]
+                params = [p for p in params if p["report_date"] is not None]
+                if params:
+                    db.session.execute(
+                        text("UPDATE report SET report_date = :report_date WHERE id = :id"), params)
+                db.session.commit()
+
+                updated += len(params)
+                last_id = rows[-1][0]
+
+            logging.info(f"{updated} relatórios com report_date preenchida")
+
+            # O índice único (unit, report_date, location, shift) usado pelo calendário é criado por
+            # update_report_unit.py (que inclui update_report_natural_key.py), depois de remover
+            # os relatórios duplicados
+            logging.info("Execute update_report_unit.py para criar o índice da chave natural e aplicar as unidades")
+
+            logging.info("Atualização da coluna report_date concluída com sucesso")
+
+        except Exception as e:
+            logging.error(f"Erro ao atualizar a coluna report_date: {str(e)}")
+            db.session.rollback()
+
+
+if __name__ == '__main__':
+    update_report_date()
+    print("Atualização da coluna report_date concluída.")
@@ -0,0 +1,146 @@
+"""
+Script para aplicar a chave natural (data, local, turno) em bancos já existentes:
+
+1. adiciona as colunas de idempotência (report.submission_key e
+   analysis_job.submission_key/replace_existing/outcome);
+2. remove os relatórios duplicados, mantendo o mais recente de cada data/local/turno
+   (os jobs de análise passam a apontar para o relatório mantido);
+3. normaliza local e turno dos relatórios (ex.: "Diurno" -> "Diurno (07:30 às 19:30)");
+4. troca o índice ix_report_date_location_shift pelo índice único e cria o índice
+   de submission_key;
+5. reconstrói os totais e as estatísticas por dia/mês.
+
+Use --dry-run para apenas listar os duplicados. Pode ser executado mais de uma vez.
+"""
+import sys
+import logging
+
+from sqlalchemy import delete, inspect, select, text, update
+
+from app import app
+from models import db, Report, AnalysisJob, ReportTotals, ROLLUP_MODELS, DataVersion, ReportChange
+from calendar_cache import calendar_cache
+
+logging.basicConfig(level=logging.INFO)
+
+# Quantidade de relatórios lidos por lote na busca por duplicados
+BATCH_SIZE = 1000
+
+NEW_COLUMNS = {
+    'report': [('submission_key', 'VARCHAR(64)')],
+    'analysis_job': [('submission_key', 'VARCHAR(64)'),
+                     ('replace_existing', 'BOOLEAN NOT NULL DEFAULT FALSE'),
+                     ('outcome', 'VARCHAR(20)')],
+}
+
+
+def add_columns():
+    """Adiciona as colunas ausentes"""
+    inspector = inspect(db.engine)
+    for table, columns in NEW_COLUMNS.items():
+        existing = {column['name'] for column in inspector.get_columns(table)}
+        for name, definition in columns:
+            if name not in existing:
+                logging.info(f"Adicionando coluna {table}.{name}")
+                db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {definition}"))
+    db.session.commit()
+
+
+def normalize_reports():
+    """Normaliza local e turno (poucas combinações distintas, atualizadas em massa)"""
+    pairs = db.session.execute(select(Report.location, Report.shift).distinct()).all()
+    for location, shift in pairs:
+        new_location = Report.normalize_location(location)
+        new_shift = Report.normalize_shift(shift)
+        if (new_location, new_shift) == (location, shift):
+            continue
+        logging.info(f"Normalizando '{location}' / '{shift}' -> '{new_location}' / '{new_shift}'")
+        shift_filter = Report.shift.is_(None) if shift is None else Report.shift == shift
+        db.session.execute(
+            update(Report)
+            .where(Report.location == location, shift_filter)
+            .values(location=new_location, shift=new_shift)
+            .execution_options(synchronize_session=False))
+    db.session.commit()
+
+
+def find_duplicates():
+    """
+    Relatórios duplicados a remover, como {id removido: id mantido}. Em cada
+    data/local/turno (já normalizados) é mantido o relatório enviado por último.
+    """
+    rows = db.session.execute(
+        select(Report.id, Report.report_date, Report.location, Report.shift)
+        .where(Report.report_date.isnot(None), Report.shift.isnot(None))
+        .order_by(Report.created_at.desc(), Report.id.desc())
+        .execution_options(yield_per=BATCH_SIZE))
+
+    duplicates = {}
+    kept = {}
+    for report_id, report_date, location, shift in rows:
+        key = (report_date, Report.normalize_location(location), Report.normalize_shift(shift))
+        if key not in kept:
+            kept[key] = report_id
+        else:
+            duplicates[report_id] = kept[key]
+            logging.info(f"Duplicado: relatório {report_id} ({key[1]}, {report_date}, {key[2]}), "
+                         f"mantido o relatório {kept[key]}")
+    return duplicates
+
+
+def remove_duplicates(duplicates):
+    """Remove os duplicados (exclusão em massa; totais reconstruídos em seguida)"""
+    for removed_id, kept_id in duplicates.items():
+        db.session.execute(
+            update(AnalysisJob).where(AnalysisJob.report_id == removed_id).values(report_id=kept_id))
+    ids = list(duplicates)
+    for start in range(0, len(ids), 500):
+        db.session.execute(delete(Report).where(Report.id.in_(ids[start:start + 500])))
+    db.session.commit()
+
+
+def create_indexes():
+    """Troca o índice antigo (não único) pelos índices declarados no modelo"""
+    db.session.execute(text("DROP INDEX IF EXISTS ix_report_date_location_shift"))
+    db.session.commit()
+    existing = {index['name'] for index in inspect(db.engine).get_indexes('report')}
+    for index in Report.__table__.indexes:
+        if index.name not in existing:
+            logging.info(f"Criando índice {index.name}")
+            index.create(db.engine)
+
+
+def update_report_natural_key(dry_run=False):
+    """Aplica a chave natural e a idempotência das submissões."""
+    with app.app_context():
+        try:
+            if dry_run:
+                duplicates = find_duplicates()
+                logging.info(f"{len(duplicates)} relatórios duplicados seriam removidos")
+                return
+
+            add_columns()
+            duplicates = find_duplicates()
+            remove_duplicates(duplicates)
+            normalize_reports()
+            logging.info(f"{len(duplicates)} relatórios duplicados removidos")
+            create_indexes()
+
+            # Alterações em massa não passam pelos eventos do ORM
+            ReportTotals.rebuild()
+            for model in ROLLUP_MODELS:
+                model.rebuild()
+            ReportChange.record(DataVersion.bump(), [None])
+            db.session.commit()
+            calendar_cache.clear()
+
+            logging.info("Atualização da chave natural concluída com sucesso")
+
+        except Exception as e:
+            logging.error(f"Erro ao aplicar a chave natural: {str(e)}")
+            db.session.rollback()
+
+
+if __name__ == '__main__':
+    update_report_natural_key(dry_run='--dry-run' in sys.argv)
+    print("Atualização da chave natural concluída.")
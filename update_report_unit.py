@@ -0,0 +1,159 @@
+"""
+Script para aplicar as unidades (multi-unidade) em bancos já existentes:
+
+1. aplica a chave natural (update_report_natural_key) e adiciona a coluna unit em
+   report, report_archive e analysis_job;
+2. recria as tabelas derivadas (totais, estatísticas, resumos mensais e alterações),
+   que passam a ser separadas por unidade;
+3. cadastra a unidade padrão (DEFAULT_UNIT) com os locais atuais, se não houver
+   unidades;
+4. preenche a unidade dos relatórios a partir do local (unit_location);
+5. troca o índice único (data, local, turno) pelo índice (unidade, data, local, turno);
+6. reconstrói os totais, as estatísticas e os resumos dos meses fechados.
+
+Use --dry-run para apenas listar quantos relatórios seriam atribuídos a cada unidade.
+Pode ser executado mais de uma vez.
+"""
+import sys
+import logging
+
+from sqlalchemy import func, inspect, select, text, update
+
+from app import app
+from models import (db, Report, ReportArchive, AnalysisJob, ReportTotals, ReportPeriodSummary, ReportDailyStats,
+                    ReportMonthlyStats, ReportChange, ClosedPeriod, DataVersion, Unit, UnitLocation,
+                    ROLLUP_MODELS, DEFAULT_UNIT, unit_registry)
+from calendar_cache import calendar_cache
+import update_report_natural_key
+
+logging.basicConfig(level=logging.INFO)
+
+# Tabelas derivadas, recriadas com a coluna unit e reconstruídas a partir dos relatórios
+DERIVED_MODELS = [ReportTotals, ReportDailyStats, ReportMonthlyStats, ReportPeriodSummary, ReportChange]
+
+# Definição da coluna unit em cada tabela existente
+UNIT_COLUMNS = {
+    Report.__tablename__: f"VARCHAR(30) NOT NULL DEFAULT '{DEFAULT_UNIT}'",
+    ReportArchive.__tablename__: f"VARCHAR(30) NOT NULL DEFAULT '{DEFAULT_UNIT}'",
+    AnalysisJob.__tablename__: "VARCHAR(30)",
+}
+
+
+def add_unit_columns():
+    """Adiciona a coluna unit em report, report_archive e analysis_job"""
+    inspector = inspect(db.engine)
+    for table, definition in UNIT_COLUMNS.items():
+        if not inspector.has_table(table):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table)}
+        if 'unit' not in existing:
+            logging.info(f"Adicionando coluna {table}.unit")
+            db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN unit {definition}"))
+    db.session.commit()
+
+
+def recreate_derived_tables():
+    """Recria as tabelas derivadas que ainda não têm a coluna unit"""
+    inspector = inspect(db.engine)
+    for model in DERIVED_MODELS:
+        table = model.__tablename__
+        if inspector.has_table(table) and 'unit' not in {c['name'] for c in inspector.get_columns(table)}:
+            logging.info(f"Recriando tabela {table}")
+            model.__table__.drop(db.engine)
+    db.create_all()
+
+
+def unit_counts():
+    """Quantidade de relatórios por unidade de destino: {unidade: quantidade}"""
+    counts = {}
+    rows = db.session.execute(select(Report.location, func.count(Report.id)).group_by(Report.location))
+    for location, count in rows:
+        unit = unit_registry.unit_for(location)
+        counts[unit] = counts.get(unit, 0) + count
+    return counts
+
+
+def assign_units():
+    """
+    Atribui a cada relatório (e relatório arquivado) a unidade do seu local; locais
+    sem cadastro ficam na unidade padrão. Atualização em massa (não passa pelos
+    eventos do ORM): os totais devem ser reconstruídos em seguida.
+    """
+    assignments = db.session.execute(select(UnitLocation.location, UnitLocation.unit_code)).all()
+    for model in (Report, ReportArchive):
+        known = [location for location, _ in assignments]
+        db.session.execute(
+            update(model).where(model.location.notin_(known), model.unit != DEFAULT_UNIT)
+            .values(unit=DEFAULT_UNIT).execution_options(synchronize_session=False))
+        for location, unit in assignments:
+            db.session.execute(
+                update(model).where(model.location == location, model.unit != unit)
+                .values(unit=unit).execution_options(synchronize_session=False))
+    db.session.commit()
+
+
+def create_indexes():
+    """Troca os índices sem unidade pelos índices declarados nos modelos"""
+    for name in ('uq_report_date_location_shift', 'ix_report_date_location_shift'):
+        db.session.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    db.session.commit()
+    inspector = inspect(db.engine)
+    for model in (Report, ReportArchive):
+        existing = {index['name'] for index in inspector.get_indexes(model.__tablename__)}
+        for index in model.__table__.indexes:
+            if index.name not in existing:
+                logging.info(f"Criando índice {index.name}")
+                index.create(db.engine)
+
+
+def rebuild_all():
+    """
+    Reconstrói totais, estatísticas e resumos dos meses fechados e marca todo o
+    calendário como alterado (não faz commit)
+    """
+    ReportTotals.rebuild()
+    for model in ROLLUP_MODELS:
+        model.rebuild()
+    for closed in ClosedPeriod.query.all():
+        ReportPeriodSummary.rebuild_period(closed.period)
+    ReportChange.record(DataVersion.bump(), [None])
+
+
+def update_report_unit(dry_run=False):
+    """Aplica as unidades aos relatórios existentes."""
+    with app.app_context():
+        try:
+            if dry_run:
+                for unit, count in sorted(unit_counts().items()):
+                    logging.info(f"{count} relatórios seriam atribuídos à unidade {unit}")
+                return
+
+            update_report_natural_key.add_columns()
+            add_unit_columns()
+            recreate_derived_tables()
+            Unit.ensure_default()
+            db.session.commit()
+            unit_registry.clear()
+
+            duplicates = update_report_natural_key.find_duplicates()
+            update_report_natural_key.remove_duplicates(duplicates)
+            update_report_natural_key.normalize_reports()
+            logging.info(f"{len(duplicates)} relatórios duplicados removidos")
+
+            assign_units()
+            create_indexes()
+
+            rebuild_all()
+            db.session.commit()
+            calendar_cache.clear()
+
+            logging.info("Atualização das unidades concluída com sucesso")
+
+        except Exception as e:
+            logging.error(f"Erro ao aplicar as unidades: {str(e)}")
+            db.session.rollback()
+
+
+if __name__ == '__main__':
+    update_report_unit(dry_run='--dry-run' in sys.argv)
+    print("Atualização das unidades concluída.")